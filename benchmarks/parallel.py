@@ -0,0 +1,137 @@
+"""
+并行生成基准测试
+
+只解析、翻译一次，然后分别以不同的进程数重复生成，比较 generate 阶段的耗时，
+并校验各进程数生成的输出目录逐字节一致
+
+    python benchmarks/parallel.py --libclang <libclang目录> --headers 400 --workers 1 2 4 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import typing as tp
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_HERE, os.pardir, "src"))
+
+from synth import generate_headers, add_arguments, config_from_args  # noqa: E402
+from run import _summarize, _get_commit  # noqa: E402
+
+from h2ctypes.workspace import WorkSpace  # noqa: E402
+from h2ctypes.gen import CtypesDllGenerator  # noqa: E402
+
+
+def get_tree_digest(path: str) -> str:
+    """:return: 目录下全部文件的相对路径与内容的sha1"""
+    sha1 = hashlib.sha1()
+    for root, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            filename = os.path.join(root, filename)
+            sha1.update(os.path.relpath(filename, path).replace("\\", "/").encode("utf-8"))
+            with open(filename, "rb") as f:
+                sha1.update(f.read())
+    return sha1.hexdigest()
+
+
+def run_parallel_benchmark(
+        workspace: WorkSpace,
+        header_file_path: str,
+        output_dir: str,
+        workers: tp.List[int],
+        *,
+        repeat=3,
+        lazy_import=False
+) -> tp.Dict[str, tp.Any]:
+    """
+    :param workspace: 工作区
+    :param header_file_path: 根头文件
+    :param output_dir: 输出目录，会被覆盖
+    :param workers: 需要比较的进程数，1 为串行生成
+    :param repeat: 每个进程数的重复次数
+    :return: 各进程数的耗时、相对串行的加速比以及输出摘要
+    """
+    root_tu = workspace._parse(header_file_path, workspace._build_args())
+    solution = workspace._translate_tu(root_tu, header_file_path, None, output_dir, False)
+    root_tu = None
+    solution.release()
+
+    results = {}
+    for count in workers:
+        samples = []
+        for _ in range(repeat):
+            if os.path.exists(output_dir):
+                shutil.rmtree(output_dir)
+            started = time.perf_counter()
+            CtypesDllGenerator(solution, lazy_import=lazy_import, workers=count).generate()
+            samples.append(time.perf_counter() - started)
+        results[count] = dict(_summarize(samples), digest=get_tree_digest(output_dir))
+
+    baseline = results[workers[0]]
+    for result in results.values():
+        result["speedup"] = baseline["min"] / result["min"]
+    return {
+        "headers": len(solution.user_headers),
+        "decls": len(solution.defined_decls),
+        "identical": len({result["digest"] for result in results.values()}) == 1,
+        "workers": results
+    }
+
+
+def main(argv: tp.List[str] = None) -> tp.Dict[str, tp.Any]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--libclang", required=True, help="libclang目录")
+    parser.add_argument("--header", help="使用已有的头文件，不生成合成头文件")
+    parser.add_argument("--work-dir", help="合成头文件与输出目录，默认使用临时目录")
+    parser.add_argument("-o", "--output", help="结果 JSON 路径，默认输出到标准输出")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--lazy-import", action="store_true")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1],
+                        help="需要比较的进程数，第一个作为基准")
+    add_arguments(parser)
+    parser.set_defaults(headers=400, structs=2000, functions=4000)
+    args = parser.parse_args(argv)
+
+    workers = list(dict.fromkeys(args.workers))
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="h2ctypes-bench-")
+    try:
+        config = None
+        header = args.header and os.path.abspath(args.header)
+        if header is None:
+            config = config_from_args(args)
+            header = generate_headers(os.path.join(work_dir, "include"), config)
+        workspace = WorkSpace(args.libclang, root_path=os.path.dirname(header))
+        result = {
+            "version": 1,
+            "commit": _get_commit(),
+            "header": args.header,
+            "synth": config.to_dict() if config else None,
+            "options": {"lazy_import": args.lazy_import, "repeat": args.repeat},
+        }
+        result.update(run_parallel_benchmark(workspace, header, os.path.join(work_dir, "out"), workers,
+                                             repeat=args.repeat, lazy_import=args.lazy_import))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for count, item in result["workers"].items():
+        print("workers {:<3} min {:.3f}s  median {:.3f}s  x{:.2f}".format(
+            count, item["min"], item["median"], item["speedup"]), file=sys.stderr)
+    if not result["identical"]:
+        print("outputs differ between worker counts", file=sys.stderr)
+    return result
+
+
+if __name__ == "__main__":
+    main()
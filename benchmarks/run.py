@@ -0,0 +1,187 @@
+"""
+h2ctypes 基准测试
+
+分别计时 parse / translate / generate / import 四个阶段，结果以 JSON 输出，便于跨版本对比
+
+    python benchmarks/run.py --libclang <libclang目录> --structs 500 --headers 50 -o result.json
+    python benchmarks/run.py --libclang <libclang目录> --header path/to/real.h
+
+默认从仓库的 src 目录导入 h2ctypes，测量的是当前工作区的代码
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing as tp
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_HERE, os.pardir, "src"))
+
+from synth import SynthConfig, generate_headers, add_arguments, config_from_args  # noqa: E402
+
+from h2ctypes.workspace import WorkSpace  # noqa: E402
+from h2ctypes.gen import CtypesDllGenerator  # noqa: E402
+from h2ctypes.frozen import FrozenCtypesGenerator  # noqa: E402
+from h2ctypes.cache import get_libclang_version  # noqa: E402
+from h2ctypes.measure import measure_import_time  # noqa: E402
+
+
+def _summarize(samples: tp.List[float]) -> tp.Dict[str, tp.Any]:
+    return {"min": min(samples), "median": statistics.median(samples), "samples": samples}
+
+
+def _get_commit() -> tp.Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=_HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _get_output_size(path: str) -> tp.Tuple[int, int]:
+    """:return: (文件数, 字节数)"""
+    files = size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            if name.endswith(".py"):
+                files += 1
+                size += os.path.getsize(os.path.join(root, name))
+    return files, size
+
+
+def run_benchmark(
+        workspace: WorkSpace,
+        header_file_path: str,
+        output_dir: str,
+        *,
+        repeat=3,
+        import_repeat=5,
+        is_m32=False,
+        lazy_import=False,
+        frozen=False,
+        workers: int = None,
+        symbols: tp.List[str] = None,
+        prefix_headers: tp.List[str] = None
+) -> tp.Dict[str, tp.Any]:
+    """
+    :param workspace: 工作区
+    :param header_file_path: 根头文件
+    :param output_dir: 输出目录，会被覆盖
+    :param repeat: parse / translate / generate 的重复次数
+    :param import_repeat: import 的重复次数
+    :param workers: 生成阶段的进程数
+    :param symbols: 符号白名单，None 翻译全部声明
+    :param prefix_headers: 预编译的前缀头文件，编译一次后所有重复解析复用，编译耗时记为 pch 阶段
+    :return: 各阶段耗时以及输出规模
+    """
+    timings = {"parse": [], "translate": [], "generate": []}
+    args = workspace._build_args(is_m32)
+    if prefix_headers:
+        started = time.perf_counter()
+        args = workspace._add_pch_args(args, prefix_headers)
+        timings["pch"] = [time.perf_counter() - started]
+    solution = None
+    diagnostics = type_cache = None
+    for _ in range(repeat):
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+
+        started = time.perf_counter()
+        root_tu = workspace._parse(header_file_path, args)
+        timings["parse"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        solution = workspace._translate_tu(root_tu, header_file_path, None, output_dir, is_m32, symbols=symbols)
+        timings["translate"].append(time.perf_counter() - started)
+        diagnostics = len(root_tu.diagnostics)
+        type_cache = solution.type_handler.cache_info()._asdict()
+        root_tu = None
+        solution.release()
+
+        started = time.perf_counter()
+        if frozen:
+            FrozenCtypesGenerator(solution).generate()
+        else:
+            CtypesDllGenerator(solution, lazy_import=lazy_import, workers=workers).generate()
+        timings["generate"].append(time.perf_counter() - started)
+
+    phases = {name: _summarize(samples) for name, samples in timings.items()}
+    phases["import"] = measure_import_time(output_dir, import_repeat)
+    files, size = _get_output_size(output_dir)
+    return {
+        "phases": phases,
+        "counts": {
+            "headers": len(solution.chain_headers),
+            "decls": len(solution.defined_decls),
+            "diagnostics": diagnostics,
+            "files": files,
+            "bytes": size,
+            "type_cache": type_cache
+        }
+    }
+
+
+def main(argv: tp.List[str] = None) -> tp.Dict[str, tp.Any]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--libclang", required=True, help="libclang目录")
+    parser.add_argument("--header", help="使用已有的头文件，不生成合成头文件")
+    parser.add_argument("--work-dir", help="合成头文件与输出目录，默认使用临时目录")
+    parser.add_argument("-o", "--output", help="结果 JSON 路径，默认输出到标准输出")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--import-repeat", type=int, default=5)
+    parser.add_argument("--m32", action="store_true")
+    parser.add_argument("--lazy-import", action="store_true")
+    parser.add_argument("--frozen", action="store_true")
+    parser.add_argument("--workers", type=int, help="生成阶段的进程数")
+    parser.add_argument("--symbols", nargs="+", help="符号白名单，名字或者正则表达式")
+    parser.add_argument("--prefix-headers", nargs="+", help="预编译的前缀头文件")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="h2ctypes-bench-")
+    try:
+        config = None
+        header = args.header and os.path.abspath(args.header)
+        if header is None:
+            config = config_from_args(args)
+            header = generate_headers(os.path.join(work_dir, "include"), config)
+        workspace = WorkSpace(args.libclang, root_path=os.path.dirname(header))
+        result = {
+            "version": 1,
+            "commit": _get_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "libclang": get_libclang_version(),
+            "header": args.header,
+            "synth": config.to_dict() if config else None,
+            "options": {"m32": args.m32, "lazy_import": args.lazy_import, "frozen": args.frozen,
+                        "workers": args.workers, "symbols": args.symbols, "prefix_headers": args.prefix_headers,
+                        "repeat": args.repeat, "import_repeat": args.import_repeat},
+        }
+        result.update(run_benchmark(workspace, header, os.path.join(work_dir, "out"), repeat=args.repeat,
+                                    import_repeat=args.import_repeat, is_m32=args.m32,
+                                    lazy_import=args.lazy_import, frozen=args.frozen, workers=args.workers,
+                                    symbols=args.symbols, prefix_headers=args.prefix_headers))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for name, phase in result["phases"].items():
+        print("{:<10} min {:.3f}s  median {:.3f}s".format(name, phase["min"], phase["median"]), file=sys.stderr)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+合成 C/C++ 头文件，用于基准测试
+
+生成 <headers> 个头文件 h0.h ... hN.h 以及包含全部头文件的 root.h，覆盖:
+    - 结构体: 嵌套匿名联合体、位域、定长数组、自引用指针、跨头文件的按值成员
+    - typedef 链: 每个结构体成员类型经过 <typedef_depth> 层 typedef
+    - 枚举
+    - 带回调参数的导出函数
+    - 宽 include 图: 每个头文件随机包含 <fan_in> 个之前的头文件
+"""
+import argparse
+import os
+import random
+import typing as tp
+from dataclasses import dataclass, asdict
+
+
+@dataclass
+class SynthConfig:
+    structs: int = 200
+    headers: int = 20
+    typedef_depth: int = 4
+    enums: int = 50
+    functions: int = 400
+    fan_in: int = 3
+    seed: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _typedef_chain(lines: tp.List[str], base: str, name: str, depth: int) -> str:
+    """生成 depth 层 typedef，返回最外层类型名"""
+    current = base
+    for level in range(depth):
+        alias = "{}_t{}".format(name, level)
+        lines.append("typedef {} {};".format(current, alias))
+        current = alias
+    return current
+
+
+def generate_headers(path: str, config: SynthConfig = None) -> str:
+    """
+    :param path: 输出目录
+    :param config: 规模配置
+    :return: root.h 路径
+    """
+    config = config or SynthConfig()
+    rng = random.Random(config.seed)
+    os.makedirs(path, exist_ok=True)
+    owner = {}  # struct index -> header index
+    for index in range(config.structs):
+        owner[index] = index * config.headers // max(config.structs, 1)
+
+    for header in range(config.headers):
+        lines = ["#pragma once"]
+        includes = set()
+        if header:
+            includes.add(header - 1)
+            includes.update(rng.sample(range(header), min(config.fan_in, header)))
+        lines.extend('#include "h{}.h"'.format(item) for item in sorted(includes))
+
+        for index in (i for i, h in owner.items() if h == header):
+            name = "S{}".format(index)
+            scalar = _typedef_chain(lines, "unsigned int", name, config.typedef_depth)
+            members = [
+                "int id;",
+                "{} value;".format(scalar),
+                "unsigned flags : 3;",
+                "unsigned mode : 5;",
+                "char name[16];",
+                "union {{ int i; float f; struct {{ short lo; short hi; }} parts; }} u{};".format(index),
+                "struct {} *next;".format(name),
+            ]
+            previous = [i for i in owner if i < index and owner[i] in includes | {header}]
+            if previous:
+                members.append("struct S{} inner;".format(rng.choice(previous)))
+            lines.append("struct {} {{ {} }};".format(name, " ".join(members)))
+            lines.append("typedef struct {} {}_t;".format(name, name))
+
+        for index in range(header * config.enums // config.headers, (header + 1) * config.enums // config.headers):
+            lines.append("typedef enum {{ E{0}_A, E{0}_B = 4, E{0}_C }} e{0};".format(index))
+
+        structs = [i for i in owner if owner[i] <= header] or [None]
+        for index in range(header * config.functions // config.headers,
+                           (header + 1) * config.functions // config.headers):
+            struct = rng.choice(structs)
+            arg = "S{}_t *s".format(struct) if struct is not None else "void *s"
+            lines.append("typedef void (*cb{})(int code, void *user);".format(index))
+            lines.append("int fn{0}({1}, cb{0} callback, const char *name, unsigned long size);".format(index, arg))
+
+        with open(os.path.join(path, "h{}.h".format(header)), "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    root = os.path.join(path, "root.h")
+    with open(root, "w") as f:
+        f.write("".join('#include "h{}.h"\n'.format(header) for header in range(config.headers)))
+    return root
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    defaults = SynthConfig()
+    for name, value in defaults.to_dict().items():
+        parser.add_argument("--" + name.replace("_", "-"), type=int, default=value)
+
+
+def config_from_args(args: argparse.Namespace) -> SynthConfig:
+    return SynthConfig(**{name: getattr(args, name) for name in SynthConfig().to_dict()})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    add_arguments(parser)
+    arguments = parser.parse_args()
+    print(generate_headers(arguments.path, config_from_args(arguments)))
@@ -0,0 +1,165 @@
+import logging
+import os
+import time
+import traceback
+import typing as tp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict, replace
+
+from clang.cindex import Diagnostic
+
+from .project import Solution
+from .gen import CtypesDllGenerator
+
+
+@dataclass
+class TranslateJob:
+    """一次 WorkSpace.translate 调用的参数"""
+    header_file_path: str
+    is_m32: bool = False
+    user_macros: tp.Optional[tp.List[tp.Union[str, tp.Tuple[tp.Any, tp.Any]]]] = None
+    include_files: tp.Optional[tp.List[str]] = None
+    include_search_paths: tp.Optional[tp.List[str]] = None
+    output_dir: str = "out"
+    include_user_files: tp.Optional[tp.List[str]] = None
+    lazy_import: bool = False
+    dtype_layout: bool = False
+
+
+@dataclass
+class JobResult:
+    header_file_path: str
+    output_dir: str
+    is_m32: bool = False
+    elapsed: float = 0.0
+    warnings: int = 0
+    errors: int = 0
+    files: int = 0
+    size: int = 0
+    error: tp.Optional[str] = None
+    outputs: tp.Optional[tp.Dict[str, tp.Union[str, bytes]]] = field(default=None, repr=False)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchReport:
+    results: tp.List[JobResult] = field(default_factory=lambda: [])
+    workers: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def succeeded(self) -> tp.List[JobResult]:
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self) -> tp.List[JobResult]:
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def cpu_time(self) -> float:
+        """所有任务耗时之和"""
+        return sum(result.elapsed for result in self.results)
+
+    @property
+    def speedup(self) -> float:
+        return self.cpu_time / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "workers": self.workers,
+            "elapsed": self.elapsed,
+            "cpu_time": self.cpu_time,
+            "speedup": self.speedup,
+            "results": [{k: v for k, v in asdict(result).items() if k != "outputs"} for result in self.results]
+        }
+
+    def summary(self) -> str:
+        lines = ["{} jobs, {} failed, {} workers, {:.2f}s elapsed, {:.2f}s cpu, x{:.2f}".format(
+            len(self.results), len(self.failed), self.workers, self.elapsed, self.cpu_time, self.speedup)]
+        for result in self.results:
+            lines.append("  [{}] {} ({}bit) {:.2f}s, {} files, {} bytes, {} warnings, {} errors".format(
+                "OK" if result.ok else "FAILED", result.header_file_path, 32 if result.is_m32 else 64,
+                result.elapsed, result.files, result.size, result.warnings, result.errors))
+        return "\n".join(lines)
+
+
+_worker_workspace = None
+
+
+def _init_worker(config: tp.Tuple[str, str, bool]):
+    global _worker_workspace
+    from .workspace import WorkSpace
+    libclang_path, root_path, debug = config
+    _worker_workspace = WorkSpace(libclang_path, debug=debug, root_path=root_path)
+
+
+def _translate_job(job: TranslateJob) -> JobResult:
+    """在工作进程中解析、翻译并生成，只返回生成的文本"""
+    started = time.perf_counter()
+    result = JobResult(job.header_file_path, job.output_dir, job.is_m32)
+    try:
+        workspace = _worker_workspace
+        args = workspace._build_args(job.is_m32, job.user_macros, job.include_files, job.include_search_paths)
+        root_tu = workspace._parse(job.header_file_path, args)
+        for diagnostic in root_tu.diagnostics:
+            if diagnostic.severity == Diagnostic.Warning:
+                result.warnings += 1
+            elif diagnostic.severity >= Diagnostic.Error:
+                result.errors += 1
+        solution = workspace._translate_tu(root_tu, job.header_file_path, job.include_user_files, job.output_dir,
+                                           job.is_m32)
+        root_tu = None
+        solution.release()
+        result.outputs = CtypesDllGenerator(solution, lazy_import=job.lazy_import,
+                                            dtype_layout=job.dtype_layout).render()
+    except Exception:
+        result.error = traceback.format_exc()
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def run_batch(
+        config: tp.Tuple[str, str, bool],
+        jobs: tp.List[TranslateJob],
+        workers: int = None,
+        incremental=False
+) -> BatchReport:
+    """
+    :param config: (libclang目录, 工作根目录, 调试模式)，用于在工作进程中创建 WorkSpace
+    :param jobs: 翻译任务
+    :param workers: 进程数，None 使用cpu核数
+    :param incremental: True 只重写内容发生变化的文件
+    :return: 汇总报告
+    """
+    targets = set()
+    jobs = [replace(job, header_file_path=os.path.join(os.getcwd(), job.header_file_path),
+                    output_dir=os.path.normpath(Solution.get_output_root(job.output_dir))) for job in jobs]
+    for job in jobs:
+        target = (job.output_dir, job.is_m32)
+        if target in targets:
+            raise ValueError("output directory {} is used by more than one job".format(job.output_dir))
+        targets.add(target)
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs)) or 1
+    report = BatchReport(workers=workers)
+    started = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config, )) as executor:
+        futures = {executor.submit(_translate_job, job): index for index, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            result = future.result()
+            if result.ok:
+                CtypesDllGenerator.write_outputs(result.output_dir, result.outputs, incremental)
+                result.files = len(result.outputs)
+                result.size = sum(len(content.encode("utf-8") if isinstance(content, str) else content)
+                                  for content in result.outputs.values())
+            else:
+                logging.error("translate {} failed:\n{}".format(result.header_file_path, result.error))
+            result.outputs = None
+            results[futures[future]] = result
+    report.results = [results[index] for index in range(len(jobs))]
+    report.elapsed = time.perf_counter() - started
+    return report
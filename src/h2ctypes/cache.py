@@ -0,0 +1,294 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import typing as tp
+
+from clang.cindex import Config, TranslationUnit, Index, TranslationUnitLoadError, Diagnostic, conf, _CXString
+
+
+def get_libclang_version() -> str:
+    """
+    :return: 当前加载的libclang版本描述，获取失败时退化为libclang路径
+    """
+    try:
+        func = conf.lib.clang_getClangVersion
+        func.restype = _CXString
+        func.errcheck = _CXString.from_result
+        return func()
+    except (AttributeError, OSError):
+        return Config.library_file or Config.library_path or ""
+
+
+def get_file_digest(path: str) -> tp.Optional[str]:
+    """
+    :param path: 文件路径
+    :return: 文件内容的sha1，文件不存在时返回None
+    """
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class ParseCache:
+    """
+    翻译结果的磁盘缓存
+    以 根头文件 + clang参数 + libclang版本 作为key，保存:
+        - 所有被包含文件的内容摘要
+        - TranslationUnit.save 生成的ast文件
+        - 最近一次生成的输出目录快照
+    """
+    MANIFEST_FILENAME = "manifest.json"
+    AST_FILENAME = "unit.ast"
+    OUTPUT_DIRNAME = "output"
+
+    def __init__(self, cache_dir: str):
+        """
+        :param cache_dir: 缓存目录
+        """
+        self.path = os.path.abspath(cache_dir)
+
+    def make_key(self, header_file_path: str, args: tp.Iterable[str]) -> str:
+        """
+        :param header_file_path: 根头文件
+        :param args: clang参数
+        :return: 缓存key
+        """
+        content = json.dumps([header_file_path, list(args), get_libclang_version()])
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def _get_entry_path(self, key: str, *names: str) -> str:
+        return os.path.join(self.path, key, *names)
+
+    def load(self, key: str) -> tp.Optional[dict]:
+        """
+        :param key: 缓存key
+        :return: 所有被包含文件均未改变时返回清单，否则返回None
+        """
+        try:
+            with open(self._get_entry_path(key, self.MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        for path, digest in manifest["files"].items():
+            if get_file_digest(path) != digest:
+                logging.debug("cache miss: {} changed".format(path))
+                return None
+        return manifest
+
+    def load_tu(self, key: str, index: Index) -> tp.Optional[TranslationUnit]:
+        """
+        :param key: 缓存key
+        :param index: clang Index
+        :return: 保存的TranslationUnit，不存在或者损坏时返回None
+        """
+        ast_path = self._get_entry_path(key, self.AST_FILENAME)
+        if not os.path.exists(ast_path):
+            return None
+        try:
+            return TranslationUnit.from_ast_file(ast_path, index)
+        except TranslationUnitLoadError:
+            logging.warning("broken ast cache: {}".format(ast_path))
+            return None
+
+    @staticmethod
+    def is_output_current(manifest: dict, output_dir: str) -> bool:
+        """
+        :param manifest: 缓存清单
+        :param output_dir: 输出根目录
+        :return: 输出目录与缓存快照是否一致
+        """
+        for name, digest in manifest["outputs"].items():
+            if get_file_digest(os.path.join(output_dir, name)) != digest:
+                return False
+        return True
+
+    def restore(self, key: str, manifest: dict, output_dir: str) -> bool:
+        """
+        从快照恢复输出目录
+        :return: 快照不完整时返回False
+        """
+        snapshot_dir = self._get_entry_path(key, self.OUTPUT_DIRNAME)
+        for name, digest in manifest["outputs"].items():
+            source = os.path.join(snapshot_dir, name)
+            if get_file_digest(source) != digest:
+                return False
+        for name in manifest["outputs"]:
+            target = os.path.join(output_dir, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(os.path.join(snapshot_dir, name), target)
+        return True
+
+    def save_tu(self, key: str, tu: TranslationUnit) -> tp.Dict[str, str]:
+        """
+        保存 AST，在生成之前调用，之后 tu 即可释放
+        :param key: 缓存key
+        :param tu: 本次解析的TranslationUnit
+        :return: 参与解析的文件 -> 摘要，传给 store
+        """
+        os.makedirs(self._get_entry_path(key), exist_ok=True)
+        files = {tu.spelling: get_file_digest(tu.spelling)}
+        for include in tu.get_includes():
+            files[include.include.name] = get_file_digest(include.include.name)
+        tu.save(self._get_entry_path(key, self.AST_FILENAME))
+        return files
+
+    def store(self, key: str, files: tp.Dict[str, str], options: str, output_dir: str,
+              output_names: tp.Iterable[str]):
+        """
+        写入输出快照与清单
+        :param key: 缓存key
+        :param files: save_tu 的返回值
+        :param options: 影响翻译结果的非clang选项摘要
+        :param output_dir: 输出根目录
+        :param output_names: 本次生成的文件(相对输出根目录)
+        """
+        entry_path = self._get_entry_path(key)
+        snapshot_dir = self._get_entry_path(key, self.OUTPUT_DIRNAME)
+        if os.path.exists(snapshot_dir):
+            shutil.rmtree(snapshot_dir)
+        os.makedirs(snapshot_dir)
+
+        outputs = {}
+        for name in output_names:
+            target = os.path.join(snapshot_dir, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(os.path.join(output_dir, name), target)
+            outputs[name] = get_file_digest(target)
+
+        with open(os.path.join(entry_path, self.MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+            json.dump({"files": files, "options": options, "outputs": outputs}, f, indent=1)
+
+    @staticmethod
+    def list_outputs(output_dir: str, arch_dir: str) -> tp.List[str]:
+        """
+        :param output_dir: 输出根目录
+        :param arch_dir: 架构输出目录
+        :return: 生成的文件(相对输出根目录)
+        """
+        names = [os.path.relpath(os.path.join(output_dir, "__init__.py"), output_dir)]
+        for dirpath, dirnames, filenames in os.walk(arch_dir):
+            dirnames[:] = sorted(d for d in dirnames if d != "__pycache__")
+            for filename in sorted(filenames):
+                names.append(os.path.relpath(os.path.join(dirpath, filename), output_dir).replace("\\", "/"))
+        return names
+
+
+class PchCache:
+    """
+    前缀头文件的预编译头(PCH)缓存
+    以 前缀头文件 + clang参数 + libclang版本 作为key，每个key保存:
+        - 包含全部前缀头文件的 prefix.h 以及生成的 PCH
+        - 参与编译的文件的内容摘要，文件改变时重新生成
+        - PCH 中的包含关系，-include-pch 解析的 TranslationUnit.get_includes() 不含这些文件
+    PCH 文件名取自这些摘要，内容变化后路径随之变化，依赖 -include-pch 参数的 ParseCache 也就自然失效
+    """
+    MANIFEST_FILENAME = "manifest.json"
+    PREFIX_FILENAME = "prefix.h"
+    build_options = TranslationUnit.PARSE_INCOMPLETE | TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
+
+    def __init__(self, cache_dir: str):
+        """
+        :param cache_dir: 缓存目录
+        """
+        self.path = os.path.abspath(cache_dir)
+
+    @staticmethod
+    def get_build_args(args: tp.Iterable[str]) -> tp.List[str]:
+        """
+        PCH 必须与之后的解析使用相同的参数，只是按头文件编译
+        -include 指定的文件仍由解析时处理，否则会被 PCH 中的 include guard 跳过
+        """
+        build_args = []
+        for arg in args:
+            if arg.startswith("-include"):
+                continue
+            build_args.append("c++-header" if build_args and build_args[-1] == "-x" and arg == "c++" else arg)
+        return build_args
+
+    def make_key(self, prefix_headers: tp.Iterable[str], args: tp.Iterable[str]) -> str:
+        """
+        :param prefix_headers: 前缀头文件的绝对路径
+        :param args: 解析参数
+        :return: 缓存key
+        """
+        content = json.dumps([list(prefix_headers), self.get_build_args(args), get_libclang_version()])
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def _get_entry_path(self, key: str, *names: str) -> str:
+        return os.path.join(self.path, key, *names)
+
+    def load(self, key: str) -> tp.Optional[str]:
+        """
+        :param key: 缓存key
+        :return: 参与编译的文件均未改变时返回 PCH 路径，否则返回None
+        """
+        try:
+            with open(self._get_entry_path(key, self.MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if "includes" not in manifest:  # 旧版本的清单
+            return None
+        for path, digest in manifest["files"].items():
+            if get_file_digest(path) != digest:
+                logging.debug("pch miss: {} changed".format(path))
+                return None
+        pch_path = self._get_entry_path(key, manifest["pch"])
+        return pch_path if os.path.exists(pch_path) else None
+
+    def build(self, key: str, index: Index, prefix_headers: tp.Iterable[str], args: tp.Iterable[str]) -> str:
+        """
+        编译前缀头文件并保存
+        :param key: 缓存key
+        :param index: clang Index
+        :param prefix_headers: 前缀头文件的绝对路径
+        :param args: 解析参数
+        :return: PCH 路径
+        """
+        entry_path = self._get_entry_path(key)
+        if os.path.exists(entry_path):
+            shutil.rmtree(entry_path)
+        os.makedirs(entry_path)
+        prefix_headers = list(prefix_headers)
+        prefix_path = self._get_entry_path(key, self.PREFIX_FILENAME)
+        with open(prefix_path, "w", encoding="utf-8") as f:
+            f.write("".join("#include \"{}\"\n".format(path.replace("\\", "/")) for path in prefix_headers))
+
+        tu = index.parse(prefix_path, args=self.get_build_args(args), options=self.build_options)
+        for diagnostic in tu.diagnostics:
+            if diagnostic.severity >= Diagnostic.Error:
+                logging.error("pch: {}".format(diagnostic))
+        files = {path: get_file_digest(path) for path in prefix_headers}
+        includes = []
+        for include in tu.get_includes():
+            files[include.include.name] = get_file_digest(include.include.name)
+            source = include.source.name if include.source is not None else None
+            includes.append([None if source == prefix_path else source, include.include.name])
+        pch_name = "{}.pch".format(hashlib.sha1(json.dumps(sorted(files.items())).encode("utf-8")).hexdigest())
+        tu.save(self._get_entry_path(key, pch_name))
+        with open(self._get_entry_path(key, self.MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+            json.dump({"prefix_headers": prefix_headers, "files": files, "pch": pch_name, "includes": includes}, f,
+                      indent=1)
+        return self._get_entry_path(key, pch_name)
+
+    def get_includes(self, pch_path: str) -> tp.List[tp.Tuple[tp.Optional[str], str]]:
+        """
+        :param pch_path: get 返回的 PCH 路径
+        :return: PCH 中的包含关系 (包含者, 被包含的文件)，按预处理顺序，前缀头文件的包含者为None
+        """
+        with open(os.path.join(os.path.dirname(pch_path), self.MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+            return [(source, include) for source, include in json.load(f)["includes"]]
+
+    def get(self, index: Index, prefix_headers: tp.Iterable[str], args: tp.Iterable[str]) -> str:
+        """:return: 可用的 PCH 路径，不存在或者已过期时重新生成"""
+        prefix_headers = list(prefix_headers)
+        key = self.make_key(prefix_headers, args)
+        pch_path = self.load(key)
+        if pch_path is None:
+            logging.info("build pch: {}".format(", ".join(prefix_headers)))
+            pch_path = self.build(key, index, prefix_headers, args)
+        return pch_path
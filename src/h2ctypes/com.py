@@ -1,4 +1,15 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+import inspect
+import json
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
 from ctypes import *
+from ctypes import _Pointer, _CFuncPtr, _SimpleCData
 from functools import partial
 
 # type缺失时，默认的c-type，一般是平台内建类型，这部分需要手动确认
@@ -9,7 +20,7 @@ UNEXPOSED_TYPE_STR = "UNEXPOSED_TYPE"
 
 
 def IsConstArg(obj):
-    """标识一个const参数"""
+    """标识一个const参数，不改变类型；导出接口中指向 const 的指针参数由 CtypesDll._const_args_ 给出"""
     return obj
 
 
@@ -39,6 +50,70 @@ class IsEnumType:
     pass
 
 
+def get_dtype(record):
+    """
+    生成的 Structure/Union 对应的 numpy 结构化 dtype，需要以 dtype_layout=True 生成
+    字段偏移与记录大小来自 clang 的布局(_dtype_layout_)，字段类型由 _fields_ 推导，位域不包含在内
+    numpy 为可选依赖，首次调用时才导入，结果缓存在类上
+    clang 的记录大小与 ctypes 类的大小不同时(例如成员为 DEFAULT_LACK_C_TYPE 等占位类型)抛出 TypeError
+    """
+    dtype = record.__dict__.get("_dtype_")
+    if dtype is None:
+        import numpy
+        layout = record.__dict__.get("_dtype_layout_")
+        if layout is None:
+            raise TypeError("{} has no dtype layout".format(record.__name__))
+        size, fields = layout
+        if size != sizeof(record):
+            raise TypeError("{} layout size {} does not match sizeof {}, the ctypes class does not describe the "
+                            "C layout".format(record.__name__, size, sizeof(record)))
+        types = {item[0]: item[1] for item in record._fields_}
+        dtype = numpy.dtype({
+            "names": [name for name, _, _ in fields],
+            "formats": [numpy.dtype(format_) if format_ else _get_field_dtype(numpy, types[name])
+                        for name, _, format_ in fields],
+            "offsets": [offset for _, offset, _ in fields],
+            "itemsize": size
+        })
+        record._dtype_ = dtype
+    return dtype
+
+
+def _get_field_dtype(numpy, type_):
+    if issubclass(type_, (_Pointer, _CFuncPtr, c_void_p, c_char_p, c_wchar_p)):
+        return numpy.dtype("u{}".format(sizeof(type_)))
+    if issubclass(type_, Array):
+        if type_._type_ is c_char:  # 字符数组按定长字节串表示
+            return numpy.dtype("S{}".format(type_._length_))
+        return numpy.dtype((_get_field_dtype(numpy, type_._type_), (type_._length_, )))
+    if "_dtype_layout_" in type_.__dict__:
+        return get_dtype(type_)
+    try:
+        return numpy.dtype(type_)
+    except (TypeError, ValueError, NotImplementedError):
+        return numpy.dtype("V{}".format(sizeof(type_)))
+
+
+def as_ndarray(record, source, count=-1, offset=0):
+    """
+    不复制数据，把一段内存视为 record 的 numpy 数组
+    :param record: 生成的 Structure/Union
+    :param source: 支持缓冲区协议的对象(bytes、bytearray、ctypes 数组或者实例等)、地址或者指针
+    :param count: 记录数，-1 表示 source 中的全部记录，source 为地址或者指针时必须指定
+    :param offset: 起始字节偏移
+    """
+    import numpy
+    dtype = get_dtype(record)
+    if isinstance(source, (_Pointer, c_void_p)):
+        source = cast(source, c_void_p).value
+    if isinstance(source, int):
+        if count < 0:
+            raise ValueError("count is required when source is an address")
+        source = (c_char * (dtype.itemsize * count)).from_address(source + offset)
+        offset = 0
+    return numpy.frombuffer(source, dtype, count, offset)
+
+
 def create_dll_interface(f: CFUNCTYPE, dll, name):
     """根据函数指针定义dll中某个接口"""
     if hasattr(dll, name):
@@ -48,15 +123,591 @@ def create_dll_interface(f: CFUNCTYPE, dll, name):
         return obj
 
 
+class _Py_buffer(Structure):
+    _fields_ = [
+        ("buf", c_void_p),
+        ("obj", c_void_p),
+        ("len", c_ssize_t),
+        ("itemsize", c_ssize_t),
+        ("readonly", c_int),
+        ("ndim", c_int),
+        ("format", c_char_p),
+        ("shape", POINTER(c_ssize_t)),
+        ("strides", POINTER(c_ssize_t)),
+        ("suboffsets", POINTER(c_ssize_t)),
+        ("internal", c_void_p),
+    ]
+
+
+_PyBUF_C_CONTIGUOUS = 0x0038
+# 独立的函数原型，不修改 pythonapi 上共享的函数对象；失败时抛出 Python 设置的异常
+_get_buffer = PYFUNCTYPE(c_int, py_object, POINTER(_Py_buffer), c_int)(("PyObject_GetBuffer", pythonapi))
+_release_buffer = PYFUNCTYPE(None, POINTER(_Py_buffer))(("PyBuffer_Release", pythonapi))
+# ctypes 自身可以处理的参数
+_NATIVE_ARGS = (type(None), int, str, _SimpleCData, _Pointer, _CFuncPtr, Array, Structure, Union)
+
+
+def _release_views(views: list):
+    for view in views:
+        _release_buffer(byref(view))
+
+
+class BufferInterface:
+    """
+    包装 dll 接口，指针参数(POINTER(T)、c_void_p、c_char_p)可以直接传入支持缓冲区协议的对象，
+    例如 bytes、bytearray、memoryview、array.array、numpy 数组
+        - 不复制数据，直接传入缓冲区地址，调用期间持有缓冲区，对象不会被释放或者改变大小
+        - 缓冲区必须 C 连续，元素大小为 1 或者 sizeof(T)，总字节数为 sizeof(T) 的整数倍
+        - 非 const 的 POINTER(T) 参数可能被写入，只接受可写的缓冲区；只读的 bytes、只读 numpy 数组等
+          可以传给 const T *(const_args 中的下标)以及 c_char_p、c_void_p
+        - 其它参数以及 ctypes 对象按 ctypes 原有的规则转换
+    """
+    def __init__(self, func, const_args: tuple = ()):
+        """
+        :param func: dll 接口
+        :param const_args: 指向 const 的指针参数下标，原型中不保留 const，由生成的 Dll._const_args_ 给出
+        """
+        self.__wrapped__ = func
+        self._pointers = []
+        for index, argtype in enumerate(func.argtypes or ()):
+            if isinstance(argtype, type) and issubclass(argtype, _Pointer):
+                self._pointers.append((index, argtype, sizeof(argtype._type_), _NATIVE_ARGS, index not in const_args))
+            elif argtype in (c_void_p, c_char_p):  # bytes 由 ctypes 直接传入内部指针
+                self._pointers.append((index, argtype, 0 if argtype is c_void_p else 1, _NATIVE_ARGS + (bytes, ),
+                                       False))
+
+    def __getattr__(self, name):
+        return getattr(self.__wrapped__, name)
+
+    def __call__(self, *args):
+        views = []
+        try:
+            return self.__wrapped__(*self.convert(args, views))
+        finally:
+            _release_views(views)
+
+    def convert(self, args: tuple, views: list) -> tuple:
+        """:param views: 获取到的缓冲区，调用结束后由调用方释放"""
+        if self._pointers:
+            args = list(args)
+            for index, argtype, size, native, writable in self._pointers:
+                if index < len(args) and not isinstance(args[index], native):
+                    args[index] = self._from_buffer(index, args[index], argtype, size, writable, views)
+        return args
+
+    @staticmethod
+    def _from_buffer(index: int, value, argtype, size: int, writable: bool, views: list):
+        view = _Py_buffer()
+        try:
+            _get_buffer(value, byref(view), _PyBUF_C_CONTIGUOUS)
+        except TypeError:  # 不支持缓冲区协议，交给 ctypes 报错
+            return value
+        except (BufferError, ValueError) as e:
+            raise ArgumentError("argument {}: {}".format(index + 1, e)) from None
+        views.append(view)
+        if writable and view.readonly:
+            raise ArgumentError("argument {}: read-only buffer {} cannot be passed to {}".format(
+                index + 1, type(value).__name__, argtype.__name__))
+        if size > 1 and (view.itemsize not in (1, size) or view.len % size):
+            raise ArgumentError("argument {}: buffer of {} bytes with itemsize {} does not match {} ({} bytes)"
+                                .format(index + 1, view.len, view.itemsize, argtype.__name__, size))
+        return cast(c_void_p(view.buf), argtype)
+
+
+class _CallbackScope:
+    """CallbackRegistry.scope() 中注册的键，退出后关闭，之后在该 scope 的上下文中注册的 thunk 不再归它管理"""
+    __slots__ = ("keys", "closed")
+
+    def __init__(self):
+        self.keys = set()
+        self.closed = False
+
+
+class CallbackRegistry:
+    """
+    回调 thunk 注册表，Python 函数 -> 回调原型(CFUNCTYPE)对象
+        - 同一函数以同一原型多次注册时复用同一个 thunk，不重复构造
+        - 注册表持有 thunk 的引用，C 代码仍在使用时 thunk 不会被回收
+        - scope() 中注册的 thunk 在退出时释放；scope 按 contextvars 上下文区分，
+          AsyncDll 在线程池中执行的调用沿用发起调用的协程的 scope
+        - scope() 之外注册的 thunk 保留到 release，最多保留 maxsize 个，超出时释放最久未使用的，
+          C 代码长期持有的回调需要调用方自己保存 thunk 的引用
+    """
+    def __init__(self, maxsize: int = 128):
+        """:param maxsize: scope() 之外最多保留的 thunk 数，None 表示不限制"""
+        # (原型, 函数) -> [thunk, 是否保留, 引用它的 scope 数, 命中次数]
+        self._thunks = {}
+        # scope() 之外保留的键，按最近使用排序
+        self._pinned = collections.OrderedDict()
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+        self._scopes = contextvars.ContextVar("h2ctypes_callback_scopes", default=())
+
+    def thunk(self, prototype, callback):
+        """
+        :param prototype: 回调原型，CFUNCTYPE 创建的类型
+        :param callback: Python 函数
+        :return: 可以传给接口的回调对象
+        """
+        key = (prototype, callback)
+        with self._lock:
+            entry = self._thunks.get(key)
+            if entry is None:
+                entry = self._thunks[key] = [prototype(callback), False, 0, 0]
+            else:
+                entry[3] += 1
+            scope = next((scope for scope in reversed(self._scopes.get()) if not scope.closed), None)
+            if scope is not None:
+                if key not in scope.keys:
+                    scope.keys.add(key)
+                    entry[2] += 1
+            else:
+                self._pin(key, entry)
+            return entry[0]
+
+    def _pin(self, key, entry: list):
+        entry[1] = True
+        self._pinned[key] = None
+        self._pinned.move_to_end(key)
+        while self._maxsize is not None and len(self._pinned) > self._maxsize:
+            self._unpin(self._pinned.popitem(last=False)[0])
+
+    def _unpin(self, key):
+        entry = self._thunks[key]
+        entry[1] = False
+        self._pinned.pop(key, None)
+        if not entry[2]:
+            del self._thunks[key]
+
+    def release(self, callback, prototype=None):
+        """
+        取消 scope() 之外的注册，没有 scope 引用时释放 thunk，调用前须确认 C 代码不再使用该回调
+        :param callback: Python 函数
+        :param prototype: 回调原型，None 表示所有原型
+        """
+        with self._lock:
+            for key in [key for key in self._thunks if key[1] == callback and prototype in (None, key[0])]:
+                self._unpin(key)
+
+    def evict(self, callback=None):
+        """
+        强制释放 thunk，忽略保留与 scope
+        :param callback: Python 函数，None 表示全部
+        """
+        with self._lock:
+            for key in [key for key in self._thunks if callback is None or key[1] == callback]:
+                del self._thunks[key]
+                self._pinned.pop(key, None)
+
+    @contextlib.contextmanager
+    def scope(self):
+        """
+        当前上下文在 with 块中注册的 thunk 在退出时释放，用于只在调用期间使用的回调
+        退出时只移除自己，嵌套的 scope 不按顺序退出(例如交错的协程)也不会互相影响
+        """
+        scope = _CallbackScope()
+        self._scopes.set(self._scopes.get() + (scope, ))
+        try:
+            yield self
+        finally:
+            self._scopes.set(tuple(item for item in self._scopes.get() if item is not scope))
+            with self._lock:
+                scope.closed = True
+                for key in scope.keys:
+                    entry = self._thunks.get(key)
+                    if entry is not None:
+                        entry[2] -= 1
+                        if not entry[1] and not entry[2]:
+                            del self._thunks[key]
+
+    def live(self) -> list:
+        """存活的 thunk，用于排查泄漏"""
+        with self._lock:
+            return [{
+                "prototype": prototype.__name__,
+                "callback": getattr(callback, "__qualname__", repr(callback)),
+                "address": cast(entry[0], c_void_p).value,
+                "pinned": entry[1],
+                "scopes": entry[2],
+                "hits": entry[3]
+            } for (prototype, callback), entry in self._thunks.items()]
+
+    def __len__(self):
+        return len(self._thunks)
+
+
+class CallbackInterface:
+    """包装 dll 接口，回调参数可以直接传入 Python 函数，由 CallbackRegistry 转换为 thunk"""
+    def __init__(self, func, registry: CallbackRegistry):
+        self.__wrapped__ = func
+        self._registry = registry
+        self._callbacks = [(index, argtype) for index, argtype in enumerate(func.argtypes or ())
+                           if isinstance(argtype, type) and issubclass(argtype, _CFuncPtr)]
+
+    def __getattr__(self, name):
+        return getattr(self.__wrapped__, name)
+
+    def __call__(self, *args):
+        return self.__wrapped__(*self.convert(args))
+
+    def convert(self, args: tuple, views: list = None) -> tuple:
+        if self._callbacks:
+            args = list(args)
+            for index, argtype in self._callbacks:
+                if index < len(args) and callable(args[index]) and not isinstance(args[index], _CFuncPtr):
+                    args[index] = self._registry.thunk(argtype, args[index])
+        return args
+
+
+class CallProfiler:
+    """
+    接口调用统计，按接口名记录调用次数、累计耗时与耗时分位数
+        - latency 为调用接口的总耗时
+        - convert 为 BufferInterface、CallbackInterface 转换参数的耗时
+        - ctypes_call 为 latency 减去 convert，即 ctypes 函数指针内的耗时，包含 ctypes 自身的参数、返回值转换，
+          不是单纯的外部函数耗时
+        - 分位数按每个接口最近 samples 次调用计算
+    """
+    def __init__(self, samples=10000):
+        """
+        :param samples: 每个接口保留的最近耗时样本数
+        """
+        self.clock = time.perf_counter
+        self._samples = samples
+        self._stats = collections.defaultdict(lambda: [0, 0.0, 0.0, 0, collections.deque(maxlen=samples)])
+        self._lock = threading.Lock()
+
+    def record(self, name: str, latency: float, convert: float, error=False):
+        with self._lock:
+            stats = self._stats[name]
+            stats[0] += 1
+            stats[1] += latency
+            stats[2] += convert
+            stats[3] += error
+            stats[4].append(latency)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def snapshot(self) -> dict:
+        """
+        :return: 接口名 -> 统计值，时间单位为秒
+        """
+        with self._lock:
+            stats = {name: (count, total, convert, errors, sorted(samples))
+                     for name, (count, total, convert, errors, samples) in self._stats.items()}
+        return {name: {
+            "count": count,
+            "errors": errors,
+            "total": total,
+            "mean": total / count,
+            "convert": convert,
+            "ctypes_call": max(total - convert, 0.0),
+            "min": samples[0],
+            "max": samples[-1],
+            "p50": self._percentile(samples, 50),
+            "p90": self._percentile(samples, 90),
+            "p99": self._percentile(samples, 99)
+        } for name, (count, total, convert, errors, samples) in sorted(stats.items())}
+
+    @staticmethod
+    def _percentile(samples: list, percent: int) -> float:
+        return samples[min(len(samples) - 1, len(samples) * percent // 100)]
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.snapshot(), **kwargs)
+
+
+class ProfiledInterface:
+    """
+    包装 dll 接口，调用时向 CallProfiler 记录耗时，位于最外层
+    依次执行内层 BufferInterface、CallbackInterface 的参数转换并单独计时，再直接调用 ctypes 函数指针
+    """
+    def __init__(self, func, profiler: CallProfiler):
+        self.__wrapped__ = func
+        self._name = func.__name__
+        self._profiler = profiler
+        self._stages = []
+        while isinstance(func, (BufferInterface, CallbackInterface)):
+            self._stages.append(func)
+            func = func.__wrapped__
+        self._func = func
+
+    def __getattr__(self, name):
+        return getattr(self.__wrapped__, name)
+
+    def __call__(self, *args):
+        clock = self._profiler.clock
+        start = clock()
+        begin = None
+        views = []
+        try:
+            for stage in self._stages:
+                args = stage.convert(args, views)
+            begin = clock()
+            result = self._func(*args)
+        except BaseException:
+            end = clock()
+            self._profiler.record(self._name, end - start, (end if begin is None else begin) - start, True)
+            raise
+        finally:
+            _release_views(views)
+        self._profiler.record(self._name, clock() - start, begin - start)
+        return result
+
+
+class AsyncDll:
+    """
+    CtypesDll 的 asyncio 门面，await dll.async_.Func(...) 在线程池中调用接口，不阻塞事件循环
+        - 线程池有界，首次调用时创建；ctypes 在外部调用期间释放 GIL
+        - limits 限制单个接口的并发数，超出时在事件循环中等待，不占用线程池；
+          每个事件循环使用各自的信号量，多个事件循环同时调用时分别计数
+        - 协程被取消时，仍在线程池中排队的调用随之取消、不会执行；已经开始的外部调用无法中断，会执行完，
+          参数在外部调用结束前一直被引用，输出参数与回调不会提前释放
+        - 外部线程中触发的回调可以用 threadsafe 转到事件循环线程执行
+    """
+    def __init__(self, dll: "CtypesDll", max_workers: int = None, limits: dict = None):
+        """
+        :param dll: 同步的 CtypesDll
+        :param max_workers: 线程池大小，None 使用 ThreadPoolExecutor 的默认值
+        :param limits: 接口名 -> 最大并发数
+        """
+        self._dll = dll
+        self._max_workers = max_workers
+        self._limits = dict(limits or {})
+        self._semaphores = weakref.WeakKeyDictionary()  # 事件循环 -> 接口名 -> asyncio.Semaphore
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        dll = self.__dict__.get("_dll")
+        if dll is None or name not in type(dll)._interfaces_:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        func = dll.get_interface(name)
+        # dll中不存在的接口为None，与同步接口一致
+        if func is not None:
+            func = partial(self._call, name)
+        self.__dict__[name] = func
+        return func
+
+    async def _call(self, name: str, *args):
+        loop = asyncio.get_running_loop()
+        # 每次调用时取接口，开关性能统计后重新包装的接口也能生效
+        func = self._dll.get_interface(name)
+        semaphore = self._get_semaphore(loop, name)
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            # 在调用方上下文的副本中执行，接口中注册的回调归属调用方的 CallbackRegistry.scope()
+            future = self._get_executor().submit(contextvars.copy_context().run, func, *args)
+        except BaseException:
+            if semaphore is not None:
+                semaphore.release()
+            raise
+        if semaphore is not None:
+            # 外部调用结束(或者尚未开始就被取消)才释放，取消协程不会突破并发限制
+            future.add_done_callback(partial(self._release, loop, semaphore))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _get_semaphore(self, loop, name: str):
+        limit = self._limits.get(name)
+        if limit is None:
+            return None
+        # asyncio.Semaphore 绑定首次使用它的事件循环
+        semaphores = self._semaphores.setdefault(loop, {})
+        semaphore = semaphores.get(name)
+        if semaphore is None:
+            semaphore = semaphores[name] = asyncio.Semaphore(limit)
+        return semaphore
+
+    @staticmethod
+    def _release(loop, semaphore, _):
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(semaphore.release)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._max_workers, thread_name_prefix="h2ctypes-async")
+            return self._executor
+
+    @staticmethod
+    def threadsafe(callback, wait=True):
+        """
+        包装回调，在外部线程中触发时转到当前事件循环线程执行，必须在事件循环中调用
+        包装后的函数仍需用回调原型(CFUNCTYPE)包装后传给接口
+        :param callback: 普通函数或者协程函数
+        :param wait: True 等待回调执行完并返回其结果，False 不等待，返回None
+        """
+        loop = asyncio.get_running_loop()
+        loop_thread = threading.get_ident()
+        is_coroutine = inspect.iscoroutinefunction(callback)
+
+        def wrapper(*args):
+            if threading.get_ident() == loop_thread:
+                # 事件循环线程中同步调用接口时触发，等待会死锁
+                if is_coroutine:
+                    asyncio.ensure_future(callback(*args))
+                    return None
+                return callback(*args)
+            if is_coroutine:
+                future = asyncio.run_coroutine_threadsafe(callback(*args), loop)
+            else:
+                future = Future()
+
+                def run():
+                    if future.set_running_or_notify_cancel():
+                        try:
+                            future.set_result(callback(*args))
+                        except BaseException as e:
+                            future.set_exception(e)
+                loop.call_soon_threadsafe(run)
+            return future.result() if wait else None
+        return wrapper
+
+    def close(self, wait=True):
+        """关闭线程池，之后的调用会重新创建线程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
 class CtypesDll:
     """ctypes dll"""
-    def __init__(self, dll_file_path: str):
+    # 导出接口名 -> 函数原型(CFUNCTYPE)，由生成的子类填充
+    _interfaces_ = {}
+    # 导出接口名 -> 指向 const 的指针参数下标，由生成的子类填充，BufferInterface 允许这些参数传入只读缓冲区
+    _const_args_ = {}
+
+    def __init__(self, dll_file_path: str, lazy=True, buffers=False, callbacks=False):
+        """
+        :param dll_file_path: dll路径
+        :param lazy: True 首次访问接口时才绑定，False 立即绑定所有接口
+        :param buffers: True 接口包装为 BufferInterface，指针参数可以零拷贝地传入缓冲区对象
+        :param callbacks: True 有回调参数的接口包装为 CallbackInterface，回调参数可以直接传入 Python 函数
+        """
         self._dll = CDLL(dll_file_path)
+        self._buffers = buffers
+        self._callbacks = callbacks
+        self._profiler = None
         self._setup()
+        if not lazy:
+            self.bind_all()
 
     def _setup(self):
         ...
 
+    def __getattr__(self, name):
+        # 反序列化、复制时 __init__ 尚未执行，没有 _dll
+        if name not in type(self)._interfaces_ or self.__dict__.get("_dll") is None:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        obj = self.__dict__[name] = self._bind(name)
+        return obj
+
+    def get_interface(self, name: str):
+        """
+        按名字获取接口，与 CtypesDll 成员同名(例如 profile)、无法通过属性访问的接口也可以获取
+        :return: 绑定的接口，dll中不存在时为None
+        """
+        if name not in self._interfaces_:
+            raise AttributeError("'{}' has no interface '{}'".format(type(self).__name__, name))
+        if not hasattr(type(self), name):
+            return getattr(self, name)
+        shadowed = self.__dict__.setdefault("_shadowed", {})
+        if name not in shadowed:
+            shadowed[name] = self._bind(name)
+        return shadowed[name]
+
+    def _bind(self, name: str):
+        # dll中不存在的接口绑定为None，与 create_dll_interface 一致
+        obj = create_dll_interface(self._interfaces_[name], self._dll, name)
+        return None if obj is None else self._wrap(name, obj)
+
+    def _wrap(self, name: str, obj):
+        if self._buffers:
+            obj = BufferInterface(obj, self._const_args_.get(name, ()))
+        if self._callbacks and any(isinstance(argtype, type) and issubclass(argtype, _CFuncPtr)
+                                   for argtype in obj.argtypes or ()):
+            obj = CallbackInterface(obj, self.callbacks)
+        if self._profiler is not None:
+            obj = ProfiledInterface(obj, self._profiler)
+        return obj
+
+    def bind_all(self, strict=False):
+        """
+        立即绑定所有导出接口
+        :param strict: True dll中缺失接口时抛出AttributeError
+        :return: dll中缺失的接口名列表
+        """
+        missing = [name for name in self._interfaces_ if self.get_interface(name) is None]
+        if missing and strict:
+            raise AttributeError("missing symbols in {}: {}".format(self._dll._name, ", ".join(missing)))
+        return missing
+
     @property
     def origin_dll(self) -> CDLL:
         return self._dll
+
+    @property
+    def profiler(self) -> "CallProfiler":
+        """当前的调用统计，未开启时为None"""
+        return self._profiler
+
+    def profile(self, enabled=True, profiler: CallProfiler = None) -> "CallProfiler":
+        """
+        开关调用统计，重新包装已绑定的接口；关闭后接口恢复为原来的对象，没有额外开销
+        调用方自己保存的接口对象不受影响
+        :param enabled: True 开启，False 关闭
+        :param profiler: 开启时使用的 CallProfiler，None 时沿用当前的或者新建
+        :return: 开启时为使用的 CallProfiler
+        """
+        if enabled:
+            self._profiler = profiler or self._profiler or CallProfiler()
+        else:
+            self._profiler = None
+        for bound in (self.__dict__, self.__dict__.get("_shadowed", {})):
+            for name in self._interfaces_:
+                if bound.get(name) is not None:
+                    bound[name] = self._wrap(name, getattr(self._dll, name))
+        return self._profiler
+
+    @contextlib.contextmanager
+    def profiling(self, profiler: CallProfiler = None):
+        """
+        统计 with 块中的调用，退出时恢复原来的统计状态
+        :param profiler: None 时新建 CallProfiler
+        """
+        previous = self._profiler
+        profiler = self.profile(True, profiler or CallProfiler())
+        try:
+            yield profiler
+        finally:
+            self.profile(previous is not None, previous)
+
+    @property
+    def callbacks(self) -> CallbackRegistry:
+        """回调 thunk 注册表，首次访问时创建"""
+        if "_registry" not in self.__dict__:
+            self.__dict__["_registry"] = CallbackRegistry()
+        return self.__dict__["_registry"]
+
+    @property
+    def async_(self) -> AsyncDll:
+        """asyncio 门面，使用默认配置，首次访问时创建"""
+        if "_async" not in self.__dict__:
+            self.__dict__["_async"] = AsyncDll(self)
+        return self.__dict__["_async"]
+
+    def configure_async(self, max_workers: int = None, limits: dict = None) -> AsyncDll:
+        """
+        重新配置 asyncio 门面，原有的线程池在已提交的调用结束后关闭
+        :param max_workers: 线程池大小
+        :param limits: 接口名 -> 最大并发数
+        """
+        previous = self.__dict__.get("_async")
+        self.__dict__["_async"] = AsyncDll(self, max_workers, limits)
+        if previous is not None:
+            previous.close(wait=False)
+        return self.__dict__["_async"]
@@ -1,7 +1,7 @@
 import logging
 import typing as tp
 
-from clang.cindex import Cursor
+from clang.cindex import Cursor, CursorKind
 
 from .project import Solution, Header
 from .decl import Decl, UNEXPOSED_DECL, VAR_DECL, ENUM_DECL, PARM_DECL, UNION_DECL, STRUCT_DECL, \
@@ -15,8 +15,11 @@ class CursorTranslator:
         self._solution = solution
 
     def translate_all(self, cursors: tp.Iterable[Cursor]):
+        """翻译顶层声明，solution.reachable 不为 None 时跳过不在其中的声明"""
+        reachable = self._solution.reachable
         for cursor in cursors:
-            self.translate(cursor)
+            if reachable is None or cursor.kind == CursorKind.UNEXPOSED_DECL or cursor.get_usr() in reachable:
+                self.translate(cursor)
 
     def translate(
         self,
@@ -28,9 +31,9 @@ class CursorTranslator:
         if decl:
             self._solution.pre_define(decl)
             decl.translate(self._solution, is_builtin=is_builtin, is_ignore=is_ignore)
+            decl.release()
             if not is_ignore:
-                self._solution.define(decl)
-                header.define(decl)
+                self._solution.define(decl, header)
             return decl
 
     def _get_available_decl_and_header(
@@ -1,14 +1,25 @@
+import copyreg
 import typing as tp
 
-from clang.cindex import Cursor, CursorKind
+from clang.cindex import Cursor, CursorKind, LinkageKind, TypeKind
 
 from .project import Solution
-from .com import IsEnumField, IsCallableArg
-from .type import is_legal_id
+from .com import IsEnumField, IsCallableArg, DEFAULT_LACK_C_TYPE_STR, UNEXPOSED_TYPE_STR
+from .type import is_legal_id, get_plain_spelling, is_const_pointer
 from .template import *
+from .writer import CodeWriter
 
 anonymous_count = 0
 
+# 并行生成时声明会传给工作进程，clang 的枚举按 id 还原为同一个对象，否则 == 与 name 都不可用
+copyreg.pickle(LinkageKind, lambda kind: (LinkageKind.from_id, (kind.value, )))
+
+
+def reset_anonymous_names():
+    """每次翻译前调用，常驻进程多次翻译时匿名类型名保持稳定"""
+    global anonymous_count
+    anonymous_count = 0
+
 
 def get_anonymous_name(type_: str = None) -> str:
     global anonymous_count
@@ -16,26 +27,39 @@ def get_anonymous_name(type_: str = None) -> str:
     return "Anonymous{}{}".format(anonymous_count, "_" + type_ if type_ else "")
 
 
+def emit_record_layout(decl: "Decl", writer: CodeWriter):
+    """写入 Structure/Union 的 _dtype_layout_，没有可表示的字段或者大小未知时不写入"""
+    if decl.size > 0 and any(item.offset is not None for item in decl.items):
+        writer.write_template(DTYPE_LAYOUT_TEMPLATE, decl.spelling, decl.size, decl._emit_items(1, "emit_layout"))
+
+
 def set_text_template(template: str, depth, *args):
     strings = template.format(*args).split("\n")
     for index, string in enumerate(strings[:-1]):
-        strings[index] = "\t" * depth + string
+        strings[index] = INDENT * depth + string
     return "\n".join(strings)
 
 
 class Decl:
+    """
+    translate 时从游标复制出生成所需的字段，完成后 release 释放游标，
+    生成阶段不再引用 libclang 对象，TranslationUnit 可以提前释放
+    """
+    __slots__ = ("spelling", "hash", "usr", "cursor", "link_kind", "items", "type", "typing", "value")
+
     spelling: str
     hash: int
-    cursor: Cursor
+    usr: str
+    cursor: tp.Optional[Cursor]
     type: str
     typing: str
     value: tp.Any
     items: tp.List["Decl"]
-    comment: str
 
     def __init__(self, cursor: Cursor):
         self.spelling = cursor.spelling
         self.hash = cursor.hash
+        self.usr = cursor.get_usr()
         self.cursor = cursor
         self.link_kind = cursor.linkage
         self.items = []
@@ -45,30 +69,54 @@ class Decl:
 
     def translate(self, solution: Solution, **kwargs): ...
 
-    def generate(self, depth=0) -> str: ...
+    def release(self):
+        self.cursor = None
 
-    def generate_declaration(self, depth=0) -> str: ...
+    @property
+    def is_exported(self) -> bool:
+        """是否为 Dll 的导出接口"""
+        return False
 
+    def emit(self, writer: CodeWriter):
+        """流式写入定义部分，默认为空"""
+
+    def emit_declaration(self, writer: CodeWriter):
+        """流式写入声明部分，默认为空"""
+
+    def emit_layout(self, writer: CodeWriter):
+        """流式写入 numpy 结构化 dtype 的布局，默认为空"""
 
-class UNEXPOSED_DECL(Decl):
     def generate(self, depth=0) -> str:
-        return ""
+        return CodeWriter.render(self.emit, depth)
 
     def generate_declaration(self, depth=0) -> str:
-        return ""
+        return CodeWriter.render(self.emit_declaration, depth)
+
+    def _emit_items(self, depth: int, method="emit") -> tp.Callable[[CodeWriter], None]:
+        def _emit(writer: CodeWriter):
+            with writer.indent(depth):
+                for item in self.items:
+                    getattr(item, method)(writer)
+        return _emit
+
+    def fingerprint(self) -> tuple:
+        """生成结果相关的声明摘要，用于增量生成"""
+        return (type(self).__name__, self.spelling, getattr(self, "type", None), getattr(self, "value", None),
+                getattr(self.link_kind, "name", None), [item.fingerprint() for item in self.items])
+
+
+class UNEXPOSED_DECL(Decl):
+    __slots__ = ()
 
     def translate(self, solution: Solution, **kwargs):
-        for child in self.cursor.get_children():
-            solution.cursor_handler.translate(child)
+        solution.cursor_handler.translate_all(self.cursor.get_children())
 
 
 class ENUM_DECL(Decl):
-    def generate(self, depth=0) -> str:
-        return ""
+    __slots__ = ()
 
-    def generate_declaration(self, depth=0) -> str:
-        return set_text_template(ENUM_DEFINE_TEMPLATE, depth, self.spelling, "".join([item.generate(depth + 1)
-                                                                                      for item in self.items]))
+    def emit_declaration(self, writer: CodeWriter):
+        writer.write_template(ENUM_DEFINE_TEMPLATE, self.spelling, self._emit_items(1))
 
     def translate(self, solution: Solution, **kwargs):
         self.type = solution.type_handler.translate(self.cursor.enum_type)
@@ -78,22 +126,38 @@ class ENUM_DECL(Decl):
 
 
 class ENUM_CONSTANT_DECL(Decl):
-    def generate(self, depth=0) -> str:
-        return set_text_template("{} = {}\n", depth, self.spelling, self.value)
+    __slots__ = ()
+
+    def emit(self, writer: CodeWriter):
+        writer.write("{} = {}\n".format(self.spelling, self.value))
 
     def translate(self, solution: Solution, **kwargs):
         self.value = self.cursor.enum_value
 
 
 class UNION_DECL(Decl):
-    def generate(self, depth=0) -> str:
-        return set_text_template(UNION_DEFINE_TEMPLATE, depth, self.spelling,
-                                 "".join([item.generate(depth + 2) for item in self.items]))
+    __slots__ = ("size", )
 
-    def generate_declaration(self, depth=0) -> str:
-        return set_text_template(UNION_DEFEINE_DECLARATION_TEMPLATE, depth, self.spelling)
+    size: int
+
+    def __init__(self, cursor: Cursor):
+        super().__init__(cursor)
+        self.size = -1
+
+    def emit(self, writer: CodeWriter):
+        writer.write_template(UNION_DEFINE_TEMPLATE, self.spelling, self._emit_items(2))
+
+    def emit_declaration(self, writer: CodeWriter):
+        writer.write_template(UNION_DEFEINE_DECLARATION_TEMPLATE, self.spelling)
+
+    def emit_layout(self, writer: CodeWriter):
+        emit_record_layout(self, writer)
+
+    def fingerprint(self) -> tuple:
+        return super().fingerprint() + (self.size, )
 
     def translate(self, solution: Solution, **kwargs):
+        self.size = self.cursor.type.get_size()
         for field in self.cursor.get_children():
             sub_field = solution.cursor_handler.translate(
                 field,
@@ -105,28 +169,42 @@ class UNION_DECL(Decl):
 
 
 class VAR_DECL(Decl):
-    def generate(self, depth=0) -> str:
-        return ""
-
-    def generate_declaration(self, depth=0) -> str:
-        return ""
+    __slots__ = ()
 
     def translate(self, solution: Solution, **kwargs):
         self.type = solution.type_handler.translate(self.cursor.type)
 
 
 class FIELD_DECL(Decl):
-    def generate(self, depth=0) -> str:
-        if self.cursor.is_bitfield():
-            return set_text_template("(\"{}\", {}, {}),\n", depth, self.spelling, self.type,
-                                     self.cursor.get_bitfield_width())
+    __slots__ = ("bitfield_width", "offset", "dtype_format")
+
+    bitfield_width: tp.Optional[int]
+    offset: tp.Optional[int]  # clang 布局中的字节偏移，None 表示无法用 numpy 表示，例如位域
+    dtype_format: tp.Optional[str]  # 没有对应 ctypes 类型时按原始字节表示
+
+    def __init__(self, cursor: Cursor):
+        super().__init__(cursor)
+        self.bitfield_width = None
+        self.offset = None
+        self.dtype_format = None
+
+    def emit(self, writer: CodeWriter):
+        if self.bitfield_width is not None:
+            writer.write("(\"{}\", {}, {}),\n".format(self.spelling, self.type, self.bitfield_width))
         else:
-            return set_text_template("(\"{}\", {}),\n", depth, self.spelling, self.type)
+            writer.write("(\"{}\", {}),\n".format(self.spelling, self.type))
 
-    def generate_declaration(self, depth=0) -> str:
-        return ""
+    def emit_layout(self, writer: CodeWriter):
+        if self.offset is not None:
+            writer.write("(\"{}\", {}, {}),\n".format(
+                self.spelling, self.offset, "\"{}\"".format(self.dtype_format) if self.dtype_format else None))
+
+    def fingerprint(self) -> tuple:
+        return super().fingerprint() + (self.bitfield_width, self.offset, self.dtype_format)
 
     def translate(self, solution: Solution, **kwargs):
+        if self.cursor.is_bitfield():
+            self.bitfield_width = self.cursor.get_bitfield_width()
         origin = self.cursor.type
         decl = origin.get_canonical().get_declaration()
         define = solution.get_define(decl)
@@ -140,26 +218,35 @@ class FIELD_DECL(Decl):
 
         if self.type.startswith("_"):
             self.type = solution.type_handler.translate(origin)
+        self._translate_layout()
+
+    def _translate_layout(self):
+        offset = self.cursor.get_field_offsetof()  # bit，出错时为负数
+        size = self.cursor.type.get_size()
+        if self.bitfield_width is not None or offset < 0 or offset % 8 or size <= 0:
+            return
+        self.offset = offset // 8
+        kind = self.cursor.type.get_canonical().kind
+        if kind not in (TypeKind.POINTER, TypeKind.BLOCKPOINTER) \
+                and (DEFAULT_LACK_C_TYPE_STR in self.type or UNEXPOSED_TYPE_STR in self.type):
+            self.dtype_format = "V{}".format(size)
 
 
 class PARM_DECL(Decl):
-    def generate(self, depth=0) -> str:
-        return self.type
+    __slots__ = ()
 
-    def generate_declaration(self, depth=0) -> str:
-        return ""
+    def emit(self, writer: CodeWriter):
+        writer.write(self.type)
 
     def translate(self, solution: Solution, **kwargs):
         self.type = solution.type_handler.translate(self.cursor.type)
         self.typing = solution.type_handler.translate(self.cursor.type, is_typing=True)
         if self.is_callback:  # parm func pointer
             decl = TYPEDEF_DECL(self.cursor)
-            decl.spelling = self.cursor.type.spelling or get_anonymous_name()
+            decl.spelling = get_plain_spelling(self.cursor.type.spelling) or get_anonymous_name()
             decl.type = self.typing
-            solution.define(decl)
-            header = solution.get_header(self.cursor.location.file.name)
-            if header:
-                header.define(decl)
+            solution.define(decl, solution.get_header(self.cursor.location.file.name))
+            decl.release()
             self.type = "{}({})".format(IsCallableArg.__name__, decl.spelling)
 
     @property
@@ -168,31 +255,33 @@ class PARM_DECL(Decl):
 
 
 class FUNCTION_DECL(Decl):
+    __slots__ = ("return_type", "const_args")
+
     return_type: str
+    const_args: tp.Tuple[int, ...]  # 指向 const 的指针参数下标，生成的原型中不保留 const
 
-    def generate(self, depth=0) -> str:
-        return ""
+    @property
+    def is_exported(self) -> bool:
+        return self.link_kind == LinkageKind.EXTERNAL
 
-    def generate_declaration(self, depth=0) -> str:
-        return set_text_template("{} = {}\n", depth, self.spelling, self.type)
+    def emit_declaration(self, writer: CodeWriter):
+        writer.write("{} = {}\n".format(self.spelling, self.type))
 
     def translate(self, solution: Solution, **kwargs):
         self.return_type = solution.type_handler.translate(self.cursor.result_type)
-        for arg in self.cursor.get_children():
-            if arg.kind == CursorKind.PARM_DECL:
-                self.items.append(solution.cursor_handler.translate(arg, is_ignore=True))
+        args = [arg for arg in self.cursor.get_children() if arg.kind == CursorKind.PARM_DECL]
+        for arg in args:
+            self.items.append(solution.cursor_handler.translate(arg, is_ignore=True))
+        self.const_args = tuple(index for index, arg in enumerate(args) if is_const_pointer(arg.type))
         self.type = "CFUNCTYPE({}, {})\n".format(self.return_type, ", ".join([item.type for item in self.items]))
 
 
 class TYPEDEF_DECL(Decl):
-    def generate(self, depth=0) -> str:
-        return ""
+    __slots__ = ()
 
-    def generate_declaration(self, depth=0) -> str:
-        if hasattr(self, "type"):
-            return set_text_template("{} = {}\n", depth, self.spelling, self.type) if self.spelling != self.type else ""
-        else:
-            return ""  # when same name define
+    def emit_declaration(self, writer: CodeWriter):
+        if hasattr(self, "type") and self.spelling != self.type:  # no type when same name define
+            writer.write("{} = {}\n".format(self.spelling, self.type))
 
     def translate(self, solution: Solution, **kwargs):
         origin = self.cursor.type
@@ -208,21 +297,31 @@ class TYPEDEF_DECL(Decl):
 
 
 class STRUCT_DECL(Decl):
+    __slots__ = ("_pack", "size")
+
     _overload_count = 0
-    _pack = 1
+    _pack: int
+    size: int
 
-    def generate(self, depth=0) -> str:
-        if self.empty:
-            return ""
-        return set_text_template(C_STRUCTURE_TEMPLATE, depth, self.spelling,
-                                 "".join([item.generate(depth + 1) for item in self.items]))
+    def __init__(self, cursor: Cursor):
+        super().__init__(cursor)
+        self._pack = 1
+        self.size = -1
 
-    def generate_declaration(self, depth=0) -> str:
-        return set_text_template(C_STRUCTURE_DECLARATION_TEMPLATE, depth, self.spelling, self._pack)
+    def emit(self, writer: CodeWriter):
+        if not self.empty:
+            writer.write_template(C_STRUCTURE_TEMPLATE, self.spelling, self._emit_items(1))
+
+    def emit_layout(self, writer: CodeWriter):
+        emit_record_layout(self, writer)
+
+    def emit_declaration(self, writer: CodeWriter):
+        writer.write_template(C_STRUCTURE_DECLARATION_TEMPLATE, self.spelling, self._pack)
 
     def translate(self, solution: Solution, **kwargs):
 
         self._pack = self.cursor.type.get_align()
+        self.size = self.cursor.type.get_size()
         available_kind = (CursorKind.FIELD_DECL, )
         for field in self.cursor.get_children():
             if is_legal_id(field.spelling):
@@ -234,6 +333,9 @@ class STRUCT_DECL(Decl):
                 if field.kind in available_kind:
                     self.items.append(sub_field)
 
+    def fingerprint(self) -> tuple:
+        return super().fingerprint() + (self._pack, self.size)
+
     @property
     def empty(self) -> bool:
         return len(self.items) == 0
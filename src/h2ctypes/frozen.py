@@ -0,0 +1,197 @@
+import logging
+import os
+import re
+import typing as tp
+
+from .template import *
+from .decl import Decl, STRUCT_DECL, TYPEDEF_DECL, ENUM_DECL, FUNCTION_DECL, UNION_DECL
+from .com import IsConstArg, IsRefArg, IsCallableArg, IsInCompeteArrayType, IsEnumField
+from .gen import CtypesDllGenerator, get_export_interfaces, get_const_args
+from .writer import CodeWriter
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[()]")
+_MARKERS = tuple(func.__name__ + "(" for func in (IsConstArg, IsRefArg, IsCallableArg, IsInCompeteArrayType))
+_ENUM_FIELD_MARKER = IsEnumField.__name__ + "("
+
+
+def _find_closing(text: str, start: int) -> int:
+    """:return: text[start] 处左括号对应的右括号位置"""
+    depth = 0
+    for index in range(start, len(text)):
+        if text[index] == "(":
+            depth += 1
+        elif text[index] == ")":
+            depth -= 1
+            if depth == 0:
+                return index
+    raise ValueError("unbalanced parentheses: {}".format(text))
+
+
+def unwrap_markers(text: str) -> str:
+    """
+    去掉 com 中只用于标识的无操作函数调用
+        IsConstArg(T) / IsRefArg(T) / IsCallableArg(T) / IsInCompeteArrayType(T) -> T
+        IsEnumField(E)(T) -> T
+    """
+    result = []
+    index = 0
+    while index < len(text):
+        if text.startswith(_ENUM_FIELD_MARKER, index):
+            end = _find_closing(text, index + len(_ENUM_FIELD_MARKER) - 1)
+            index = end + 1  # drop IsEnumField(E), keep (T)
+            continue
+        for marker in _MARKERS:
+            if text.startswith(marker, index):
+                end = _find_closing(text, index + len(marker) - 1)
+                result.append(unwrap_markers(text[index + len(marker):end]))
+                index = end + 1
+                break
+        else:
+            result.append(text[index])
+            index += 1
+    return "".join(result)
+
+
+def scan_references(expr: str, names: tp.Container[str]) -> tp.List[tp.Tuple[str, bool]]:
+    """
+    :param expr: 类型表达式
+    :param names: 已知的声明名
+    :return: [(引用的声明名, 是否弱引用)]，POINTER(...) 内部的引用以及单纯的别名只需要名字已绑定
+    """
+    expr = expr.strip()
+    if expr in names:
+        return [(expr, True)]
+    references = []
+    stack = []
+    previous = None
+    for token in _TOKEN_PATTERN.findall(expr):
+        if token == "(":
+            stack.append(previous == "POINTER")
+        elif token == ")":
+            if stack:
+                stack.pop()
+        elif token in names:
+            references.append((token, any(stack)))
+        previous = token
+    return references
+
+
+class FrozenCtypesGenerator(CtypesDllGenerator):
+    """
+    每个架构生成一个扁平模块，面向导入耗时敏感的短生命周期进程
+        - 按依赖关系拓扑排序，结构体尽量在类体内直接给出 _pack_ 与 _fields_
+        - 去掉 IsConstArg / IsRefArg / IsEnumField 等导入期无意义的函数调用
+    """
+    def generate(self) -> tp.List[str]:
+        output_dir = self._solution.get_abs_output_arch_dir()
+        if self._outputs is None and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        self._copy(os.path.join(os.path.dirname(__file__), "com.py"), os.path.join(output_dir, "com.py"))
+        self._write_stream(os.path.join(output_dir, "__init__.py"), self._emit_frozen)
+        self._write(os.path.join(self._solution.get_abs_output_dir(), "__init__.py"), TOP_PACKAGE_TEMPLATE)
+        return ["__init__.py"]
+
+    def _collect_decls(self) -> tp.Dict[str, Decl]:
+        """与星号导入链一致，同名声明后出现的覆盖先出现的"""
+        decls = {}
+        for header in self._solution.chain_headers:
+            for decl in self._get_decls(header):
+                if isinstance(decl, TYPEDEF_DECL) and not decl.generate_declaration():
+                    continue  # typedef struct A A
+                decls.pop(decl.spelling, None)
+                decls[decl.spelling] = decl
+        return decls
+
+    @staticmethod
+    def _get_expressions(decl: Decl) -> tp.List[str]:
+        if isinstance(decl, (STRUCT_DECL, UNION_DECL)):
+            return [unwrap_markers(item.type) for item in decl.items]
+        if isinstance(decl, (TYPEDEF_DECL, FUNCTION_DECL)):
+            return [unwrap_markers(decl.type.strip())]
+        return []
+
+    def _emit_frozen(self, writer: CodeWriter):
+        decls = self._collect_decls()
+        expressions = {name: self._get_expressions(decl) for name, decl in decls.items()}
+        references = {name: [ref for expr in exprs for ref in scan_references(expr, decls) if ref[0] != name]
+                      for name, exprs in expressions.items()}
+        self_references = {name for name, exprs in expressions.items()
+                           if any(ref[0] == name for expr in exprs for ref in scan_references(expr, decls))}
+        state = {}
+        forwards = set()
+
+        def _visit(name: str, is_weak: bool):
+            """按依赖顺序写入 name 及其依赖的声明"""
+            status = state.get(name)
+            if status == "done" or name in forwards:
+                return
+            decl = decls[name]
+            if status == "visiting":
+                if isinstance(decl, (STRUCT_DECL, UNION_DECL)):
+                    if not is_weak:
+                        logging.error("{} depends on itself by value".format(name))
+                    writer.write(self._construct_record(decl, expressions[name], is_forward=True))
+                    forwards.add(name)
+                else:
+                    logging.error("circular definition: {}".format(name))
+                return
+            state[name] = "visiting"
+            if name in self_references:
+                writer.write(self._construct_record(decl, expressions[name], is_forward=True))
+                forwards.add(name)
+            for ref, ref_is_weak in references[name]:
+                _visit(ref, ref_is_weak)
+            if name in forwards:
+                writer.write(self._construct_fields(decl, expressions[name]))
+            else:
+                writer.write(self._construct_decl(decl, expressions[name]))
+            forwards.discard(name)
+            state[name] = "done"
+
+        def _emit_decls(_: CodeWriter):
+            for decl_name in decls:
+                _visit(decl_name, False)
+
+        interfaces = get_export_interfaces(self._solution.root_header)
+        part0 = "From {}".format(" / ".join(str(header) for header in self._solution.chain_headers))
+        part4 = "\n".join(["{}{}: {}".format(INDENT, name, name) for name in interfaces])
+        part6 = "\n".join(["{}\"{}\": {},".format(INDENT * 2, name, name) for name in interfaces])
+        writer.write_template(FROZEN_MODULE_TEMPLATE, part0, _emit_decls, "", part4, part6,
+                              get_const_args(self._solution.root_header))
+
+    def _construct_decl(self, decl: Decl, expressions: tp.List[str]) -> str:
+        if isinstance(decl, (STRUCT_DECL, UNION_DECL)):
+            return self._construct_record(decl, expressions)
+        if isinstance(decl, ENUM_DECL):
+            values = "".join(["{}{} = {}\n".format(INDENT, item.spelling, item.value) for item in decl.items])
+            return "class {}(IsEnumType):\n{}".format(decl.spelling, values or INDENT + "pass\n")
+        return "{} = {}\n".format(decl.spelling, expressions[0])
+
+    @staticmethod
+    def _construct_field_list(decl: Decl, expressions: tp.List[str], depth: int) -> str:
+        fields = []
+        for item, expr in zip(decl.items, expressions):
+            if item.bitfield_width is not None:
+                fields.append("{}(\"{}\", {}, {}),\n".format(INDENT * depth, item.spelling, expr, item.bitfield_width))
+            else:
+                fields.append("{}(\"{}\", {}),\n".format(INDENT * depth, item.spelling, expr))
+        return "".join(fields)
+
+    def _construct_record(self, decl: Decl, expressions: tp.List[str], is_forward=False) -> str:
+        if isinstance(decl, STRUCT_DECL):
+            head = "class {}(Structure):\n{}_pack_ = {}\n".format(decl.spelling, INDENT, decl._pack)
+        else:
+            head = "class {}(Union):\n".format(decl.spelling)
+        if is_forward or not decl.items:
+            return head if isinstance(decl, STRUCT_DECL) else head + INDENT + "pass\n"
+        fields = self._construct_field_list(decl, expressions, 2)
+        return "{}{}_fields_ = (\n{}{})\n{}".format(head, INDENT, fields, INDENT, self._construct_layout(decl))
+
+    def _construct_fields(self, decl: Decl, expressions: tp.List[str]) -> str:
+        if not decl.items:
+            return ""
+        return "{}._fields_ = (\n{})\n{}".format(decl.spelling, self._construct_field_list(decl, expressions, 1),
+                                                  self._construct_layout(decl))
+
+    def _construct_layout(self, decl: Decl) -> str:
+        return CodeWriter.render(decl.emit_layout) if self._dtype_layout else ""
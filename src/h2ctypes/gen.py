@@ -1,93 +1,619 @@
+import collections
+import concurrent.futures
+import filecmp
+import hashlib
+import json
+import logging
 import os
 import re
 import shutil
+import typing as tp
 
 from .project import Solution, Header
+from .cache import get_file_digest
+from .com import CtypesDll
 from .template import *
-from .decl import STRUCT_DECL, TYPEDEF_DECL, ENUM_DECL, FUNCTION_DECL, UNION_DECL, set_text_template, \
+from .writer import CodeWriter
+from .decl import Decl, STRUCT_DECL, TYPEDEF_DECL, ENUM_DECL, FUNCTION_DECL, UNION_DECL, set_text_template, \
     is_legal_id
 
 
+def write_file(path: str, content: tp.Union[str, bytes], incremental=False):
+    """
+    :param path: 文件路径
+    :param content: 文本或者二进制内容
+    :param incremental: True 内容相同时不写入
+    """
+    mode, encoding = ("b", None) if isinstance(content, bytes) else ("", "utf-8")
+    if incremental and os.path.exists(path):
+        with open(path, "r" + mode, encoding=encoding) as f:
+            if f.read() == content:
+                return
+    with open(path, "w" + mode, encoding=encoding) as f:
+        f.write(content)
+
+
+def write_stream(path: str, emit: tp.Callable[[CodeWriter], tp.Any], incremental=False) -> CodeWriter:
+    """
+    流式写入临时文件，完成后替换 path
+    :param path: 文件路径
+    :param emit: 向 CodeWriter 写入内容
+    :param incremental: True 内容相同时保留原文件
+    :return: 已关闭的 CodeWriter，可获取 digest 与 size
+    """
+    temp = path + ".tmp"
+    try:
+        with open(temp, "w", encoding="utf-8") as f:
+            writer = CodeWriter(f)
+            emit(writer)
+            writer.flush()
+        if incremental and os.path.exists(path) and filecmp.cmp(temp, path, shallow=False):
+            os.remove(temp)
+        else:
+            os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return writer
+
+
+def _iter_types(decl: Decl) -> tp.Iterator[str]:
+    type_ = getattr(decl, "type", None)
+    if isinstance(type_, str):
+        yield type_
+    for item in decl.items:
+        yield from _iter_types(item)
+
+
+def get_export_interfaces(header: Header) -> tp.List[str]:
+    """:return: 根头文件导出的接口名，与 CtypesDll 成员同名的接口只能通过 get_interface 获取，给出警告"""
+    interfaces = [decl.spelling for decl in header.export_interfaces if is_legal_id(decl.spelling)]
+    for name in interfaces:
+        if hasattr(CtypesDll, name):
+            logging.warning("export interface {} is shadowed by CtypesDll.{}, use Dll.get_interface(\"{}\")"
+                            .format(name, name, name))
+    return interfaces
+
+
+def get_const_args(header: Header) -> str:
+    """:return: Dll 类的 _const_args_，导出接口中指向 const 的指针参数下标，没有时为空"""
+    lines = ["{}\"{}\": ({}, ),\n".format(INDENT * 2, decl.spelling, ", ".join(map(str, decl.const_args)))
+             for decl in header.export_interfaces if is_legal_id(decl.spelling) and decl.const_args]
+    if not lines:
+        return ""
+    return "{}_const_args_ = {{\n{}{}}}\n".format(INDENT, "".join(lines), INDENT)
+
+
+_IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class _HeaderTask(tp.NamedTuple):
+    name: str
+    header: Header
+    path: str
+    is_top: bool
+    decls_digest: str
+
+
+_worker_generator: tp.Optional["CtypesDllGenerator"] = None
+_worker_tasks: tp.List[_HeaderTask] = []
+
+
+def _init_worker(generator_type: tp.Type["CtypesDllGenerator"], solution: Solution, options: dict,
+                 tasks: tp.List[_HeaderTask]):
+    """工作进程初始化，solution 与 tasks 一起传入，两者引用的 Header 仍是同一个对象"""
+    global _worker_generator, _worker_tasks
+    _worker_generator = generator_type(solution, **options)
+    _worker_generator._symbols = _worker_generator._get_symbols()
+    _worker_tasks = tasks
+
+
+def _render_task(index: int) -> str:
+    task = _worker_tasks[index]
+    return CodeWriter.render(lambda w: _worker_generator._emit(w, task.header, is_top=task.is_top))
+
+
 class CtypesDllGenerator:
-    def __init__(self, solution: Solution):
+    MANIFEST_FILENAME = ".manifest.json"
+    decl_kinds = (STRUCT_DECL, TYPEDEF_DECL, ENUM_DECL, FUNCTION_DECL, UNION_DECL)
+
+    def __init__(
+            self,
+            solution: Solution,
+            incremental=False,
+            common_package: str = None,
+            common_headers: tp.Iterable[Header] = None,
+            lazy_import=False,
+            workers: int = None,
+            shared_package: str = None,
+            shared_decls: tp.Dict[str, tp.Set[tp.Tuple[str, str]]] = None,
+            dtype_layout=False
+    ):
+        """
+        :param solution: 翻译完成的solution
+        :param incremental: True 增量模式，只重写内容发生变化的文件并清理失效模块
+        :param common_package: 公共包名，与当前包位于同一输出根目录下
+        :param common_headers: 由公共包生成的头文件，当前包只导入不再生成
+        :param lazy_import: True 生成 符号->模块 索引，包通过模块级 __getattr__ 按需导入，
+                            各模块只导入实际引用到的模块
+        :param workers: 大于1时每个头文件的模块在进程池中生成，由主进程按固定顺序写入，结果与串行相同
+        :param shared_package: 架构无关声明所在的包名，与架构包位于同一输出根目录下
+        :param shared_decls: 头文件路径 -> 生成到 shared_package 中的 (声明类型名, 声明名)，
+                             见 SharedPackageGenerator.find_shared_decls
+        :param dtype_layout: True 结构体/联合体后写入 clang 的布局(_dtype_layout_)，供 com.get_dtype 构造 numpy dtype
+        """
         self._solution = solution
+        self._incremental = incremental
+        self._common_package = common_package
+        self._common_headers = set(common_headers or [])
+        self._lazy_import = lazy_import
+        self._workers = workers
+        self._shared_package = shared_package
+        self._shared_decls = shared_decls or {}
+        self._dtype_layout = dtype_layout
+        self._symbols: tp.Dict[str, Header] = {}
+        self._manifest = {}
+        self._regenerated: tp.List[str] = []
+        self._tasks: tp.Optional[tp.List[_HeaderTask]] = None
+        self._decls: tp.Dict[Header, tp.List[Decl]] = {}
+        self._outputs: tp.Optional[tp.Dict[str, tp.Union[str, bytes]]] = None
+
+    def render(self) -> tp.Dict[str, tp.Union[str, bytes]]:
+        """
+        生成全部文件内容但不写入磁盘，忽略增量模式
+        :return: 相对输出根目录的文件名 -> 文件内容
+        """
+        self._outputs = {}
+        try:
+            self.generate()
+            return self._outputs
+        finally:
+            self._outputs = None
 
-    def generate(self):
-        output_dir = self._solution.get_abs_output_arch_dir()
+    def generate(self) -> tp.List[str]:
+        """:return: 本次重新生成的头文件模块，相对架构包目录；增量模式下未变化的模块不包含在内"""
+        output_dir = self._get_arch_dir()
         dependencies_path = os.path.join(output_dir, "dependencies")
         cpp_header_path = os.path.join(output_dir, "origins")
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        if not os.path.exists(dependencies_path):
-            os.makedirs(dependencies_path)
-        if not os.path.exists(cpp_header_path):
-            os.makedirs(cpp_header_path)
-        with open(os.path.join(dependencies_path, "__init__.py"), "w"):
-            pass
+        is_incremental = self._incremental and self._outputs is None
+        if self._outputs is None:
+            if not os.path.exists(output_dir):
+                os.makedirs(output_dir)
+            if not os.path.exists(dependencies_path):
+                os.makedirs(dependencies_path)
+            if not os.path.exists(cpp_header_path):
+                os.makedirs(cpp_header_path)
+        old_manifest = self._load_manifest(output_dir) if is_incremental else {}
+        self._manifest = {}
+        self._regenerated = []
+        self._symbols = self._get_symbols()
+        self._tasks = [] if self._workers and self._workers > 1 else None
 
-        shutil.copy(os.path.join(os.path.dirname(__file__), "com.py"), dependencies_path)
+        self._write(os.path.join(dependencies_path, "__init__.py"), "")
+        self._copy(os.path.join(os.path.dirname(__file__), "com.py"), os.path.join(dependencies_path, "com.py"))
         for header in self._solution.user_headers.values():
+            if header in self._common_headers or not self._is_generated(header):
+                continue
             if os.path.exists(header.path):
-                shutil.copy(header.path, os.path.join(cpp_header_path, header.name + ".h"))
+                self._copy(header.path, os.path.join(cpp_header_path, header.name + ".h"))
             if header.name != self._solution.root_header.name:
-                with open(os.path.join(dependencies_path, header.py_filename), "w", encoding="utf-8") as f:
-                    f.write(self._lint(self._construct(header)))
+                self._generate_header(header, os.path.join(dependencies_path, header.py_filename), old_manifest)
         # root header
-        with open(os.path.join(output_dir, "__init__.py"), "w", encoding="utf-8") as f:
-            f.write(self._lint(self._construct(self._solution.root_header, is_top=True)))
+        if self._lazy_import:
+            self._generate_header(self._solution.root_header,
+                                  os.path.join(dependencies_path, self._solution.root_header.py_filename),
+                                  old_manifest, is_top=True)
+            self._write(os.path.join(output_dir, "__init__.py"), self._construct_symbol_index())
+        else:
+            self._generate_header(self._solution.root_header, os.path.join(output_dir, "__init__.py"),
+                                  old_manifest, is_top=True)
         # construct builtin.py
-        with open(os.path.join(dependencies_path, self._solution.builtin_header.py_filename), "w", encoding="utf-8") as f:
-            f.write(self._lint(self._construct(self._solution.builtin_header)))
+        if self._solution.builtin_header not in self._common_headers:
+            self._generate_header(self._solution.builtin_header,
+                                  os.path.join(dependencies_path, self._solution.builtin_header.py_filename),
+                                  old_manifest)
+        self._run_tasks()
         # 最外层导入代码
-        with open(os.path.join(self._solution.get_abs_output_dir(), "__init__.py"), "w", encoding="utf-8") as f:
-            f.write("""import platform
-
-sub_package = platform.system() + platform.architecture()[0][:2]
-
-if sub_package == "Windows64":
-    from .Windows64 import *
-elif sub_package == "Windows32":
-    from .Windows32 import *
-elif sub_package == "Linux64":
-    from .Linux64 import *
-elif sub_package == "Linux32":
-    from .Linux32 import *
-else:
-    raise ImportError""")
-
-    def _construct(self, header: Header, is_top=False) -> str:
-        decls = [item for item in header.defined_decls.values()
-                 if isinstance(item, (STRUCT_DECL, TYPEDEF_DECL, ENUM_DECL, FUNCTION_DECL, UNION_DECL))
-                 and is_legal_id(item.spelling)]
-        headers = [h for h in self._solution.chain_headers[:self._solution.chain_headers.index(header)]]
+        self._write(os.path.join(self._solution.get_abs_output_dir(), "__init__.py"),
+                    LAZY_TOP_PACKAGE_TEMPLATE if self._lazy_import else TOP_PACKAGE_TEMPLATE)
+
+        if is_incremental:
+            self._remove_stale(output_dir, old_manifest)
+            self._save_manifest(output_dir)
+        return self._regenerated
+
+    def _get_decls(self, header: Header) -> tp.List[Decl]:
+        """:return: header 中需要生成的声明，翻译完成后不再变化，按头文件缓存"""
+        decls = self._decls.get(header)
+        if decls is None:
+            decls = [item for item in self._solution.symbols.query(header=header, kinds=self.decl_kinds)
+                     if is_legal_id(item.spelling)]
+            self._decls[header] = decls
+        return decls
+
+    def _get_emitted_decls(self, header: Header) -> tp.List[Decl]:
+        """:return: 在当前模块中生成的声明，不包含从 shared_package 导入的声明"""
+        decls = self._get_decls(header)
+        shared = self._shared_decls.get(header.path) if self._shared_package else None
+        if not shared:
+            return decls
+        return [decl for decl in decls if (type(decl).__name__, decl.spelling) not in shared]
+
+    def _get_arch_dir(self) -> str:
+        """:return: 当前包的输出目录，_get_module_name 与清单中的模块名都相对于该目录"""
+        return self._solution.get_abs_output_arch_dir()
+
+    def _is_generated(self, header: Header) -> bool:
+        """符号白名单模式下，没有任何声明的头文件不生成模块"""
+        return self._solution.reachable is None \
+            or header in (self._solution.root_header, self._solution.builtin_header) \
+            or bool(self._get_decls(header))
+
+    def _get_symbols(self) -> tp.Dict[str, Header]:
+        """符号 -> 定义该符号的头文件，与星号导入链一致，后定义的覆盖先定义的"""
+        symbols = {}
+        for header in self._solution.chain_headers:
+            for decl in self._get_decls(header):
+                symbols[decl.spelling] = header
+        symbols["Dll"] = self._solution.root_header
+        return symbols
+
+    def _get_module_name(self, header: Header) -> str:
+        """:return: 头文件对应模块相对于架构包的模块名"""
+        if header in self._common_headers:
+            return "...{}.{}.dependencies.{}".format(
+                self._common_package, os.path.basename(self._get_arch_dir()), header.name)
+        return ".dependencies.{}".format(header.name)
+
+    def _construct_symbol_index(self) -> str:
+        modules = {header: self._get_module_name(header) for header in set(self._symbols.values())}
+        part0 = "\n".join(["    \"{}\": \"{}\",".format(name, modules[header])
+                           for name, header in sorted(self._symbols.items())])
+        return set_text_template(LAZY_PACKAGE_TEMPLATE, 0, part0)
+
+    def _get_dependencies(self, header: Header, decls: tp.Iterable[Decl]) -> tp.List[Header]:
+        """
+        :param decls: 模块中生成的声明
+        :return: 模块需要导入的头文件，按拓扑顺序
+            默认模式: header 直接或间接包含的头文件，以及 decls 引用到、但未被包含的先前头文件中的符号
+            lazy_import: 只保留 decls 引用到的头文件
+            包含图不完整: #pragma once/include guard 的头文件再次被包含时 libclang 不报告，没有对应的边，
+            所以除非所有先前的头文件都已被包含，总是按 decls 引用到的符号补充
+        """
+        graph = self._solution.include_graph
+        position = graph.position(header)
+        used = set()
+        if not self._lazy_import:
+            dependencies = graph.dependencies(header)
+            if self._solution.reachable is not None:
+                dependencies = [h for h in dependencies if self._is_generated(h)]
+            elif len(dependencies) == max(position, 0):  # every previous header is already included
+                return sorted(dependencies, key=graph.position)
+            used.update(dependencies)
+        for type_ in {type_ for decl in decls for type_ in _iter_types(decl)}:
+            for name in _IDENTIFIER_PATTERN.findall(type_):
+                h = self._symbols.get(name)
+                if h is not None and h is not header and graph.position(h) < position:
+                    used.add(h)
+        return sorted(used, key=graph.position)
+
+    def _generate_header(self, header: Header, path: str, old_manifest: dict, is_top=False):
+        name = os.path.relpath(path, self._get_arch_dir()).replace("\\", "/")
+        decls_digest = self._get_decls_digest(header) if self._incremental else ""
+        entry = old_manifest.get(name)
+        if entry and entry["decls"] == decls_digest and get_file_digest(path) == entry["digest"]:
+            self._manifest[name] = entry
+            return
+        if self._tasks is not None:
+            self._tasks.append(_HeaderTask(name, header, path, is_top, decls_digest))
+            return
+        writer = self._write_stream(path, lambda w: self._emit(w, header, is_top=is_top))
+        self._regenerated.append(name)
+        self._add_manifest(name, header, decls_digest, writer.digest)
+
+    def _add_manifest(self, name: str, header: Header, decls_digest: str, digest: str):
+        if self._incremental:
+            self._manifest[name] = {
+                "header": header.path,
+                "decls": decls_digest,
+                "digest": digest
+            }
+
+    def _run_tasks(self):
+        """
+        在进程池中生成 _generate_header 排队的模块
+        工作进程只返回文本，写入、增量比较与清单仍在主进程按排队顺序进行
+        """
+        tasks, self._tasks = self._tasks, None
+        if not tasks:
+            return
+        options = {
+            "common_package": self._common_package,
+            "common_headers": self._common_headers,
+            "lazy_import": self._lazy_import,
+            "shared_package": self._shared_package,
+            "shared_decls": self._shared_decls,
+            "dtype_layout": self._dtype_layout
+        }
+        workers = min(self._workers, len(tasks))
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with concurrent.futures.ProcessPoolExecutor(
+                workers, initializer=_init_worker, initargs=(type(self), self._solution, options, tasks)
+        ) as executor:
+            for task, content in zip(tasks, executor.map(_render_task, range(len(tasks)), chunksize=chunksize)):
+                self._write(task.path, content)
+                self._regenerated.append(task.name)
+                self._add_manifest(task.name, task.header, task.decls_digest,
+                                   hashlib.sha1(content.encode("utf-8")).hexdigest())
+
+    def _get_decls_digest(self, header: Header) -> str:
+        # 只包含模块实际导入的头文件，其它头文件新增、删除符号不影响该模块
+        headers = self._get_dependencies(header, self._get_emitted_decls(header))
+        fingerprint = [str(header), [self._get_import_line(h) for h in headers], header in self._common_headers,
+                       [decl.fingerprint() for decl in header.defined_decls.values()], self._dtype_layout]
+        if self._shared_decls:
+            fingerprint.append([self._shared_package, sorted(self._shared_decls.get(header.path, ()))])
+        return hashlib.sha1(repr(fingerprint).encode("utf-8")).hexdigest()
+
+    def _write_stream(self, path: str, emit: tp.Callable[[CodeWriter], tp.Any]) -> CodeWriter:
+        if self._outputs is not None:
+            writer = CodeWriter()
+            emit(writer)
+            self._outputs[self._get_output_name(path)] = writer.getvalue()
+            return writer
+        return write_stream(path, emit, self._incremental)
+
+    def _write(self, path: str, content: str):
+        if self._outputs is not None:
+            self._outputs[self._get_output_name(path)] = content
+            return
+        write_file(path, content, self._incremental)
+
+    def _copy(self, source: str, target: str):
+        if self._outputs is not None:
+            with open(source, "rb") as f:
+                self._outputs[self._get_output_name(target)] = f.read()
+            return
+        if self._incremental and os.path.exists(target) and filecmp.cmp(source, target, shallow=False):
+            return
+        shutil.copy(source, target)
+
+    def _get_output_name(self, path: str) -> str:
+        return os.path.relpath(path, self._solution.get_abs_output_dir()).replace("\\", "/")
+
+    @staticmethod
+    def write_outputs(output_dir: str, outputs: tp.Dict[str, tp.Union[str, bytes]], incremental=False):
+        """
+        写入 render 的结果
+        :param output_dir: 输出根目录
+        :param outputs: render 的返回值
+        :param incremental: True 只重写内容发生变化的文件
+        """
+        for name, content in outputs.items():
+            path = os.path.join(output_dir, name)
+            dirname = os.path.dirname(path)
+            if not os.path.exists(dirname):
+                os.makedirs(dirname)
+            write_file(path, content, incremental)
+
+    def _load_manifest(self, output_dir: str) -> dict:
+        try:
+            with open(os.path.join(output_dir, self.MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, output_dir: str):
+        self._write(os.path.join(output_dir, self.MANIFEST_FILENAME),
+                    json.dumps(self._manifest, indent=1, sort_keys=True))
+
+    def _remove_stale(self, output_dir: str, old_manifest: dict):
+        """删除上次生成、但本次已不在头文件链中的模块"""
+        for name, entry in old_manifest.items():
+            if name in self._manifest:
+                continue
+            for path in (os.path.join(output_dir, name),
+                         os.path.join(output_dir, "origins", Header(entry["header"]).name + ".h")):
+                if os.path.exists(path):
+                    logging.debug("remove stale file: {}".format(path))
+                    os.remove(path)
+
+    def _get_import_line(self, header: Header, is_top=False) -> str:
+        if header in self._common_headers:
+            return "from {}{}.{}.dependencies.{} import *\n".format(
+                "..." if is_top else "....", self._common_package,
+                os.path.basename(self._get_arch_dir()), header.name)
+        return "from .{}{} import *\n".format("dependencies." if is_top else "", header.name)
+
+    def _get_shared_import_line(self, header: Header, is_top=False) -> str:
+        """:return: 导入 shared_package 中该头文件的架构无关声明，没有时为空"""
+        if not self._shared_package or not self._shared_decls.get(header.path):
+            return ""
+        return "from {}{}.dependencies.{} import *\n".format(
+            ".." if is_top and not self._lazy_import else "...", self._shared_package, header.name)
+
+    def _emit(self, writer: CodeWriter, header: Header, is_top=False):
+        decls = self._get_decls(header)
+        emitted = self._get_emitted_decls(header)
+        headers = self._get_dependencies(header, emitted)
+        if header in self._common_headers:  # root header also included by another root
+            decls = emitted = []
+            headers.append(header)
+        shared = self._get_shared_import_line(header, is_top)
         part0 = "From {}".format(str(header))
+        part2 = self._emit_all([item for item in emitted if not isinstance(item, FUNCTION_DECL)], "emit_declaration")
+        part3 = self._emit_definitions(emitted)
+        part5 = self._emit_all([item for item in emitted if isinstance(item, FUNCTION_DECL)], "emit_declaration")
         if is_top:
-            part1 = "".join(["from .dependencies.{} import *\n".format(h.name) for h in headers])
-            part2 = "\n".join([item.generate_declaration() for item in decls if not isinstance(item, FUNCTION_DECL)])
-            part3 = "\n".join([item.generate() for item in decls])
-            part5 = "\n".join([item.generate_declaration() for item in decls if isinstance(item, FUNCTION_DECL)])
-            part4 = "\n".join(["\t\tself.{}: {} = create_dll_interface({}, self._dll, '{}')".format(decl.spelling,
-                                                                                                    decl.spelling,
-                                                                                                    decl.spelling,
-                                                                                                    decl.spelling)
-                               for decl in header.export_interfaces if is_legal_id(decl.spelling)])
-            return set_text_template(DLL_TOP_HEADER_TEMPLATE, 0, part0, part1, part2, part3, part5, "", part4)
+            interfaces = get_export_interfaces(header)
+            part4 = "\n".join(["{}{}: {}".format(INDENT, name, name) for name in interfaces])
+            part6 = "\n".join(["{}\"{}\": {},".format(INDENT * 2, name, name) for name in interfaces])
+            if self._lazy_import:
+                part1 = "".join([self._get_import_line(h) for h in headers]) + shared
+                part7 = ", ".join(dict.fromkeys(["\"{}\"".format(decl.spelling) for decl in decls]
+                                                + ["\"Dll\""]))
+                writer.write_template(LAZY_DLL_ROOT_HEADER_TEMPLATE, part0, part1, part2, part3, part5, "",
+                                      part4, part6, get_const_args(header), part7)
+            else:
+                part1 = "".join([self._get_import_line(h, is_top=True) for h in headers]) + shared
+                writer.write_template(DLL_TOP_HEADER_TEMPLATE, part0, part1, part2, part3, part5, "", part4, part6,
+                                      get_const_args(header))
         else:
-            part1 = "".join(["from .{} import *\n".format(h.name) for h in headers])
-            part2 = "\n".join([item.generate_declaration() for item in decls if not isinstance(item, FUNCTION_DECL)])
-            part3 = "\n".join([item.generate() for item in decls])
-            part5 = "\n".join([item.generate_declaration() for item in decls if isinstance(item, FUNCTION_DECL)])
-            part4 = ", ".join(set(["\"{}\"".format(decl.spelling) for decl in decls]))
-            return set_text_template(DLL_DEPENDENCY_HEADER_TEMPLATE, 0, part0, part1, part2, part3, part5, part4)
+            part1 = "".join([self._get_import_line(h) for h in headers]) + shared
+            part4 = ", ".join(dict.fromkeys(["\"{}\"".format(decl.spelling) for decl in decls]))
+            writer.write_template(DLL_DEPENDENCY_HEADER_TEMPLATE, part0, part1, part2, part3, part5, part4)
+
+    def _emit_definitions(self, decls: tp.List[Decl]) -> tp.Callable[[CodeWriter], None]:
+        """:return: 依次写入声明的定义，dtype_layout 模式下结构体/联合体之后写入布局"""
+        if not self._dtype_layout:
+            return self._emit_all(decls, "emit")
+
+        def _emit(writer: CodeWriter):
+            for decl in decls:
+                decl.emit(writer)
+                if isinstance(decl, (STRUCT_DECL, UNION_DECL)):
+                    decl.emit_layout(writer)
+                writer.write("\n")
+        return _emit
 
     @staticmethod
-    def _lint(content):
-        for old, new in [("\n+", "\n"),
-                         ("\t", "    "),
-                         ("const ", ""),
-                         (r"POINTER\(None\)", "c_void_p"),
-                         (r"POINTER\(c_char\)", "c_char_p"),
-                         (r"POINTER\(c_wchar\)", "c_wchar_p"),
-                         ("[a-zA-Z0-9_]+::", "")]:
-            content = re.sub(old, new, content)
-        return content
+    def _emit_all(decls: tp.List[Decl], method: str) -> tp.Callable[[CodeWriter], None]:
+        """:return: 依次调用 decl.<method>(writer) 并以换行分隔"""
+        def _emit(writer: CodeWriter):
+            for decl in decls:
+                getattr(decl, method)(writer)
+                writer.write("\n")
+        return _emit
+
+
+class CommonPackageGenerator(CtypesDllGenerator):
+    """
+    多根头文件翻译时，生成被多个根头文件共享的头文件
+    solution.user_headers 为共享头文件，solution.chain_headers 为其顺序
+    """
+    def generate(self) -> tp.List[str]:
+        output_dir = self._get_arch_dir()
+        dependencies_path = os.path.join(output_dir, "dependencies")
+        cpp_header_path = os.path.join(output_dir, "origins")
+        is_incremental = self._incremental and self._outputs is None
+        if self._outputs is None:
+            for path in (dependencies_path, cpp_header_path):
+                if not os.path.exists(path):
+                    os.makedirs(path)
+        old_manifest = self._load_manifest(output_dir) if is_incremental else {}
+        self._manifest = {}
+        self._regenerated = []
+        self._symbols = self._get_symbols()
+        self._tasks = [] if self._workers and self._workers > 1 else None
+
+        self._write(os.path.join(output_dir, "__init__.py"), "")
+        self._write(os.path.join(dependencies_path, "__init__.py"), "")
+        self._copy(os.path.join(os.path.dirname(__file__), "com.py"), os.path.join(dependencies_path, "com.py"))
+        for header in self._solution.chain_headers:
+            if os.path.exists(header.path):
+                self._copy(header.path, os.path.join(cpp_header_path, header.name + ".h"))
+            self._generate_header(header, os.path.join(dependencies_path, header.py_filename), old_manifest)
+        self._run_tasks()
+        self._write(os.path.join(self._solution.get_abs_output_dir(), "__init__.py"), TOP_PACKAGE_TEMPLATE)
+
+        if is_incremental:
+            self._remove_stale(output_dir, old_manifest)
+            self._save_manifest(output_dir)
+        return self._regenerated
+
+
+class SharedPackageGenerator(CtypesDllGenerator):
+    """
+    多架构翻译时，生成各架构生成结果完全相同的声明
+    solution 为任一架构的 solution，output_dir 为共享包目录，不区分架构
+    各架构包中同一头文件的模块先从共享包导入这些声明，再定义与布局相关的声明
+    """
+    def __init__(self, solution: Solution, shared_decls: tp.Dict[str, tp.Set[tp.Tuple[str, str]]], **kwargs):
+        super().__init__(solution, shared_decls=shared_decls, **kwargs)
+
+    def generate(self) -> tp.List[str]:
+        output_dir = self._get_arch_dir()
+        dependencies_path = os.path.join(output_dir, "dependencies")
+        is_incremental = self._incremental and self._outputs is None
+        if self._outputs is None and not os.path.exists(dependencies_path):
+            os.makedirs(dependencies_path)
+        old_manifest = self._load_manifest(output_dir) if is_incremental else {}
+        self._manifest = {}
+        self._regenerated = []
+        self._symbols = self._get_symbols()
+        self._tasks = [] if self._workers and self._workers > 1 else None
+
+        self._write(os.path.join(output_dir, "__init__.py"), "")
+        self._write(os.path.join(dependencies_path, "__init__.py"), "")
+        self._copy(os.path.join(os.path.dirname(__file__), "com.py"), os.path.join(dependencies_path, "com.py"))
+        for header in self._solution.chain_headers:
+            if self._is_generated(header):
+                self._generate_header(header, os.path.join(dependencies_path, header.py_filename), old_manifest)
+        self._run_tasks()
+
+        if is_incremental:
+            self._remove_stale(output_dir, old_manifest)
+            self._save_manifest(output_dir)
+        return self._regenerated
+
+    def _get_decls(self, header: Header) -> tp.List[Decl]:
+        decls = self._decls.get(header)
+        if decls is None:
+            shared = self._shared_decls.get(header.path, ())
+            decls = [decl for decl in super()._get_decls(header) if (type(decl).__name__, decl.spelling) in shared]
+            self._decls[header] = decls
+        return decls
+
+    def _get_arch_dir(self) -> str:
+        return self._solution.get_abs_output_dir()
+
+    @classmethod
+    def find_shared_decls(cls, solutions: tp.List[Solution],
+                          dtype_layout=False) -> tp.Dict[str, tp.Set[tp.Tuple[str, str]]]:
+        """
+        比较各架构的生成结果，找出可以共享的声明
+            - 同一头文件中 (声明类型名, 声明名) 相同的声明在所有架构中生成的文本都相同
+            - 引用到的名字都不是不可共享的声明，例如 指针大小的 typedef、对齐不同的结构体
+        :param solutions: 各架构翻译完成的 solution
+        :param dtype_layout: True 布局也要相同，c_long 等文本相同但大小不同的成员所在的结构体不共享
+        :return: 头文件路径 -> (声明类型名, 声明名)
+        """
+        texts = []  # 每个架构: 头文件路径 -> (声明类型名, 声明名) -> 生成文本
+        references: tp.Dict[tp.Tuple[str, tp.Tuple[str, str]], tp.Set[str]] = collections.defaultdict(set)
+        for solution in solutions:
+            items = {}
+            for header in solution.chain_headers:
+                decls = items.setdefault(header.path, {})
+                for decl in solution.symbols.query(header=header, kinds=cls.decl_kinds):
+                    if not is_legal_id(decl.spelling):
+                        continue
+                    key = (type(decl).__name__, decl.spelling)
+                    text = decl.generate_declaration() + decl.generate()
+                    if dtype_layout:
+                        text += CodeWriter.render(decl.emit_layout)
+                    decls.setdefault(key, []).append(text)
+                    for type_ in _iter_types(decl):
+                        references[(header.path, key)].update(_IDENTIFIER_PATTERN.findall(type_))
+            texts.append(items)
+
+        shared = {}
+        unshared_names = set()
+        for path, decls in texts[0].items():
+            for key, text in decls.items():
+                if all(items.get(path, {}).get(key) == text for items in texts[1:]):
+                    shared.setdefault(path, set()).add(key)
+        for items in texts:
+            for path, decls in items.items():
+                unshared_names.update(key[1] for key in decls if key not in shared.get(path, ()))
+        # 同名的声明(例如 typedef struct A A)要么都共享，要么都不共享；共享的声明不能引用只在架构包中定义的名字
+        changed = True
+        while changed:
+            changed = False
+            for path, keys in shared.items():
+                for key in [key for key in keys
+                            if key[1] in unshared_names or not references[(path, key)].isdisjoint(unshared_names)]:
+                    keys.remove(key)
+                    unshared_names.add(key[1])
+                    changed = True
+        return {path: keys for path, keys in shared.items() if keys}
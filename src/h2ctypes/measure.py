@@ -0,0 +1,41 @@
+import os
+import statistics
+import subprocess
+import sys
+import typing as tp
+
+_IMPORT_TIMER = "import sys, time; sys.path.insert(0, {!r}); t = time.perf_counter(); import {}; " \
+                "print(time.perf_counter() - t)"
+
+
+def measure_import_time(output_dir: str, repeat=5, warmup=1, python: str = None) -> tp.Dict[str, tp.Any]:
+    """
+    在全新的解释器进程中导入生成的包并计时
+    :param output_dir: 生成的输出目录，即包目录
+    :param repeat: 计时次数
+    :param warmup: 不计入结果的预热次数(生成 __pycache__)
+    :param python: 解释器路径，默认当前解释器
+    :return: {"min", "median", "samples"}，单位秒
+    """
+    parent, name = os.path.split(os.path.abspath(output_dir))
+    command = [python or sys.executable, "-c", _IMPORT_TIMER.format(parent, name)]
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # measure imports from __pycache__
+    samples = []
+    for index in range(warmup + repeat):
+        elapsed = float(subprocess.check_output(command, env=env).decode().strip().splitlines()[-1])
+        if index >= warmup:
+            samples.append(elapsed)
+    return {"min": min(samples), "median": statistics.median(samples), "samples": samples}
+
+
+def compare_import_time(baseline_dir: str, candidate_dir: str, repeat=5, python: str = None) -> tp.Dict[str, tp.Any]:
+    """
+    比较两种输出布局的导入耗时
+    :param baseline_dir: 基准输出目录，例如默认的多模块布局
+    :param candidate_dir: 对比输出目录，例如 frozen 布局
+    :return: {"baseline", "candidate", "speedup"}，speedup 为中位数之比
+    """
+    baseline = measure_import_time(baseline_dir, repeat, python=python)
+    candidate = measure_import_time(candidate_dir, repeat, python=python)
+    return {"baseline": baseline, "candidate": candidate, "speedup": baseline["median"] / candidate["median"]}
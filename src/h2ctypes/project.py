@@ -1,10 +1,12 @@
 from dataclasses import dataclass, field
+import logging
 import os
 import platform
+import re
 import typing as tp
 from functools import lru_cache
 
-from clang.cindex import TranslationUnit, Cursor, LinkageKind
+from clang.cindex import TranslationUnit, Cursor
 
 Decl = tp.ForwardRef("Decl")
 
@@ -42,6 +44,7 @@ class Header:
         self.type = type_
         self.include_headers = {}
         self.defined_decls: tp.Dict[Hash, Decl] = {}
+        self._exports: tp.Dict[Hash, Decl] = {}
 
     @property
     def dirname(self) -> str:
@@ -66,27 +69,281 @@ class Header:
 
     def define(self, decl: Decl):
         self.defined_decls[decl.hash] = decl
+        if decl.is_exported:
+            self._exports[decl.hash] = decl
+        else:
+            self._exports.pop(decl.hash, None)
 
     @property
-    def export_interfaces(self):
-        from .decl import FUNCTION_DECL
-        return [decl for decl in self.defined_decls.values()
-                if isinstance(decl, FUNCTION_DECL) and decl.link_kind == LinkageKind.EXTERNAL]
+    def export_interfaces(self) -> tp.List[Decl]:
+        return list(self._exports.values())
 
     def __str__(self):
         return "<Header> - {}".format(self.path)
 
 
+class IncludeGraph:
+    """
+    头文件包含关系图
+    implicit 头文件(builtin.h 以及 -include 指定的头文件)被视为所有头文件都包含
+    """
+    def __init__(self):
+        self._headers: tp.Dict[Header, Header] = {}  # canonical header objects
+        self._includes: tp.Dict[Header, tp.Dict[Header, None]] = {}  # header -> ordered set of included headers
+        self._implicit: tp.Dict[Header, None] = {}
+        self._last: tp.Optional[Header] = None
+        self._order: tp.Optional[tp.List[Header]] = None
+        self._positions: tp.Dict[Header, int] = {}
+        self._masks: tp.Dict[Header, int] = {}
+        self.cycles: tp.List[tp.List[Header]] = []
+
+    def add(self, header: Header, implicit=False) -> Header:
+        """:return: 图中与 header 路径相同的头文件对象"""
+        if header not in self._headers:
+            self._headers[header] = header
+            self._includes[header] = {}
+            self._order = None
+        header = self._headers[header]
+        if implicit and header not in self._implicit:
+            self._implicit[header] = None
+            self._order = None
+        return header
+
+    def add_edge(self, source: Header, include: Header):
+        """source 包含 include"""
+        source = self.add(source)
+        include = self.add(include)
+        if include not in self._includes[source]:
+            self._includes[source][include] = None
+            source.include(include)
+            self._order = None
+
+    def update(self, other: "IncludeGraph"):
+        for header in other._includes:
+            self.add(header, implicit=header in other._implicit)
+        for header, includes in other._includes.items():
+            for include in includes:
+                self.add_edge(header, include)
+
+    def get(self, header: Header) -> Header:
+        return self._headers.get(header, header)
+
+    def __contains__(self, header: Header) -> bool:
+        return header in self._includes
+
+    def __len__(self) -> int:
+        return len(self._includes)
+
+    @property
+    def headers(self) -> tp.List[Header]:
+        return list(self._includes)
+
+    def includes(self, header: Header) -> tp.List[Header]:
+        """:return: header 直接包含的头文件，按包含顺序"""
+        return list(self._includes.get(header, ()))
+
+    def topological_order(self, last: Header = None) -> tp.List[Header]:
+        """
+        被包含的头文件排在包含者之前，implicit 头文件排在最前
+        出现环时忽略回边，并记录到 cycles
+        :param last: 强制排在最后的头文件，一般为根头文件
+        """
+        if self._order is not None and last is self._last:
+            return self._order
+        order = []
+        state = {}  # 1: visiting 2: done
+        self.cycles = []
+        for start in list(self._implicit) + [h for h in self._includes if h is not last]:
+            if start not in state:
+                self._visit(start, state, order, last)
+        if last is not None and last in self._includes and last not in state:
+            self._visit(last, state, order, None)
+        self._last = last
+        self._order = order
+        self._positions = {header: index for index, header in enumerate(order)}
+        self._masks = {}
+        return order
+
+    def _visit(self, start: Header, state: tp.Dict[Header, int], order: tp.List[Header], last: tp.Optional[Header]):
+        """非递归的深度优先后序遍历，深层包含链不受递归深度限制"""
+        state[start] = 1
+        stack = [(start, iter(self._includes[start]))]
+        while stack:
+            header, children = stack[-1]
+            for child in children:
+                status = state.get(child)
+                if status == 1:
+                    path = [item[0] for item in stack]
+                    cycle = path[path.index(child):] + [child]
+                    self.cycles.append(cycle)
+                    logging.warning("include cycle: {}".format(" -> ".join(h.path for h in cycle)))
+                elif status is None and child is not last:
+                    state[child] = 1
+                    stack.append((child, iter(self._includes[child])))
+                    break
+            else:
+                stack.pop()
+                state[header] = 2
+                order.append(header)
+
+    def dependencies(self, header: Header) -> tp.List[Header]:
+        """
+        :return: header 直接或间接包含的头文件以及 implicit 头文件，按拓扑顺序，只包含排在 header 之前的头文件
+        """
+        order = self._get_order()
+        position = self._positions.get(header)
+        if position is None:
+            return [h for h in self._implicit if h is not header]
+        mask = self._get_mask(header) & ((1 << position) - 1)
+        return [order[index] for index in range(position) if mask >> index & 1]
+
+    def position(self, header: Header) -> int:
+        """:return: header 在拓扑顺序中的位置，不在图中返回 -1"""
+        self._get_order()
+        return self._positions.get(header, -1)
+
+    def _get_order(self) -> tp.List[Header]:
+        return self._order if self._order is not None else self.topological_order(self._last)
+
+    def _get_mask(self, header: Header) -> int:
+        """依赖集合的位图，第 n 位对应拓扑顺序中的第 n 个头文件，按拓扑顺序填充所以无需递归"""
+        if not self._masks:
+            implicit = 0
+            for h in self._implicit:
+                implicit |= 1 << self._positions[h]
+            for position, h in enumerate(self._order):
+                mask = implicit
+                for include in self._includes[h]:
+                    index = self._positions[include]
+                    if index < position:
+                        mask |= 1 << index | self._masks[include]
+                self._masks[h] = mask
+        return self._masks[header]
+
+
 Hash = int
 
 
+class SymbolTable:
+    """
+    已定义声明的索引，Solution.define 时登记，同一 hash 重复定义时以后定义的为准
+        hash / USR / 名字 / 声明类型(decl.py 中的类) -> 声明
+        声明 -> 所属头文件，以及外部链接的导出函数
+    头文件内的声明仍由 Header.defined_decls 记录，同一声明可能先后定义在 builtin 与所在头文件中
+    """
+    def __init__(self):
+        self.decls: tp.Dict[Hash, Decl] = {}
+        self._by_usr: tp.Dict[str, tp.Dict[Hash, Decl]] = {}
+        self._by_spelling: tp.Dict[str, tp.Dict[Hash, Decl]] = {}
+        self._by_kind: tp.Dict[tp.Type[Decl], tp.Dict[Hash, Decl]] = {}
+        self._headers: tp.Dict[Hash, Header] = {}
+        self._exports: tp.Dict[Hash, Decl] = {}
+
+    def add(self, decl: Decl, header: Header = None):
+        """
+        :param decl: 声明
+        :param header: 声明所属头文件，None 不属于任何头文件
+        """
+        self.remove(decl.hash)
+        self.decls[decl.hash] = decl
+        if decl.usr:
+            self._by_usr.setdefault(decl.usr, {})[decl.hash] = decl
+        self._by_spelling.setdefault(decl.spelling, {})[decl.hash] = decl
+        self._by_kind.setdefault(type(decl), {})[decl.hash] = decl
+        if header is not None:
+            self._headers[decl.hash] = header
+        if decl.is_exported:
+            self._exports[decl.hash] = decl
+
+    def remove(self, hash_: Hash) -> tp.Optional[Decl]:
+        decl = self.decls.pop(hash_, None)
+        if decl is not None:
+            self._by_usr.get(decl.usr, {}).pop(hash_, None)
+            self._by_spelling[decl.spelling].pop(hash_, None)
+            self._by_kind[type(decl)].pop(hash_, None)
+            self._headers.pop(hash_, None)
+            self._exports.pop(hash_, None)
+        return decl
+
+    def get(self, hash_: Hash) -> tp.Optional[Decl]:
+        return self.decls.get(hash_)
+
+    def get_by_usr(self, usr: str) -> tp.List[Decl]:
+        """:return: USR 相同的声明，前置声明与定义的 USR 相同"""
+        return list(self._by_usr.get(usr, {}).values())
+
+    def find(self, spelling: str) -> tp.List[Decl]:
+        """:return: 名字为 spelling 的声明，按定义顺序"""
+        return list(self._by_spelling.get(spelling, {}).values())
+
+    def of_kind(self, *kinds: tp.Type[Decl]) -> tp.List[Decl]:
+        """:return: 类型为 kinds 之一的声明(不含子类)"""
+        if len(kinds) == 1:
+            return list(self._by_kind.get(kinds[0], {}).values())
+        return [decl for decl in self.decls.values() if type(decl) in kinds]
+
+    def get_header(self, decl: Decl) -> tp.Optional[Header]:
+        """:return: 声明最后一次定义时所属的头文件"""
+        return self._headers.get(decl.hash)
+
+    @property
+    def exports(self) -> tp.List[Decl]:
+        """:return: 外部链接的函数，按定义顺序"""
+        return list(self._exports.values())
+
+    def query(
+            self,
+            spelling: str = None,
+            kinds: tp.Iterable[tp.Type[Decl]] = None,
+            header: Header = None,
+            pattern: str = None,
+            usr: str = None
+    ) -> tp.List[Decl]:
+        """
+        按条件组合查询，条件之间为且，从最小的索引开始过滤
+        :param spelling: 名字
+        :param kinds: 声明类型
+        :param header: 所属头文件，给出时在 header.defined_decls 中查询
+        :param pattern: 名字的正则表达式，全匹配
+        :param usr: USR
+        :return: 满足全部条件的声明，按定义顺序
+        """
+        kinds = tuple(kinds) if kinds is not None else None
+        if header is not None:
+            decls = header.defined_decls
+        else:
+            candidates = [self.decls]
+            if spelling is not None:
+                candidates.append(self._by_spelling.get(spelling, {}))
+            if usr is not None:
+                candidates.append(self._by_usr.get(usr, {}))
+            if kinds is not None and len(kinds) == 1:
+                candidates.append(self._by_kind.get(kinds[0], {}))
+            decls = min(candidates, key=len)
+        regex = re.compile(pattern) if pattern is not None else None
+        return [decl for decl in decls.values()
+                if (spelling is None or decl.spelling == spelling)
+                and (usr is None or decl.usr == usr)
+                and (kinds is None or type(decl) in kinds)
+                and (regex is None or regex.fullmatch(decl.spelling))]
+
+    def __contains__(self, hash_: Hash) -> bool:
+        return hash_ in self.decls
+
+    def __len__(self) -> int:
+        return len(self.decls)
+
+    def __iter__(self) -> tp.Iterator[Decl]:
+        return iter(self.decls.values())
+
+
 @dataclass
 class Solution:
-    root_tu: TranslationUnit
+    root_tu: tp.Optional[TranslationUnit]
     root_header: Header
     builtin_header: Header
     user_headers: tp.Dict[str, Header] = field(default_factory=lambda: {})
-    defined_decls: tp.Dict[Hash, Decl] = field(default_factory=lambda: {})
+    symbols: SymbolTable = field(default_factory=SymbolTable)
     pre_defined_namespace: tp.Set[str] = field(default_factory=lambda: set())
     pre_defined_decls: tp.Dict[Hash, Decl] = field(default_factory=lambda: {})
     type_handler: tp.Any = None
@@ -94,13 +351,36 @@ class Solution:
     output_dir: str = "out"
     is_m32: bool = False
     chain_headers: tp.List[Header] = field(default_factory=lambda: [])
+    include_graph: IncludeGraph = field(default_factory=IncludeGraph)
+    reachable: tp.Optional[tp.Set[str]] = None  # 需要翻译的声明 USR，None 翻译全部声明
 
-    def define(self, decl: Decl):
-        self.defined_decls[decl.hash] = decl
+    @property
+    def defined_decls(self) -> tp.Dict[Hash, Decl]:
+        return self.symbols.decls
+
+    def define(self, decl: Decl, header: Header = None):
+        """
+        :param decl: 翻译完成的声明
+        :param header: 声明所属头文件，同时登记到 header.defined_decls
+        """
+        self.symbols.add(decl, header)
+        if header is not None:
+            header.define(decl)
+
+    def release(self):
+        """
+        翻译结束后释放 TranslationUnit 与翻译器，libclang 占用的内存随之释放
+        声明在翻译时已经复制出生成所需的字段，之后只能进行生成
+        """
+        self.root_tu = None
+        self.type_handler = None
+        self.cursor_handler = None
 
     def pre_define(self, decl: Decl):
         self.pre_defined_decls[decl.hash] = decl
         self.pre_defined_namespace.add(decl.spelling)
+        if self.type_handler is not None:
+            self.type_handler.invalidate(decl.hash, decl.spelling)
 
     def is_defined(self, obj: tp.Union[Cursor, Hash, str]) -> bool:
         if isinstance(obj, Hash):
@@ -113,7 +393,7 @@ class Solution:
         return self.user_headers.get(get_human_abs_filename(path))
 
     def get_define(self, cursor: Cursor) -> tp.Optional[Decl]:
-        return self.defined_decls.get(cursor.hash)
+        return self.symbols.get(cursor.hash)
 
     def get_abs_output_arch_dir(self) -> str:
         if not os.path.isabs(self.output_dir):
@@ -123,6 +403,10 @@ class Solution:
             else "64"))
 
     def get_abs_output_dir(self) -> str:
-        if not os.path.isabs(self.output_dir):
-            return os.path.join(os.getcwd(), self.output_dir)
-        return self.output_dir
+        return self.get_output_root(self.output_dir)
+
+    @staticmethod
+    def get_output_root(output_dir: str) -> str:
+        if not os.path.isabs(output_dir):
+            return os.path.join(os.getcwd(), output_dir)
+        return output_dir
@@ -0,0 +1,104 @@
+import logging
+import re
+import typing as tp
+
+from clang.cindex import Cursor, CursorKind, Type, TypeKind
+
+
+class SymbolPruner:
+    """
+    符号白名单，只翻译白名单中的函数/类型以及它们依赖的类型
+        - 白名单元素为名字或者正则表达式，按全匹配比较声明名
+        - 依赖包括参数与返回值、结构体/联合体成员、typedef 链、回调的函数原型
+        - 结果为声明的 USR 集合，同一声明的前置声明与定义 USR 相同
+    """
+    root_kinds = (
+        CursorKind.FUNCTION_DECL,
+        CursorKind.STRUCT_DECL,
+        CursorKind.UNION_DECL,
+        CursorKind.ENUM_DECL,
+        CursorKind.TYPEDEF_DECL,
+        CursorKind.VAR_DECL
+    )
+    # translate_all 会进入其子节点的容器，例如 extern "C" {}
+    container_kinds = (CursorKind.UNEXPOSED_DECL, CursorKind.LINKAGE_SPEC)
+
+    def __init__(self, patterns: tp.Iterable[str]):
+        """
+        :param patterns: 函数或者类型名，可以是正则表达式
+        """
+        self.patterns = list(patterns)
+        self._pattern = re.compile("|".join("(?:{})".format(pattern) for pattern in self.patterns)) \
+            if self.patterns else None
+
+    def match(self, spelling: str) -> bool:
+        return self._pattern is not None and self._pattern.fullmatch(spelling) is not None
+
+    def collect(self, root: Cursor) -> tp.Set[str]:
+        """
+        :param root: TranslationUnit 的根游标
+        :return: 需要翻译的声明的 USR
+        """
+        roots = [cursor for cursor in self._iter_declarations(root)
+                 if cursor.kind in self.root_kinds and self.match(cursor.spelling)]
+        if not roots:
+            logging.warning("no declaration matches symbols: {}".format(self.patterns))
+
+        reachable = set()
+        pending = list(roots)
+        while pending:
+            cursor = pending.pop()
+            usr = cursor.get_usr()
+            if not usr or usr in reachable:
+                continue
+            reachable.add(usr)
+            # 前置声明没有成员，从定义处查找依赖
+            self._visit_declaration(cursor.get_definition() or cursor, pending)
+        return reachable
+
+    def _iter_declarations(self, cursor: Cursor) -> tp.Iterator[Cursor]:
+        for child in cursor.get_children():
+            if child.kind in self.container_kinds:
+                yield from self._iter_declarations(child)
+            else:
+                yield child
+
+    def _visit_declaration(self, cursor: Cursor, pending: tp.List[Cursor]):
+        """把声明直接依赖的类型的声明加入 pending"""
+        kind = cursor.kind
+        if kind == CursorKind.FUNCTION_DECL:
+            self._visit_type(cursor.result_type, pending)
+            for arg in cursor.get_arguments():
+                self._visit_type(arg.type, pending)
+        elif kind == CursorKind.TYPEDEF_DECL:
+            self._visit_type(cursor.underlying_typedef_type, pending)
+        elif kind == CursorKind.VAR_DECL:
+            self._visit_type(cursor.type, pending)
+        elif kind in (CursorKind.STRUCT_DECL, CursorKind.UNION_DECL):
+            for child in cursor.get_children():
+                if child.kind == CursorKind.FIELD_DECL:
+                    self._visit_type(child.type, pending)
+                elif child.kind in (CursorKind.STRUCT_DECL, CursorKind.UNION_DECL, CursorKind.ENUM_DECL):
+                    pending.append(child)
+
+    def _visit_type(self, T: Type, pending: tp.List[Cursor]):
+        while True:
+            kind = T.kind
+            if kind in (TypeKind.POINTER, TypeKind.LVALUEREFERENCE, TypeKind.RVALUEREFERENCE):
+                T = T.get_pointee()
+            elif kind in (TypeKind.CONSTANTARRAY, TypeKind.INCOMPLETEARRAY, TypeKind.VARIABLEARRAY):
+                T = T.element_type
+            elif kind == TypeKind.ELABORATED:
+                T = T.get_named_type()
+            elif kind == TypeKind.FUNCTIONPROTO:
+                for arg in T.argument_types():
+                    self._visit_type(arg, pending)
+                T = T.get_result()
+            elif kind in (TypeKind.TYPEDEF, TypeKind.RECORD, TypeKind.ENUM):
+                pending.append(T.get_declaration())
+                return
+            else:
+                canonical = T.get_canonical()
+                if canonical.kind == kind:
+                    return
+                T = canonical
@@ -0,0 +1,118 @@
+import collections
+import contextlib
+import functools
+import json
+import os
+import time
+import typing as tp
+
+
+class TranslateStats:
+    """
+    WorkSpace.translate 的耗时与计数统计
+    未传入时不做任何插桩；传入时只替换相关对象的实例属性，不修改类本身
+        phases: 阶段 -> 耗时(秒)，pch / parse / include / prune / translate / generate / cache
+        cursors: CursorKind -> 经过 CursorTranslator 的游标数
+        decls: decl.py 中的类名 -> 创建的声明数
+        type_calls: TypeTranslator.translate 的调用次数(含递归)
+        outputs: 相对输出根目录的文件名 -> 写入的字节数
+    """
+    def __init__(self):
+        self.phases: tp.Dict[str, float] = collections.defaultdict(float)
+        self.cursors: tp.Dict[str, int] = collections.Counter()
+        self.decls: tp.Dict[str, int] = collections.Counter()
+        self.type_calls = 0
+        self.type_cache: tp.Optional[dict] = None
+        self.outputs: tp.Dict[str, int] = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """累加一个阶段的耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - started
+
+    def instrument_translators(self, cursor_handler, type_handler):
+        translate_cursor = cursor_handler.translate
+        translate_type = type_handler.translate
+
+        @functools.wraps(translate_cursor)
+        def _translate_cursor(cursor, *args, **kwargs):
+            self.cursors[cursor.kind.name] += 1
+            decl = translate_cursor(cursor, *args, **kwargs)
+            if decl is not None:
+                self.decls[decl.__class__.__name__] += 1
+            return decl
+
+        @functools.wraps(translate_type)
+        def _translate_type(*args, **kwargs):
+            self.type_calls += 1
+            return translate_type(*args, **kwargs)
+
+        cursor_handler.translate = _translate_cursor
+        type_handler.translate = _translate_type
+
+    def instrument_generator(self, generator):
+        write = generator._write
+        write_stream = generator._write_stream
+        copy = generator._copy
+
+        @functools.wraps(write)
+        def _write(path: str, content: tp.Union[str, bytes]):
+            size = len(content.encode("utf-8") if isinstance(content, str) else content)
+            self.outputs[generator._get_output_name(path)] = size
+            write(path, content)
+
+        @functools.wraps(write_stream)
+        def _write_stream(path: str, emit):
+            writer = write_stream(path, emit)
+            self.outputs[generator._get_output_name(path)] = writer.size
+            return writer
+
+        @functools.wraps(copy)
+        def _copy(source: str, target: str):
+            self.outputs[generator._get_output_name(target)] = os.path.getsize(source)
+            copy(source, target)
+
+        generator._write = _write
+        generator._copy = _copy
+        generator._write_stream = _write_stream
+
+    def collect(self, solution):
+        """翻译结束后记录类型缓存命中情况"""
+        if solution.type_handler is not None:
+            self.type_cache = solution.type_handler.cache_info()._asdict()
+
+    @property
+    def total_time(self) -> float:
+        return sum(self.phases.values())
+
+    @property
+    def output_size(self) -> int:
+        return sum(self.outputs.values())
+
+    def to_dict(self) -> dict:
+        return {
+            "phases": dict(self.phases),
+            "total_time": self.total_time,
+            "cursors": dict(self.cursors.most_common()),
+            "decls": dict(self.decls.most_common()),
+            "type_calls": self.type_calls,
+            "type_cache": self.type_cache,
+            "outputs": dict(sorted(self.outputs.items())),
+            "output_size": self.output_size
+        }
+
+    def dump(self, path: str):
+        """以 JSON 写入 path"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def summary(self) -> str:
+        lines = ["{:.2f}s total, {} cursors, {} decls, {} type calls, {} files, {} bytes".format(
+            self.total_time, sum(self.cursors.values()), sum(self.decls.values()), self.type_calls,
+            len(self.outputs), self.output_size)]
+        lines.extend("  {:<10} {:.3f}s".format(name, elapsed) for name, elapsed in self.phases.items())
+        return "\n".join(lines)
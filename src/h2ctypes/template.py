@@ -1,3 +1,5 @@
+INDENT = "    "
+
 ENUM_DEFINE_TEMPLATE = """class {}(IsEnumType):
 {}
 """
@@ -17,6 +19,10 @@ C_STRUCTURE_TEMPLATE = """
 {}
 ]
 """
+# (记录大小, ((字段名, 字节偏移, numpy 格式 None 表示由 _fields_ 推导), ...))，见 com.get_dtype
+DTYPE_LAYOUT_TEMPLATE = """{}._dtype_layout_ = ({}, (
+{}))
+"""
 
 DLL_DEPENDENCY_HEADER_TEMPLATE = """from .com import *
 # location 
@@ -47,8 +53,96 @@ DLL_TOP_HEADER_TEMPLATE = """from .dependencies.com import *
 # function
 {}
 class {}Dll(CtypesDll):
-    def _setup(self):
-        super()._setup()
-        # export interface
+    # export interface
+{}
+    _interfaces_ = {{
+{}
+    }}
+{}"""
+
+TOP_PACKAGE_TEMPLATE = """import platform
+
+sub_package = platform.system() + platform.architecture()[0][:2]
+
+if sub_package == "Windows64":
+    from .Windows64 import *
+elif sub_package == "Windows32":
+    from .Windows32 import *
+elif sub_package == "Linux64":
+    from .Linux64 import *
+elif sub_package == "Linux32":
+    from .Linux32 import *
+else:
+    raise ImportError"""
+
+LAZY_DLL_ROOT_HEADER_TEMPLATE = """from .com import *
+# location 
+# {}
+
+# dependencies
 {}
+# declaration
+{}
+# defines
+{}
+# function
+{}
+class {}Dll(CtypesDll):
+    # export interface
+{}
+    _interfaces_ = {{
+{}
+    }}
+{}# namespace
+__all__ = [{}]
 """
+
+LAZY_PACKAGE_TEMPLATE = """import importlib
+
+# symbol -> module
+_symbols_ = {{
+{}
+}}
+__all__ = list(_symbols_)
+
+
+def __getattr__(name):
+    try:
+        value = getattr(importlib.import_module(_symbols_.get(name, ".dependencies.com"), __name__), name)
+    except AttributeError:
+        raise AttributeError("module {{!r}} has no attribute {{!r}}".format(__name__, name)) from None
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return __all__
+"""
+
+LAZY_TOP_PACKAGE_TEMPLATE = """import importlib
+import platform
+
+sub_package = platform.system() + platform.architecture()[0][:2]
+
+if sub_package not in ("Windows64", "Windows32", "Linux64", "Linux32"):
+    raise ImportError
+
+
+def __getattr__(name):
+    return getattr(importlib.import_module("." + sub_package, __name__), name)
+"""
+
+FROZEN_MODULE_TEMPLATE = """from ctypes import *
+from .com import CtypesDll, IsEnumType, DEFAULT_LACK_C_TYPE, UNEXPOSED_TYPE, get_dtype, as_ndarray
+# location 
+# {}
+
+# declaration
+{}
+class {}Dll(CtypesDll):
+    # export interface
+{}
+    _interfaces_ = {{
+{}
+    }}
+{}"""
@@ -1,4 +1,7 @@
 import logging
+import re
+import typing as tp
+from collections import namedtuple
 
 from clang.cindex import Type, TypeKind
 
@@ -6,12 +9,34 @@ from .project import Solution
 from .com import DEFAULT_LACK_C_TYPE_STR, IsInCompeteArrayType, IsRefArg, IsConstArg, UNEXPOSED_TYPE_STR
 
 
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "currsize"])
+# (kind, spelling, 规范类型的 spelling, 声明的 hash, is_typing)
+CacheKey = tp.Tuple[TypeKind, str, str, int, bool]
+
+_QUALIFIER_PATTERN = re.compile(r"\bconst\s+|\b[A-Za-z_][A-Za-z0-9_]*::")
+
+
 def is_legal_id(id_: str) -> bool:
     if id_:
         id_ = id_.split()[-1]
     return all(map(lambda c: c in "_1234567890aqzxswedcvfrtgbnhyujmkiolpQAZXSWEDCVFRTGBNHYUJMKIOLP", id_))
 
 
+def get_plain_spelling(spelling: str) -> str:
+    """
+    去掉类型名中的 const 限定以及命名空间/类作用域前缀
+    :param spelling: clang 的类型名，例如 const ns::Inner
+    :return: Inner
+    """
+    return _QUALIFIER_PATTERN.sub("", spelling)
+
+
+def is_const_pointer(T: Type) -> bool:
+    """:return: T 是否为指向 const 的指针或者引用，例如 const int *、const Point &"""
+    T = T.get_canonical()
+    return T.kind in (TypeKind.POINTER, TypeKind.LVALUEREFERENCE) and T.get_pointee().is_const_qualified()
+
+
 class TypeTranslator:
     type2ctype = {
         # CLANG_TYPE: ()
@@ -39,9 +64,46 @@ class TypeTranslator:
         TypeKind.LONGDOUBLE: 'c_longdouble',
         TypeKind.NULLPTR: 'c_void_p'
     }
+    # POINTER(T) -> ctypes 中对应的指针类型
+    pointer2ctype = {
+        'None': 'c_void_p',
+        'c_char': 'c_char_p',
+        'c_wchar': 'c_wchar_p'
+    }
 
     def __init__(self, solution: Solution):
         self._solution = solution
+        # _get_key(T, is_typing) -> (result, 依赖的声明hash/名字)
+        self._cache: tp.Dict[CacheKey, tp.Tuple[str, tp.FrozenSet]] = {}
+        # 声明hash/名字 -> 依赖它的缓存key
+        self._dependents: tp.Dict[tp.Union[int, str], tp.Set[CacheKey]] = {}
+        self._frames: tp.List[tp.Set[tp.Union[int, str]]] = []
+        self.hits = 0
+        self.misses = 0
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, len(self._cache))
+
+    def invalidate(self, *names: tp.Union[int, str]):
+        """
+        声明被预定义后，丢弃翻译时依赖其"未定义"状态的缓存
+        :param names: 声明hash或者名字
+        """
+        for name in names:
+            for key in self._dependents.pop(name, ()):
+                self._cache.pop(key, None)
+
+    @staticmethod
+    def _get_key(T: Type, is_typing: bool) -> CacheKey:
+        """
+        类型的标识，不能只用 spelling: 不同作用域中同名的类型(例如两个结构体内各自的 typedef T)spelling 相同，
+        规范类型区分它们的实际类型，声明的 hash 区分同一规范类型的不同声明
+        """
+        return T.kind, T.spelling, T.get_canonical().spelling, T.get_declaration().hash, is_typing
+
+    def _depend(self, *names: tp.Union[int, str]):
+        if self._frames:
+            self._frames[-1].update(names)
 
     def translate(self, T: Type, is_typing=False, **kwargs) -> str:
         if is_typing:
@@ -49,6 +111,29 @@ class TypeTranslator:
         kind = T.kind
         if kind in self.type2ctype:
             return self.type2ctype[kind]
+        if kwargs:
+            return self._translate(T, is_typing, **kwargs)
+        key = self._get_key(T, is_typing)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._depend(*entry[1])
+            return entry[0]
+
+        self.misses += 1
+        self._frames.append(set())
+        try:
+            result = self._translate(T, is_typing)
+        finally:
+            names = frozenset(self._frames.pop())
+        self._cache[key] = (result, names)
+        for name in names:
+            self._dependents.setdefault(name, set()).add(key)
+        self._depend(*names)
+        return result
+
+    def _translate(self, T: Type, is_typing=False, **kwargs) -> str:
+        kind = T.kind
         meth = getattr(self, kind.name, None)
         if meth:
             if T.is_const_qualified():
@@ -70,7 +155,10 @@ class TypeTranslator:
         if pointer.kind == TypeKind.FUNCTIONPROTO:
             return self.translate(pointer, is_typing)
         else:
-            return "POINTER({})".format(self.translate(pointer, is_typing))
+            return self._pointer(self.translate(pointer, is_typing))
+
+    def _pointer(self, ctype: str) -> str:
+        return self.pointer2ctype.get(ctype) or "POINTER({})".format(ctype)
 
     def UNEXPOSED(self, T: Type, is_typing=False):
         return UNEXPOSED_TYPE_STR
@@ -81,6 +169,7 @@ class TypeTranslator:
     def TYPEDEF(self, T: Type, is_typing=False):
         decl = T.get_declaration()
         if not self._solution.is_defined(decl):
+            self._depend(decl.hash)
             return self.translate(decl.type.get_canonical(), is_typing)
         else:
             return decl.spelling
@@ -89,16 +178,17 @@ class TypeTranslator:
         if not self._solution.is_defined(T.get_declaration().hash) and not self._solution.is_defined(T.spelling):
             if is_legal_id(T.spelling) \
                     and self._solution.cursor_handler.translate(T.get_declaration(), is_builtin=True):
-                return T.spelling
+                return get_plain_spelling(T.spelling)
             else:
+                self._depend(T.get_declaration().hash, T.spelling)
                 return DEFAULT_LACK_C_TYPE_STR
-        return T.spelling
+        return get_plain_spelling(T.spelling)
 
     def ENUM(self, T: Type, is_typing=False):
         return self.translate(T.get_declaration().enum_type, is_typing)
 
     def LVALUEREFERENCE(self, T: Type, is_typing=False):
-        return "{}(POINTER({}))".format(IsRefArg.__name__, self.translate(T.get_pointee(), is_typing))
+        return "{}({})".format(IsRefArg.__name__, self._pointer(self.translate(T.get_pointee(), is_typing)))
 
     def FUNCTIONPROTO(self, T: Type, is_typing=False):
         return "CFUNCTYPE({}, {})".format(self.translate(T.get_result(), is_typing),
@@ -0,0 +1,363 @@
+"""
+常驻的监视模式
+
+    h2ctypes-watch serve --libclang <libclang目录> --root <工作根目录> -o out root.h
+    h2ctypes-watch rebuild
+    h2ctypes-watch status
+    h2ctypes-watch stop
+"""
+import argparse
+import hmac
+import json
+import logging
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+import typing as tp
+from dataclasses import dataclass, field, asdict, replace
+
+from clang.cindex import TranslationUnit, Diagnostic, conf
+
+from .project import get_human_abs_filename
+from .batch import TranslateJob
+from .gen import CtypesDllGenerator
+from .stats import TranslateStats
+
+DEFAULT_ADDRESS = ("127.0.0.1", 47390)
+TOKEN_DIR = os.path.join(os.path.expanduser("~"), ".h2ctypes")
+
+_SEVERITIES = {
+    Diagnostic.Ignored: "ignored",
+    Diagnostic.Note: "note",
+    Diagnostic.Warning: "warning",
+    Diagnostic.Error: "error",
+    Diagnostic.Fatal: "fatal"
+}
+
+
+def get_token_path(address: tp.Tuple[str, int]) -> str:
+    """:return: 监听 address 的 WatchServer 的令牌文件，只有当前用户可读"""
+    return os.path.join(TOKEN_DIR, "watch-{}-{}.token".format(address[0].replace(":", "_"), address[1]))
+
+
+def _get_mtime(path: str) -> tp.Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+@dataclass
+class BuildResult:
+    changed: tp.List[str] = field(default_factory=lambda: [])
+    reparsed: bool = False
+    elapsed: float = 0.0
+    diagnostics: tp.List[tp.Dict[str, str]] = field(default_factory=lambda: [])
+    modules: tp.List[str] = field(default_factory=lambda: [])  # 重新生成的头文件模块
+    phases: tp.Dict[str, float] = field(default_factory=lambda: {})
+    error: tp.Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.errors
+
+    @property
+    def errors(self) -> int:
+        return sum(1 for item in self.diagnostics if item["severity"] in ("error", "fatal"))
+
+    def to_dict(self) -> dict:
+        return dict(asdict(self), ok=self.ok)
+
+    def summary(self) -> str:
+        lines = ["{} {:.2f}s, {} changed, {} modules regenerated, {} diagnostics".format(
+            "reparse" if self.reparsed else "parse", self.elapsed, len(self.changed), len(self.modules),
+            len(self.diagnostics))]
+        lines.extend("  {}".format(item["message"]) for item in self.diagnostics)
+        if self.error:
+            lines.append(self.error)
+        return "\n".join(lines)
+
+
+class WatchSession:
+    """
+    常驻内存的翻译会话，保持 WorkSpace 的 Index 以及解析出的 TranslationUnit
+        - 监视 tu.get_includes() 中的全部文件、根头文件与前缀头文件
+        - rebuild 对已有的 TranslationUnit 调用 reparse，clang 参数变化(例如 PCH 重新编译)时重新解析；
+          reparse 后 get_includes() 不再报告 -include 的文件，使用 include_files 时每次都重新解析
+        - 以增量模式生成，只有声明发生变化的头文件模块会重新生成
+    rebuild 可以在服务线程与轮询线程中调用，由锁保证同一时间只有一次构建
+    """
+    def __init__(
+            self,
+            workspace,
+            job: TranslateJob,
+            *,
+            symbols: tp.Iterable[str] = None,
+            prefix_headers: tp.Iterable[str] = None,
+            workers: int = None
+    ):
+        """
+        :param workspace: 保持 Index 的 WorkSpace
+        :param job: 翻译参数
+        :param symbols: 符号白名单，同 WorkSpace.translate
+        :param prefix_headers: 预编译的前缀头文件，同 WorkSpace.translate
+        :param workers: 生成阶段的进程数
+        """
+        self.workspace = workspace
+        self.job = replace(job, header_file_path=os.path.join(os.getcwd(), job.header_file_path))
+        self._symbols = sorted(set(symbols)) if symbols is not None else None
+        self._prefix_headers = [os.path.abspath(path) for path in prefix_headers or []]
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._tu: tp.Optional[TranslationUnit] = None
+        self._args: tp.Optional[tp.List[str]] = None
+        self._mtimes: tp.Dict[str, tp.Optional[int]] = {}
+        self.last_result: tp.Optional[BuildResult] = None
+
+    @property
+    def files(self) -> tp.List[str]:
+        """当前监视的文件"""
+        return sorted(self._mtimes)
+
+    def poll(self) -> tp.List[str]:
+        """:return: 上次构建以来修改或者删除的文件"""
+        return [path for path, mtime in self._mtimes.items() if _get_mtime(path) != mtime]
+
+    def rebuild(self) -> BuildResult:
+        """重新解析、翻译并增量生成，异常记录在结果中"""
+        with self._lock:
+            result = BuildResult(changed=self.poll())
+            stats = TranslateStats()
+            started = time.perf_counter()
+            try:
+                self._build(result, stats)
+            except Exception:
+                self._tu = None
+                result.error = traceback.format_exc()
+                logging.error("rebuild {} failed:\n{}".format(self.job.header_file_path, result.error))
+            result.elapsed = time.perf_counter() - started
+            result.phases = dict(stats.phases)
+            self.last_result = result
+            return result
+
+    def watch(self, interval=1.0, stopped: threading.Event = None):
+        """
+        在当前线程轮询文件变化，发生变化时 rebuild
+        :param interval: 轮询间隔(秒)
+        :param stopped: 设置后退出，None 时直到 KeyboardInterrupt
+        """
+        stopped = stopped or threading.Event()
+        try:
+            while not stopped.wait(interval):
+                changed = self.poll()
+                if changed:
+                    logging.info("changed: {}".format(changed))
+                    logging.info(self.rebuild().summary())
+        except KeyboardInterrupt:
+            pass
+
+    def _build(self, result: BuildResult, stats: TranslateStats):
+        workspace = self.workspace
+        job = self.job
+        args = workspace._build_args(job.is_m32, job.user_macros, job.include_files, job.include_search_paths)
+        if self._prefix_headers:
+            with stats.phase("pch"):
+                args = workspace._add_pch_args(args, self._prefix_headers)
+
+        mtimes = {path: _get_mtime(path) for path in self._mtimes}  # 解析期间的修改留给下一次 poll
+        with stats.phase("parse"):
+            if self._tu is not None and args == self._args and not self.job.include_files:
+                # 非 0 表示 TranslationUnit 已失效，只能重新解析
+                if conf.lib.clang_reparseTranslationUnit(self._tu, 0, None, 0) == 0:
+                    result.reparsed = True
+                else:
+                    self._tu = None
+            if not result.reparsed:
+                self._tu = None
+                self._tu = workspace._parse(job.header_file_path, args)
+                self._args = args
+        root_tu = self._tu
+        result.diagnostics = [{"severity": _SEVERITIES.get(item.severity, str(item.severity)),
+                               "message": str(item)} for item in root_tu.diagnostics]
+        files = {job.header_file_path}
+        files.update(self._prefix_headers)
+        files.update(include for _, include in workspace._get_pch_includes(args))
+        for item in root_tu.get_includes():
+            files.add(item.include.name)
+            if item.source is not None:
+                files.add(item.source.name)
+        files = {get_human_abs_filename(path) or path for path in files}
+        self._mtimes = {path: mtimes[path] if path in mtimes else _get_mtime(path) for path in files}
+
+        solution = workspace._translate_tu(root_tu, job.header_file_path, job.include_user_files, job.output_dir,
+                                           job.is_m32, stats, self._symbols, args)
+        root_tu = None
+        solution.release()
+        generator = CtypesDllGenerator(solution, incremental=True, lazy_import=job.lazy_import,
+                                       workers=self._workers, dtype_layout=job.dtype_layout)
+        stats.instrument_generator(generator)
+        with stats.phase("generate"):
+            result.modules = generator.generate()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """每行一个 JSON 请求 {"command": ...}，每行一个 JSON 响应"""
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.dispatch(json.loads(line.decode("utf-8")))
+            except ValueError as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+class WatchServer(socketserver.ThreadingTCPServer):
+    """
+    本地 socket 服务，命令:
+        rebuild: 立即重新构建，返回 BuildResult
+        status: 返回监视的文件数与上一次的 BuildResult
+        stop: 停止监视
+    每个请求都需要携带令牌，令牌写入只有当前用户可读写的文件(get_token_path)，其他用户无法触发命令
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, session: WatchSession, address: tp.Tuple[str, int] = DEFAULT_ADDRESS, token: str = None):
+        """
+        :param token: 请求令牌，None 时随机生成
+        """
+        super().__init__(address, _RequestHandler)
+        self.session = session
+        self.stopped = threading.Event()
+        self.token = token or secrets.token_hex(16)
+        self.token_path = get_token_path(self.server_address[:2])
+        try:
+            self._write_token()
+        except BaseException:
+            self.server_close()
+            raise
+
+    def _write_token(self):
+        os.makedirs(os.path.dirname(self.token_path), mode=0o700, exist_ok=True)
+        if os.path.exists(self.token_path):
+            os.remove(self.token_path)
+        fd = os.open(self.token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.token)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            with open(self.token_path, "r", encoding="utf-8") as f:
+                is_own = f.read() == self.token
+            if is_own:
+                os.remove(self.token_path)
+        except (OSError, AttributeError):
+            pass
+
+    def dispatch(self, request: dict) -> dict:
+        if not hmac.compare_digest(str(request.get("token", "")).encode("utf-8"), self.token.encode("utf-8")):
+            return {"ok": False, "error": "invalid token"}
+        command = request.get("command")
+        if command == "rebuild":
+            result = self.session.rebuild()
+            return {"ok": result.ok, "result": result.to_dict()}
+        if command == "status":
+            result = self.session.last_result
+            return {"ok": True, "files": len(self.session.files), "result": result and result.to_dict()}
+        if command == "stop":
+            self.stopped.set()
+            return {"ok": True}
+        return {"ok": False, "error": "unknown command: {}".format(command)}
+
+    def watch(self, interval=1.0):
+        """在后台线程处理请求，当前线程轮询文件变化，直到收到 stop"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        try:
+            self.session.watch(interval, self.stopped)
+        finally:
+            self.shutdown()
+            thread.join()
+
+
+def request(command: str, address: tp.Tuple[str, int] = DEFAULT_ADDRESS, timeout: float = None,
+            token: str = None) -> dict:
+    """
+    向 WatchServer 发送一条命令
+    :param token: 请求令牌，None 时从 get_token_path(address) 读取
+    :return: 响应
+    """
+    if token is None:
+        with open(get_token_path(address), "r", encoding="utf-8") as f:
+            token = f.read().strip()
+    with socket.create_connection(address, timeout) as sock:
+        sock.sendall((json.dumps({"command": command, "token": token}) + "\n").encode("utf-8"))
+        with sock.makefile("r", encoding="utf-8") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("connection closed by {}:{}".format(*address))
+    return json.loads(line)
+
+
+def _parse_address(text: str) -> tp.Tuple[str, int]:
+    host, _, port = text.rpartition(":")
+    return host or DEFAULT_ADDRESS[0], int(port)
+
+
+def main(argv: tp.List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--address", type=_parse_address, default=DEFAULT_ADDRESS,
+                        help="host:port，默认 {}:{}".format(*DEFAULT_ADDRESS))
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="启动监视服务")
+    serve.add_argument("header", help="需要翻译的头文件")
+    serve.add_argument("--libclang", required=True, help="libclang目录")
+    serve.add_argument("--root", default="", help="工作根目录")
+    serve.add_argument("-o", "--output-dir", default="out")
+    serve.add_argument("-I", dest="include_search_paths", action="append")
+    serve.add_argument("-D", dest="user_macros", action="append")
+    serve.add_argument("--include", dest="include_files", action="append")
+    serve.add_argument("--m32", action="store_true")
+    serve.add_argument("--lazy-import", action="store_true")
+    serve.add_argument("--dtype-layout", action="store_true")
+    serve.add_argument("--symbols", nargs="+")
+    serve.add_argument("--prefix-headers", nargs="+")
+    serve.add_argument("--workers", type=int)
+    serve.add_argument("--interval", type=float, default=1.0, help="轮询间隔(秒)")
+    serve.add_argument("--debug", action="store_true")
+    for name in ("rebuild", "status", "stop"):
+        commands.add_parser(name)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        from .workspace import WorkSpace
+        logging.basicConfig(level=logging.INFO)
+        workspace = WorkSpace(args.libclang, debug=args.debug, root_path=args.root)
+        user_macros = [tuple(item.split("=", 1)) if "=" in item else item for item in args.user_macros or []]
+        workspace.watch(
+            args.header, is_m32=args.m32, user_macros=user_macros, include_files=args.include_files,
+            include_search_paths=args.include_search_paths, output_dir=args.output_dir,
+            lazy_import=args.lazy_import, symbols=args.symbols, prefix_headers=args.prefix_headers,
+            workers=args.workers, dtype_layout=args.dtype_layout, address=args.address, interval=args.interval)
+        return 0
+
+    response = request(args.command, args.address)
+    result = response.get("result")
+    if "files" in response:
+        print("{} files watched".format(response["files"]))
+    if result:
+        print(BuildResult(**{k: v for k, v in result.items() if k != "ok"}).summary())
+    if response.get("error"):
+        print(response["error"], file=sys.stderr)
+    return 0 if response.get("ok") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
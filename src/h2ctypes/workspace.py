@@ -1,14 +1,26 @@
+import collections
+import concurrent.futures
+import contextlib
 import copy
+import dataclasses
 import logging
 import os
+import tempfile
 import typing as tp
 
-from clang.cindex import Config, TranslationUnit, Index, Diagnostic
+from clang.cindex import Config, TranslationUnit, Index, Diagnostic, FileInclusion
 
-from .project import get_human_abs_filename, Header, HeaderType, Solution
+from .project import get_human_abs_filename, Header, HeaderType, Solution, IncludeGraph
+from .cache import ParseCache, PchCache
+from .batch import TranslateJob, BatchReport, run_batch
 from .type import TypeTranslator
 from .cursor import CursorTranslator
-from .gen import CtypesDllGenerator
+from .prune import SymbolPruner
+from .decl import reset_anonymous_names
+from .gen import CtypesDllGenerator, CommonPackageGenerator, SharedPackageGenerator, write_file
+from .frozen import FrozenCtypesGenerator
+from .stats import TranslateStats
+from .watch import WatchSession, WatchServer, DEFAULT_ADDRESS
 
 
 class WorkSpace:
@@ -19,19 +31,26 @@ class WorkSpace:
                     | TranslationUnit.PARSE_INCLUDE_BRIEF_COMMENTS_IN_CODE_COMPLETION
     clang_args = ["-x", "c++"]
 
-    def __init__(self, libclang_path: str, debug=False, root_path: str = ""):
+    def __init__(self, libclang_path: str, debug=False, root_path: str = "", cache_dir: str = None):
         """
         :param root_path: 设置一个工作根目录，后续所有需要翻译的用户头文件从该目录过滤
         :param libclang_path: libclang目录
         :param debug: True 调试模式
+        :param cache_dir: 解析缓存目录，None 不使用缓存，PCH 保存在其中的 pch 子目录
         """
         if debug:
             logging.basicConfig(level=logging.DEBUG)
         if not os.path.isabs(root_path):
             root_path = os.path.join(os.getcwd(), root_path)
         self.path = get_human_abs_filename(root_path)
-        Config.set_library_path(libclang_path)
+        self._libclang_path = libclang_path
+        self._debug = debug
+        if not Config.loaded:
+            Config.set_library_path(libclang_path)
         self.index = Index.create()
+        self.cache = ParseCache(cache_dir) if cache_dir else None
+        self.pch_cache = PchCache(os.path.join(cache_dir, "pch")) if cache_dir else None
+        self._pch_dir: tp.Optional[tempfile.TemporaryDirectory] = None
 
     def translate(
             self,
@@ -42,8 +61,16 @@ class WorkSpace:
             include_files: tp.Iterable[str] = None,
             include_search_paths: tp.Iterable[str] = None,
             output_dir="out",
-            include_user_files: tp.Iterable[str] = None
-    ):
+            include_user_files: tp.Iterable[str] = None,
+            incremental=False,
+            lazy_import=False,
+            frozen=False,
+            stats: TranslateStats = None,
+            workers: int = None,
+            symbols: tp.Iterable[str] = None,
+            prefix_headers: tp.Iterable[str] = None,
+            dtype_layout=False
+    ) -> tp.Optional[TranslateStats]:
         """
         翻译一个头文件
         :param header_file_path: 需要翻译的头文件路径
@@ -53,8 +80,364 @@ class WorkSpace:
         :param include_search_paths: 用户指定的头文件搜索路径
         :param output_dir: 输出目录
         :param include_user_files: 额外用户头文件
-        :return:
+        :param incremental: 增量生成，只重写内容发生变化的文件
+        :param lazy_import: 生成按需导入的包，只执行实际访问到的模块
+        :param frozen: 每个架构只生成一个扁平模块，导入最快
+        :param stats: 传入 TranslateStats 收集各阶段耗时与计数，None 不做任何统计
+        :param workers: 生成阶段的进程数，大于1时按头文件并行生成，frozen 模式忽略
+        :param symbols: 符号白名单，函数或者类型名(可以是正则表达式，全匹配)，
+                        只翻译并生成这些符号及其依赖的类型，None 翻译全部声明
+        :param prefix_headers: 预编译的前缀头文件，例如体积大且很少改变的系统、第三方基础头文件，
+                               相同参数下只编译一次，之后通过 -include-pch 复用；
+                               其中的用户头文件仍生成各自的模块，与 -include 一样视为被所有头文件包含
+        :param dtype_layout: 结构体/联合体写入 clang 的布局，供 com.get_dtype 构造 numpy dtype，默认不写入
+        :return: stats
         """
+        args = self._build_args(is_m32, user_macros, include_files, include_search_paths)
+        if prefix_headers:
+            with self._phase(stats, "pch"):
+                args = self._add_pch_args(args, prefix_headers)
+        logging.debug("clang args: {}".format(args))
+
+        if not os.path.isabs(header_file_path):
+            header_file_path = os.path.join(os.getcwd(), header_file_path)
+        if symbols is not None:
+            symbols = sorted(set(symbols))
+
+        root_tu = None
+        if self.cache:
+            key = self.cache.make_key(header_file_path, args)
+            options = repr([self.path, sorted(include_user_files or []), lazy_import, frozen,
+                            symbols, dtype_layout])
+            with self._phase(stats, "cache"):
+                manifest = self.cache.load(key)
+                if manifest:
+                    if manifest["options"] == options:
+                        output_root = Solution.get_output_root(output_dir)
+                        if self.cache.is_output_current(manifest, output_root) \
+                                or self.cache.restore(key, manifest, output_root):
+                            logging.info("{} is up to date".format(header_file_path))
+                            return stats
+                    root_tu = self.cache.load_tu(key, self.index)
+
+        if root_tu is None:
+            with self._phase(stats, "parse"):
+                root_tu = self._parse(header_file_path, args)
+        solution = self._translate_tu(root_tu, header_file_path, include_user_files, output_dir, is_m32, stats,
+                                      symbols, args)
+        if self.cache:
+            with self._phase(stats, "cache"):
+                files = self.cache.save_tu(key, root_tu)
+        # 生成阶段不再需要 libclang 对象
+        solution.release()
+        root_tu = None
+
+        # gen processing
+        if frozen:
+            generator = FrozenCtypesGenerator(solution, incremental=incremental, dtype_layout=dtype_layout)
+        else:
+            generator = CtypesDllGenerator(solution, incremental=incremental, lazy_import=lazy_import,
+                                           workers=workers, dtype_layout=dtype_layout)
+        if stats:
+            stats.instrument_generator(generator)
+        with self._phase(stats, "generate"):
+            generator.generate()
+
+        if self.cache:
+            with self._phase(stats, "cache"):
+                output_root = solution.get_abs_output_dir()
+                self.cache.store(key, files, options, output_root,
+                                 self.cache.list_outputs(output_root, solution.get_abs_output_arch_dir()))
+        return stats
+
+    def translate_targets(
+            self,
+            header_file_path: str,
+            targets: tp.Iterable[bool] = (False, True),
+            *,
+            shared_package="shared",
+            user_macros: tp.Iterable[tp.Union[str, tp.Tuple[tp.Any, tp.Any]]] = None,
+            include_files: tp.Iterable[str] = None,
+            include_search_paths: tp.Iterable[str] = None,
+            output_dir="out",
+            include_user_files: tp.Iterable[str] = None,
+            incremental=False,
+            lazy_import=False,
+            workers: int = None,
+            symbols: tp.Iterable[str] = None,
+            prefix_headers: tp.Iterable[str] = None,
+            dtype_layout=False
+    ) -> tp.Dict[str, int]:
+        """
+        一次翻译同一个头文件的多个架构
+        各架构在线程中并行解析，生成结果相同的声明只生成一次到共享包中，
+        架构包只生成对齐不同的结构体、指针大小的 typedef 等与布局相关的声明
+        输出目录: <output_dir>/<shared_package>/ 与 <output_dir>/<架构>/
+        :param header_file_path: 需要翻译的头文件路径
+        :param targets: 需要翻译的架构，元素为 is_m32
+        :param shared_package: 共享包名
+        :param output_dir: 输出目录
+        :param incremental: 增量生成，只重写内容发生变化的文件
+        :param lazy_import: 生成按需导入的包，只执行实际访问到的模块
+        :param workers: 生成阶段的进程数，大于1时按头文件并行生成
+        :param symbols: 符号白名单，同 translate
+        :param prefix_headers: 预编译的前缀头文件，每个架构编译一个 PCH
+        :param dtype_layout: 结构体/联合体写入 clang 的布局，布局不同的声明不共享
+        :return: 共享与各架构的声明数
+        """
+        targets = list(dict.fromkeys(targets))
+        if not os.path.isabs(header_file_path):
+            header_file_path = os.path.join(os.getcwd(), header_file_path)
+        if symbols is not None:
+            symbols = sorted(set(symbols))
+        targets_args = [self._build_args(is_m32, user_macros, include_files, include_search_paths)
+                        for is_m32 in targets]
+        if prefix_headers:
+            targets_args = [self._add_pch_args(args, prefix_headers) for args in targets_args]
+        logging.debug("clang args: {}".format(targets_args))
+
+        # Index 不是线程安全的，每个线程使用独立的 Index
+        with concurrent.futures.ThreadPoolExecutor(len(targets)) as executor:
+            tus = list(executor.map(lambda args: self._parse(header_file_path, args, Index.create()),
+                                    targets_args))
+        solutions = []
+        for is_m32, root_tu, args in zip(targets, tus, targets_args):
+            solution = self._translate_tu(root_tu, header_file_path, include_user_files, output_dir, is_m32,
+                                          symbols=symbols, args=args)
+            solution.release()
+            solutions.append(solution)
+        tus = None
+
+        # gen processing
+        shared_decls = SharedPackageGenerator.find_shared_decls(solutions, dtype_layout)
+        SharedPackageGenerator(
+            dataclasses.replace(solutions[0], output_dir=os.path.join(output_dir, shared_package)),
+            shared_decls,
+            incremental=incremental,
+            lazy_import=lazy_import,
+            workers=workers,
+            dtype_layout=dtype_layout
+        ).generate()
+        counts = {shared_package: sum(len(keys) for keys in shared_decls.values())}
+        for solution in solutions:
+            generator = CtypesDllGenerator(solution, incremental=incremental, lazy_import=lazy_import,
+                                           workers=workers, shared_package=shared_package,
+                                           shared_decls=shared_decls, dtype_layout=dtype_layout)
+            generator.generate()
+            counts[os.path.basename(solution.get_abs_output_arch_dir())] = sum(
+                len(generator._get_emitted_decls(header)) for header in solution.chain_headers)
+        logging.info("shared declarations: {}".format(counts))
+        return counts
+
+    def watch(
+            self,
+            header_file_path: str,
+            *,
+            is_m32=False,
+            user_macros: tp.Iterable[tp.Union[str, tp.Tuple[tp.Any, tp.Any]]] = None,
+            include_files: tp.Iterable[str] = None,
+            include_search_paths: tp.Iterable[str] = None,
+            output_dir="out",
+            include_user_files: tp.Iterable[str] = None,
+            lazy_import=False,
+            symbols: tp.Iterable[str] = None,
+            prefix_headers: tp.Iterable[str] = None,
+            workers: int = None,
+            dtype_layout=False,
+            address: tp.Optional[tp.Tuple[str, int]] = DEFAULT_ADDRESS,
+            interval=1.0
+    ) -> WatchSession:
+        """
+        常驻监视模式，保持 Index 与 TranslationUnit，被包含的文件变化时 reparse 并增量生成
+        阻塞直到收到 stop 命令(address 为 None 时直到 KeyboardInterrupt)
+        :param header_file_path: 需要翻译的头文件路径
+        :param address: 本地 socket 地址，可通过 watch.request 或者 h2ctypes-watch 触发重新构建、获取诊断信息，
+                        请求令牌写入 watch.get_token_path(address)，None 不启动服务
+        :param interval: 轮询文件变化的间隔(秒)
+        其余参数同 translate
+        :return: 会话，包含最后一次构建的结果
+        """
+        job = TranslateJob(header_file_path, is_m32, user_macros and list(user_macros),
+                           include_files and list(include_files), include_search_paths and list(include_search_paths),
+                           output_dir, include_user_files and list(include_user_files), lazy_import, dtype_layout)
+        session = WatchSession(self, job, symbols=symbols, prefix_headers=prefix_headers, workers=workers)
+        logging.info(session.rebuild().summary())
+        if address is None:
+            session.watch(interval)
+        else:
+            with WatchServer(session, address) as server:
+                logging.info("watching {} files, listening on {}:{}, token in {}".format(
+                    len(session.files), *server.server_address[:2], server.token_path))
+                server.watch(interval)
+        return session
+
+    def translate_many(
+            self,
+            jobs: tp.Iterable[tp.Union[str, TranslateJob]],
+            *,
+            workers: int = None,
+            incremental=False
+    ) -> BatchReport:
+        """
+        在进程池中批量翻译多个互不依赖的根头文件
+        每个工作进程使用独立的 Index，只把生成的文本交回主进程写入
+        :param jobs: 头文件路径或者 TranslateJob
+        :param workers: 进程数，None 使用cpu核数
+        :param incremental: 增量写入，只重写内容发生变化的文件
+        :return: 汇总报告
+        """
+        jobs = [job if isinstance(job, TranslateJob) else TranslateJob(job) for job in jobs]
+        return run_batch((self._libclang_path, self.path, self._debug), jobs, workers, incremental)
+
+    def translate_roots(
+            self,
+            header_file_paths: tp.Iterable[str],
+            *,
+            common_package="common",
+            is_m32=False,
+            user_macros: tp.Iterable[tp.Union[str, tp.Tuple[tp.Any, tp.Any]]] = None,
+            include_files: tp.Iterable[str] = None,
+            include_search_paths: tp.Iterable[str] = None,
+            output_dir="out",
+            include_user_files: tp.Iterable[str] = None,
+            incremental=False,
+            lazy_import=False,
+            workers: int = None,
+            prefix_headers: tp.Iterable[str] = None,
+            dtype_layout=False
+    ):
+        """
+        翻译多个根头文件，所有根头文件共用一个 Solution
+        被多个根头文件包含的头文件只翻译一次，生成到公共包中，各根头文件的包从公共包导入
+        输出目录: <output_dir>/<common_package>/ 与 <output_dir>/<根头文件名>/
+        :param header_file_paths: 需要翻译的根头文件路径
+        :param common_package: 公共包名
+        :param output_dir: 输出目录，作为所有包的父包
+        :param incremental: 增量生成，只重写内容发生变化的文件
+        :param lazy_import: 生成按需导入的包，只执行实际访问到的模块
+        :param workers: 生成阶段的进程数，大于1时按头文件并行生成
+        :param prefix_headers: 预编译的前缀头文件，所有根头文件共用一个 PCH
+        :param dtype_layout: 结构体/联合体写入 clang 的布局，供 com.get_dtype 构造 numpy dtype，默认不写入
+        """
+        args = self._build_args(is_m32, user_macros, include_files, include_search_paths)
+        if prefix_headers:
+            args = self._add_pch_args(args, prefix_headers)
+        logging.debug("clang args: {}".format(args))
+        header_file_paths = [path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+                             for path in header_file_paths]
+        solutions = [self._build_solution(self._parse(path, args), path, include_user_files, args)
+                     for path in header_file_paths]
+
+        # unify headers of all roots
+        graph = IncludeGraph()
+        for item in solutions:
+            graph.update(item.include_graph)
+        builtin_header = graph.get(solutions[0].builtin_header)
+        user_headers = {}
+        for item in solutions:
+            for path, header in item.user_headers.items():
+                user_headers.setdefault(path, graph.get(header))
+        chains = [[graph.get(header) for header in item.chain_headers] for item in solutions]
+        chain_headers = graph.topological_order()
+        counts = collections.Counter(header for chain in chains for header in chain)
+        common_headers = {builtin_header}
+        common_headers.update(header for header, count in counts.items() if count > 1)
+
+        solution = Solution(
+            root_tu=solutions[0].root_tu,
+            root_header=chains[0][-1],
+            builtin_header=builtin_header,
+            user_headers=user_headers,
+            chain_headers=chain_headers,
+            include_graph=graph,
+            output_dir=output_dir,
+            is_m32=is_m32
+        )
+        solution.type_handler = TypeTranslator(solution)
+        solution.cursor_handler = CursorTranslator(solution)
+
+        # translate all cursor, skip headers translated by previous roots
+        reset_anonymous_names()
+        translated = set()
+        for item in solutions:
+            solution.cursor_handler.translate_all(
+                cursor for cursor in item.root_tu.cursor.get_children()
+                if not (cursor.location.file and get_human_abs_filename(cursor.location.file.name) in translated)
+            )
+            translated.update(header.path for header in item.chain_headers)
+        solution.release()
+        for item in solutions:
+            item.release()
+
+        # gen processing
+        CommonPackageGenerator(
+            dataclasses.replace(
+                solution,
+                chain_headers=[header for header in chain_headers if header in common_headers],
+                user_headers={header.path: header for header in common_headers},
+                output_dir=os.path.join(output_dir, common_package)
+            ),
+            incremental=incremental,
+            lazy_import=lazy_import,
+            workers=workers,
+            dtype_layout=dtype_layout
+        ).generate()
+        for item, chain in zip(solutions, chains):
+            root_header = chain[-1]
+            CtypesDllGenerator(
+                dataclasses.replace(
+                    solution,
+                    root_header=root_header,
+                    chain_headers=chain,
+                    user_headers={path: user_headers[path] for path in item.user_headers},
+                    output_dir=os.path.join(output_dir, root_header.name)
+                ),
+                incremental=incremental,
+                common_package=common_package,
+                common_headers=common_headers,
+                lazy_import=lazy_import,
+                workers=workers,
+                dtype_layout=dtype_layout
+            ).generate()
+        write_file(os.path.join(solution.get_abs_output_dir(), "__init__.py"), "", incremental=True)
+
+    def _translate_tu(self, root_tu: TranslationUnit, header_file_path, include_user_files, output_dir, is_m32,
+                      stats: TranslateStats = None, symbols: tp.Iterable[str] = None,
+                      args: tp.Iterable[str] = None) -> Solution:
+        """:param args: 解析 root_tu 的参数，用于找到 -include-pch 的 PCH"""
+        reset_anonymous_names()
+        with self._phase(stats, "include"):
+            solution = self._build_solution(root_tu, header_file_path, include_user_files, args)
+        if symbols is not None:
+            with self._phase(stats, "prune"):
+                solution.reachable = SymbolPruner(symbols).collect(root_tu.cursor)
+        type_handler = TypeTranslator(solution)
+        cursor_handler = CursorTranslator(solution)
+        solution.type_handler = type_handler
+        solution.cursor_handler = cursor_handler
+        solution.output_dir = output_dir
+        solution.is_m32 = is_m32
+        if stats:
+            stats.instrument_translators(cursor_handler, type_handler)
+
+        # translate all cursor
+        with self._phase(stats, "translate"):
+            cursor_handler.translate_all(solution.root_tu.cursor.get_children())
+        if stats:
+            stats.collect(solution)
+        return solution
+
+    @staticmethod
+    def _phase(stats: tp.Optional[TranslateStats], name: str) -> tp.ContextManager:
+        return stats.phase(name) if stats else contextlib.nullcontext()
+
+    def _build_args(
+            self,
+            is_m32=False,
+            user_macros: tp.Iterable[tp.Union[str, tp.Tuple[tp.Any, tp.Any]]] = None,
+            include_files: tp.Iterable[str] = None,
+            include_search_paths: tp.Iterable[str] = None
+    ) -> tp.List[str]:
         args = copy.deepcopy(self.clang_args)
         # gen clang args
         args.append("-m32" if is_m32 else "-m64")
@@ -68,34 +451,40 @@ class WorkSpace:
             args.extend(["-include{}".format(include) for include in include_files])
         if include_search_paths:
             args.extend(["-I{}".format(path) for path in include_search_paths])
+        return args
 
-        logging.debug("clang args: {}".format(args))
-
-        if not os.path.isabs(header_file_path):
-            header_file_path = os.path.join(os.getcwd(), header_file_path)
+    def _add_pch_args(self, args: tp.List[str], prefix_headers: tp.Iterable[str]) -> tp.List[str]:
+        """
+        :param args: _build_args 的结果
+        :param prefix_headers: 前缀头文件
+        :return: 追加 -include-pch 后的参数，PCH 不存在或者已过期时先编译
+        """
+        if self.pch_cache is None:
+            self._pch_dir = tempfile.TemporaryDirectory(prefix="h2ctypes-pch-")
+            self.pch_cache = PchCache(self._pch_dir.name)
+        prefix_headers = [get_human_abs_filename(os.path.abspath(path)) for path in prefix_headers]
+        return args + ["-include-pch", self.pch_cache.get(self.index, prefix_headers, args)]
 
-        solution = self._parse_include_header(header_file_path, args, include_user_files)
-        type_handler = TypeTranslator(solution)
-        cursor_handler = CursorTranslator(solution)
-        solution.type_handler = type_handler
-        solution.cursor_handler = cursor_handler
-        solution.output_dir = output_dir
-        solution.is_m32 = is_m32
+    def _get_pch_includes(self, args: tp.Optional[tp.Iterable[str]]) -> tp.List[tp.Tuple[tp.Optional[str], str]]:
+        """:return: args 中 -include-pch 的 PCH 的包含关系，见 PchCache.get_includes"""
+        args = list(args or ())
+        if "-include-pch" not in args or self.pch_cache is None:
+            return []
+        return self.pch_cache.get_includes(args[args.index("-include-pch") + 1])
 
-        # translate all cursor
-        cursor_handler.translate_all(solution.root_tu.cursor.get_children())
+    def _parse_include_header(self, header_file_path, args, include_user_files=None) -> Solution:
+        return self._build_solution(self._parse(header_file_path, args), header_file_path, include_user_files)
 
-        # gen processing
-        generator = CtypesDllGenerator(solution)
-        generator.generate()
+    def _parse(self, header_file_path, args, index: Index = None) -> TranslationUnit:
+        return (index or self.index).parse(header_file_path, args=args, options=self.clang_options)
 
-    def _parse_include_header(self, header_file_path, args, include_user_files=None) -> Solution:
+    def _build_solution(self, root_tu: TranslationUnit, header_file_path, include_user_files=None,
+                        args: tp.Iterable[str] = None) -> Solution:
         if include_user_files is None:
             include_user_files = set()
         else:
             include_user_files = set(get_human_abs_filename(file) or file for file in include_user_files)
 
-        root_tu = self.index.parse(header_file_path, args=args, options=self.clang_options)
         warnings = [w for w in root_tu.diagnostics if w.severity == Diagnostic.Warning]
         errors = [w for w in root_tu.diagnostics if w.severity == Diagnostic.Error]
         fatals = [w for w in root_tu.diagnostics if w.severity == Diagnostic.Fatal]
@@ -107,7 +496,8 @@ class WorkSpace:
             [logging.critical(fatal) for fatal in fatals]
         built_header = Header(os.path.join(self.path, self.BUILTIN_FILENAME), HeaderType.VIRTUAL)  # include a virtual header
         _user_headers = {}
-        _chain_headers = []
+        graph = IncludeGraph()
+        graph.add(built_header, implicit=True)
 
         def _get_header(name: str, type_=HeaderType.REAL) -> Header:
             name = get_human_abs_filename(name)
@@ -118,41 +508,80 @@ class WorkSpace:
                 h = _user_headers[name]
             return h
 
+        def _add_include(source_name: str, include_name: str):
+            source_name = get_human_abs_filename(source_name)
+            include_name = get_human_abs_filename(include_name)
+            if (self._is_user_include_file(source_name, include_user_files) or
+                    (source_name.startswith(self.path) and include_name.startswith(self.path))):
+                graph.add_edge(_get_header(source_name), _get_header(include_name))
+
         def _parse_tu(tu: TranslationUnit):
-            for file in tu.get_includes():
+            for file in self._get_includes(tu):
                 if file.source is None:  # -include
-                    _chain_headers.append(_get_header(file.include.name, HeaderType.CLANG_INCLUDE))
+                    graph.add(_get_header(file.include.name, HeaderType.CLANG_INCLUDE), implicit=True)
                     continue
+                _add_include(file.source.name, file.include.name)
 
-                source_name = get_human_abs_filename(file.source.name)
-                include_name = get_human_abs_filename(file.include.name)
-                if (self._is_user_include_file(source_name, include_user_files) or
-                        (source_name.startswith(self.path) and include_name.startswith(self.path))):
-                    source_header = _get_header(source_name)
-                    include_header = _get_header(include_name)
-
-                    if source_name not in _chain_headers:
-                        _chain_headers.append(source_header)
-                    if include_header not in _chain_headers:
-                        index = _chain_headers.index(source_header)
-                        _chain_headers.insert(index, include_header)
-
+        # PCH 中的文件不出现在 tu.get_includes() 中，包含关系取自 PCH 的清单；
+        # 前缀头文件先于根头文件处理，与 -include 相同视为所有头文件都包含，其余文件按同样的规则过滤
+        for source, include in self._get_pch_includes(args):
+            if source is not None:
+                _add_include(source, include)
+                continue
+            include_name = get_human_abs_filename(include)
+            if self._is_user_include_file(include_name, include_user_files) or include_name.startswith(self.path):
+                graph.add(_get_header(include_name), implicit=True)
         _parse_tu(root_tu)
-        _chain_headers.insert(0, built_header)
         # make sure root_header exists
         root_header = _get_header(header_file_path)
-        if root_header in _chain_headers:
-            _chain_headers.remove(root_header)
-        _chain_headers.append(root_header)
+        graph.add(root_header)
 
         return Solution(
             root_tu=root_tu,
             root_header=root_header,
             builtin_header=built_header,
             user_headers=_user_headers,
-            chain_headers=_chain_headers
+            chain_headers=graph.topological_order(last=root_header),
+            include_graph=graph
         )
 
+    @staticmethod
+    def _get_includes(tu: TranslationUnit) -> tp.List[FileInclusion]:
+        """
+        :return: tu.get_includes() 按预处理顺序排列
+            reparse 后 preamble 中的包含关系顺序与首次解析不同，按包含指令的位置重排，保证包含图与生成结果稳定
+        """
+        includes = list(tu.get_includes())
+        implicit = [item for item in includes if item.source is None]  # -include 没有包含位置，保持原顺序
+        children = collections.defaultdict(list)
+        for item in includes:
+            if item.source is not None:
+                children[item.source.name].append(item)
+        for items in children.values():
+            items.sort(key=lambda item: item.location.offset)
+
+        order = []
+        expanded = set()
+        for item, name in [(item, item.include.name) for item in implicit] + [(None, tu.spelling)]:
+            if item is not None:
+                order.append(item)
+            if name in expanded:
+                continue
+            expanded.add(name)
+            stack = [iter(children.get(name, ()))]
+            while stack:
+                child = next(stack[-1], None)
+                if child is None:
+                    stack.pop()
+                    continue
+                order.append(child)
+                if child.include.name not in expanded:
+                    expanded.add(child.include.name)
+                    stack.append(iter(children.get(child.include.name, ())))
+        visited = set(map(id, order))
+        order.extend(item for item in includes if id(item) not in visited)
+        return order
+
     @staticmethod
     def _is_user_include_file(file: str, files: tp.Iterable[str]) -> bool:
         for name in files:
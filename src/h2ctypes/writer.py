@@ -0,0 +1,125 @@
+import contextlib
+import functools
+import hashlib
+import string
+import typing as tp
+
+from .template import INDENT
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_template(template: str) -> tp.Tuple[tp.Tuple[str, bool], ...]:
+    """:return: ((字面文本, 之后是否有 {} 占位), ...)"""
+    return tuple((literal, field is not None) for literal, field, _, _ in string.Formatter().parse(template))
+
+
+class CodeWriter:
+    """
+    流式生成代码
+        - 行首按当前层级缩进，indent() 增加层级
+        - 连续的换行合并为一个，生成的模块中不含空行
+        - 累积到 FLUSH_SIZE 后写入 stream，同时计算 sha1 与字节数
+    只有生成阶段是流式的: 所有声明仍由 CursorTranslator.translate_all 在生成开始前翻译完并保存在 Solution 中，
+    节省的是拼接整个模块字符串的峰值内存，声明本身占用的内存不变
+    """
+    FLUSH_SIZE = 1 << 16
+
+    def __init__(self, stream: tp.TextIO = None, depth=0):
+        """
+        :param stream: 输出的文本流，None 保存在内存中，通过 getvalue 获取
+        :param depth: 初始缩进层级
+        """
+        self._stream = stream
+        self._values: tp.List[str] = []
+        self._chunks: tp.List[str] = []
+        self._buffered = 0
+        self._depth = depth
+        self._is_line_start = True
+        self._is_newline = False
+        self._sha1 = hashlib.sha1()
+        self._size = 0
+
+    @classmethod
+    def render(cls, emit: tp.Callable[["CodeWriter"], tp.Any], depth=0) -> str:
+        """:return: emit 写入的全部文本"""
+        writer = cls(depth=depth)
+        emit(writer)
+        return writer.getvalue()
+
+    @contextlib.contextmanager
+    def indent(self, depth=1):
+        self._depth += depth
+        try:
+            yield self
+        finally:
+            self._depth -= depth
+
+    def write(self, text: str):
+        if not text:
+            return
+        if "\n" not in text:
+            if self._is_line_start and self._depth:
+                self._append(INDENT * self._depth)
+            self._append(text)
+            self._is_newline = self._is_line_start = False
+            return
+        for index, line in enumerate(text.split("\n")):
+            if index and not self._is_newline:
+                self._append("\n")
+                self._is_newline = self._is_line_start = True
+            if line:
+                if self._is_line_start and self._depth:
+                    self._append(INDENT * self._depth)
+                self._append(line)
+                self._is_newline = self._is_line_start = False
+
+    def write_value(self, value: tp.Any):
+        """value 为可调用对象时以 value(writer) 写入，否则写入 str(value)"""
+        if callable(value):
+            value(self)
+        else:
+            self.write(value if isinstance(value, str) else str(value))
+
+    def write_template(self, template: str, *args: tp.Any):
+        """与 template.format(*args) 相同，但参数按顺序流式写入，参数可以是 write_value 接受的可调用对象"""
+        args = iter(args)
+        for literal, has_field in _parse_template(template):
+            self.write(literal)
+            if has_field:
+                self.write_value(next(args))
+
+    def _append(self, text: str):
+        self._chunks.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self._chunks:
+            return
+        data = "".join(self._chunks)
+        self._chunks = []
+        self._buffered = 0
+        encoded = data.encode("utf-8")
+        self._sha1.update(encoded)
+        self._size += len(encoded)
+        if self._stream is None:
+            self._values.append(data)
+        else:
+            self._stream.write(data)
+
+    def getvalue(self) -> str:
+        self.flush()
+        return "".join(self._values)
+
+    @property
+    def digest(self) -> str:
+        """已写入内容 utf-8 编码后的 sha1"""
+        self.flush()
+        return self._sha1.hexdigest()
+
+    @property
+    def size(self) -> int:
+        """已写入内容 utf-8 编码后的字节数"""
+        self.flush()
+        return self._size
@@ -0,0 +1,131 @@
+import ctypes.util
+import importlib
+import os
+import sys
+import typing as tp
+
+import pytest
+from ctypes import CFUNCTYPE, POINTER, c_char, c_char_p, c_int, c_size_t, c_uint, c_void_p
+
+from h2ctypes.com import CtypesDll
+
+HEADERS_DIR = os.path.join(os.path.dirname(__file__), "headers")
+BASIC_HEADER = os.path.join(HEADERS_DIR, "basic", "api.h")
+LIBC = ctypes.util.find_library("c")
+requires_libc = pytest.mark.skipif(LIBC is None, reason="libc not found")
+
+compare_fn = CFUNCTYPE(c_int, POINTER(c_int), POINTER(c_int))
+
+
+class LibC(CtypesDll):
+    """运行时包装的测试对象，c 标准库中的几个函数，以及不存在的、与 CtypesDll 成员同名的接口"""
+    _interfaces_ = {
+        "strlen": CFUNCTYPE(c_size_t, c_char_p),
+        "memset": CFUNCTYPE(c_void_p, POINTER(c_int), c_int, c_size_t),
+        "strnlen": CFUNCTYPE(c_size_t, POINTER(c_char), c_size_t),
+        "qsort": CFUNCTYPE(None, POINTER(c_int), c_size_t, c_size_t, compare_fn),
+        "usleep": CFUNCTYPE(c_int, c_uint),
+        "h2ctypes_missing": CFUNCTYPE(c_int),
+        "profile": CFUNCTYPE(c_int),
+    }
+    _const_args_ = {
+        "strnlen": (0, ),
+    }
+
+
+def compare_ints(a, b) -> int:
+    """qsort 的比较回调"""
+    return a[0] - b[0]
+
+
+def _find_libclang() -> tp.Optional[str]:
+    path = os.environ.get("H2CTYPES_LIBCLANG")
+    if path:
+        return path
+    try:
+        import clang.cindex
+    except ImportError:
+        return None
+    path = os.path.join(os.path.dirname(clang.cindex.__file__), "native")
+    return path if os.path.isdir(path) else None
+
+
+@pytest.fixture(scope="session")
+def libclang_path() -> str:
+    """libclang 目录，H2CTYPES_LIBCLANG 或者 libclang 包自带的 native 目录，找不到时跳过"""
+    path = _find_libclang()
+    if path is None:
+        pytest.skip("libclang not found, set H2CTYPES_LIBCLANG")
+    return path
+
+
+@pytest.fixture
+def workspace_factory(libclang_path):
+    """:return: 函数 (corpus, **kwargs) -> WorkSpace，corpus 为 headers 下的目录名或者绝对路径，作为工作根目录"""
+    from h2ctypes.workspace import WorkSpace
+
+    def create(corpus: str, **kwargs):
+        return WorkSpace(libclang_path, root_path=os.path.join(HEADERS_DIR, corpus), **kwargs)
+    return create
+
+
+@pytest.fixture
+def import_package():
+    """
+    导入生成结果下的全部模块，输出目录作为顶层包；测试结束后才移除，lazy_import 的按需导入仍可用
+    :return: 函数 output_dir -> {模块名: 模块}
+    """
+    parents = []
+    packages = []
+
+    def _import(output_dir: str) -> tp.Dict[str, tp.Any]:
+        output_dir = os.path.abspath(output_dir)
+        parent, package = os.path.split(output_dir)
+        if parent not in sys.path:
+            sys.path.insert(0, parent)
+            parents.append(parent)
+        packages.append(package)
+        importlib.invalidate_caches()
+        modules = {}
+        for dirpath, _, filenames in os.walk(output_dir):
+            for filename in sorted(filenames):
+                if not filename.endswith(".py"):
+                    continue
+                name = os.path.relpath(os.path.join(dirpath, filename[:-3]), parent).replace(os.sep, ".")
+                if name.endswith(".__init__"):
+                    name = name[:-len(".__init__")]
+                modules[name] = importlib.import_module(name)
+        return modules
+
+    yield _import
+    for parent in parents:
+        sys.path.remove(parent)
+    for package in packages:
+        for name in [name for name in sys.modules if name == package or name.startswith(package + ".")]:
+            del sys.modules[name]
+
+
+def translate_basic(workspace_factory, tmp_path, name: str, **kwargs) -> str:
+    """以 kwargs 翻译 headers/basic/api.h 到 tmp_path/name，:return: 输出目录"""
+    output_dir = str(tmp_path / name)
+    workspace_factory("basic").translate(BASIC_HEADER, output_dir=output_dir, **kwargs)
+    return output_dir
+
+
+def list_files(output_dir: str) -> tp.List[str]:
+    """:return: 输出目录下的文件，相对路径，不含 __pycache__"""
+    return sorted(os.path.relpath(os.path.join(dirpath, filename), output_dir)
+                  for dirpath, _, filenames in os.walk(output_dir)
+                  if "__pycache__" not in dirpath for filename in filenames)
+
+
+def check_basic_api(module):
+    """检查 headers/basic/api.h 生成的声明"""
+    assert ctypes.sizeof(module.Point) == 8
+    assert [name for name, _ in module.Point._fields_] == ["x", "y"]
+    assert (module.Color.RED, module.Color.GREEN, module.Color.BLUE) == (0, 5, 6)
+    assert [name for name, _ in module.Shape._fields_] == ["origin", "color", "value", "name"]
+    assert dict(module.Shape._fields_)["origin"] is module.Point
+    assert set(module.Dll._interfaces_) == {"shape_area", "sort_items"}
+    assert module.Dll._const_args_ == {"shape_area": (0, )}
+    assert module.sort_items._argtypes_[-1] is module.compare_fn
@@ -0,0 +1,15 @@
+#pragma once
+
+#include "types.h"
+
+#define API_VERSION 3
+
+typedef struct Shape {
+    struct Point origin;
+    Color color;
+    union Value value;
+    char name[MAX_NAME];
+} Shape;
+
+int shape_area(const Shape *shape);
+void sort_items(void *base, unsigned long count, unsigned long size, compare_fn compare);
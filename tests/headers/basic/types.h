@@ -0,0 +1,21 @@
+#pragma once
+
+#define MAX_NAME 16
+
+typedef enum Color {
+    RED,
+    GREEN = 5,
+    BLUE
+} Color;
+
+struct Point {
+    int x;
+    int y;
+};
+
+union Value {
+    int i;
+    double d;
+};
+
+typedef int (*compare_fn)(const void *, const void *);
@@ -0,0 +1,5 @@
+#pragma once
+#include "base.h"
+#include "guard.h"
+struct A { Guarded guarded; struct Base base; };
+int a_open(struct A *a);
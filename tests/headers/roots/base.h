@@ -0,0 +1,3 @@
+#pragma once
+typedef unsigned int base_id_t;
+struct Base { base_id_t id; int flags; };
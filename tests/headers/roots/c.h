@@ -0,0 +1,4 @@
+#pragma once
+#include "base.h"
+typedef struct Base CBase;
+struct C { CBase base; base_id_t ids[4]; };
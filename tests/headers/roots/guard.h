@@ -0,0 +1,6 @@
+#ifndef GUARD_H
+#define GUARD_H
+#include "base.h"
+struct Guarded { struct Base base; base_id_t owner; };
+typedef struct Guarded Guarded;
+#endif
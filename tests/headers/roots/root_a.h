@@ -0,0 +1,4 @@
+#include "a.h"
+#include "guard.h"
+#include "c.h"
+int root_a(Guarded *g, struct C *c);
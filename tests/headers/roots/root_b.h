@@ -0,0 +1,5 @@
+#include "guard.h"
+#include "base.h"
+#include "c.h"
+#include "a.h"
+int root_b(struct A *a, struct Base *b);
@@ -0,0 +1,12 @@
+#pragma once
+
+struct Later;
+
+struct Holder {
+    struct Later *first;
+    struct Later *second;
+};
+
+struct Later {
+    int v;
+};
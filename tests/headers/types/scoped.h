@@ -0,0 +1,11 @@
+#pragma once
+
+struct A {
+    typedef int T;
+    T x;
+};
+
+struct B {
+    typedef double T;
+    T y;
+};
@@ -0,0 +1,63 @@
+import array
+import asyncio
+import threading
+import time
+from ctypes import *
+
+import pytest
+
+from conftest import LIBC, LibC, compare_fn, requires_libc
+from h2ctypes.com import AsyncDll
+
+pytestmark = requires_libc
+
+
+def test_async():
+    dll = LibC(LIBC, buffers=True, callbacks=True)
+
+    async def main():
+        assert await dll.async_.strlen(b"abcd") == 4
+        assert dll.async_.h2ctypes_missing is None
+        with pytest.raises(AttributeError):
+            dll.async_.bind_all
+
+        limited = dll.configure_async(max_workers=4, limits={"usleep": 1})
+        started = time.perf_counter()
+        await asyncio.gather(*[limited.usleep(20000) for _ in range(3)])
+        assert time.perf_counter() - started >= 0.06
+
+        threads = []
+
+        def compare(a, b):
+            threads.append(threading.current_thread())
+            return a[0] - b[0]
+        values = array.array("i", [2, 3, 1])
+        await limited.qsort(values, len(values), sizeof(c_int), compare_fn(AsyncDll.threadsafe(compare)))
+        assert list(values) == [1, 2, 3] and set(threads) == {threading.current_thread()}
+        limited.close()
+
+    asyncio.run(main())
+    # 每个事件循环使用各自的信号量
+    asyncio.run(dll.async_.usleep(0))
+    limited = dll.configure_async(limits={"usleep": 1})
+    for _ in range(2):
+        asyncio.run(limited.usleep(0))
+    limited.close()
+
+
+def test_async_cancel_queued():
+    dll = LibC(LIBC, buffers=True)
+    facade = dll.configure_async(max_workers=1)
+    data = bytearray(4)
+
+    async def main():
+        running = asyncio.ensure_future(facade.usleep(50000))
+        queued = asyncio.ensure_future(facade.memset(data, 1, 4))
+        await asyncio.sleep(0.01)
+        queued.cancel()
+        await running
+        await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    facade.close()
+    assert data == bytearray(4)
@@ -0,0 +1,46 @@
+import copy
+import os
+
+import pytest
+
+from conftest import HEADERS_DIR, BASIC_HEADER
+
+
+def test_translate_many(workspace_factory, tmp_path, monkeypatch):
+    from h2ctypes.batch import TranslateJob
+
+    monkeypatch.chdir(HEADERS_DIR)
+    jobs = [
+        TranslateJob(os.path.join("basic", "api.h"), output_dir=str(tmp_path / "api")),
+        TranslateJob(os.path.join("basic", "types.h"), output_dir=str(tmp_path / "types"), lazy_import=True),
+    ]
+    original = copy.deepcopy(jobs)
+    report = workspace_factory("basic").translate_many(jobs, workers=2)
+
+    # 规范化的是副本，调用方的任务不变
+    assert jobs == original
+    assert [result.ok for result in report.results] == [True, True]
+    assert report.results[0].header_file_path == BASIC_HEADER
+    assert report.results[0].output_dir == str(tmp_path / "api")
+    assert all(result.files for result in report.results)
+    assert os.path.isfile(str(tmp_path / "api" / "Linux64" / "__init__.py"))
+
+
+def test_translate_many_failure(workspace_factory, tmp_path):
+    from h2ctypes.batch import TranslateJob
+
+    jobs = [TranslateJob(BASIC_HEADER, output_dir=str(tmp_path / "api")),
+            TranslateJob(os.path.join(HEADERS_DIR, "basic", "missing.h"), output_dir=str(tmp_path / "missing"))]
+    report = workspace_factory("basic").translate_many(jobs, workers=1)
+    assert [result.ok for result in report.results] == [True, False]
+    assert report.failed[0].error
+
+
+def test_translate_many_same_output(workspace_factory, tmp_path):
+    from h2ctypes.batch import TranslateJob
+
+    output_dir = str(tmp_path / "out")
+    jobs = [TranslateJob(BASIC_HEADER, output_dir=output_dir),
+            TranslateJob(os.path.join(HEADERS_DIR, "basic", "types.h"), output_dir=output_dir + os.sep)]
+    with pytest.raises(ValueError):
+        workspace_factory("basic").translate_many(jobs)
@@ -0,0 +1,57 @@
+import array
+from ctypes import *
+
+import pytest
+
+from conftest import LIBC, LibC, requires_libc
+from h2ctypes.com import BufferInterface
+
+pytestmark = requires_libc
+
+
+def test_buffers():
+    dll = LibC(LIBC, buffers=True)
+    assert isinstance(dll.memset, BufferInterface)
+    values = array.array("i", [1, 2, 3])
+    dll.memset(values, 0, 12)
+    assert list(values) == [0, 0, 0]
+    data = bytearray(8)
+    dll.memset(data, 1, 8)
+    assert data == b"\x01" * 8
+    data.extend(b"\x00")  # 调用结束后缓冲区已释放，可以改变大小
+    assert dll.strlen(bytearray(b"ab\x00")) == 2
+    dll.memset((c_int * 2)(), 0, 8)
+    dll.memset(None, 0, 0)
+
+    for value in (b"\x00" * 8, bytearray(3), array.array("h", [0, 0]), memoryview(bytearray(16))[::2]):
+        with pytest.raises(ArgumentError):
+            dll.memset(value, 0, 0)
+    with pytest.raises(ArgumentError):
+        LibC(LIBC).memset(bytearray(8), 0, 8)
+
+
+def test_const_buffers():
+    """只读缓冲区可以传给 const T *，不能传给非 const 的指针参数"""
+    dll = LibC(LIBC, buffers=True)
+    assert dll.strnlen(b"abc\x00def", 8) == 3
+    assert dll.strnlen(memoryview(b"abcd"), 4) == 4
+    assert dll.strnlen(bytearray(b"ab\x00"), 3) == 2
+    with pytest.raises(ArgumentError):
+        BufferInterface(dll.strnlen.__wrapped__)(b"abc", 3)
+    with pytest.raises(ArgumentError):
+        dll.memset(memoryview(bytearray(8)).toreadonly(), 0, 8)
+
+
+def test_const_ndarray():
+    numpy = pytest.importorskip("numpy")
+    dll = LibC(LIBC, buffers=True)
+    values = numpy.frombuffer(b"xyz\x00", dtype=numpy.uint8)
+    assert not values.flags.writeable
+    assert dll.strnlen(values, 4) == 3
+    with pytest.raises(ArgumentError):
+        dll.memset(numpy.zeros(2, dtype=numpy.int32)[::-1], 0, 8)
+    readonly = numpy.zeros(2, dtype=numpy.int32)
+    readonly.flags.writeable = False
+    with pytest.raises(ArgumentError):
+        dll.memset(readonly, 1, 8)
+    assert not readonly.any()
@@ -0,0 +1,41 @@
+import os
+import shutil
+
+from conftest import HEADERS_DIR, BASIC_HEADER, list_files
+
+
+def test_parse_cache(workspace_factory, tmp_path):
+    from h2ctypes.stats import TranslateStats
+
+    workspace = workspace_factory("basic", cache_dir=str(tmp_path / "cache"))
+    output_dir = str(tmp_path / "basic_cache")
+    workspace.translate(BASIC_HEADER, output_dir=output_dir)
+    files = list_files(output_dir)
+    os.remove(os.path.join(output_dir, "Linux64", "__init__.py"))
+
+    # 输出被删改时从缓存的快照恢复
+    stats = workspace.translate(BASIC_HEADER, output_dir=output_dir, stats=TranslateStats())
+    assert "parse" not in stats.phases
+    assert list_files(output_dir) == files
+
+    # 生成选项不同时复用缓存的 ast，重新翻译
+    stats = workspace.translate(BASIC_HEADER, output_dir=output_dir, lazy_import=True, stats=TranslateStats())
+    assert "parse" not in stats.phases and "translate" in stats.phases
+
+
+def test_parse_cache_content_change(workspace_factory, tmp_path):
+    from h2ctypes.stats import TranslateStats
+
+    root = str(tmp_path / "basic")
+    shutil.copytree(os.path.join(HEADERS_DIR, "basic"), root)
+    header_file_path = os.path.join(root, "api.h")
+    workspace = workspace_factory(root, cache_dir=str(tmp_path / "cache"))
+    output_dir = str(tmp_path / "basic_cache")
+    workspace.translate(header_file_path, output_dir=output_dir)
+
+    with open(os.path.join(root, "types.h"), "a") as f:
+        f.write("\nstruct Added {\n    int a;\n};\n")
+    stats = workspace.translate(header_file_path, output_dir=output_dir, stats=TranslateStats())
+    assert "parse" in stats.phases
+    with open(os.path.join(output_dir, "Linux64", "dependencies", "types.py")) as f:
+        assert "class Added(Structure)" in f.read()
@@ -0,0 +1,99 @@
+import array
+import asyncio
+import contextvars
+from ctypes import *
+
+from conftest import LIBC, LibC, compare_fn, compare_ints, requires_libc
+from h2ctypes.com import CallbackInterface, BufferInterface, CallbackRegistry
+
+pytestmark = requires_libc
+
+
+def test_callbacks():
+    dll = LibC(LIBC, buffers=True, callbacks=True)
+    assert isinstance(dll.qsort, CallbackInterface) and isinstance(dll.memset, BufferInterface)
+    values = array.array("i", [3, 1, 2])
+    dll.qsort(values, len(values), sizeof(c_int), compare_ints)
+    dll.qsort(values, len(values), sizeof(c_int), compare_ints)
+    assert list(values) == [1, 2, 3]
+    assert len(dll.callbacks) == 1
+    live = dll.callbacks.live()[0]
+    assert live["pinned"] and live["hits"] == 1
+    dll.callbacks.release(compare_ints)
+    assert len(dll.callbacks) == 0
+
+    registry = dll.callbacks
+    with registry.scope():
+        dll.qsort(values, len(values), sizeof(c_int), lambda a, b: b[0] - a[0])
+        assert registry.thunk(compare_fn, compare_ints) is registry.thunk(compare_fn, compare_ints)
+        assert len(registry) == 2
+    assert len(registry) == 0 and list(values) == [3, 2, 1]
+
+    pinned = registry.thunk(compare_fn, compare_ints)
+    with registry.scope():
+        assert registry.thunk(compare_fn, compare_ints) is pinned
+    assert len(registry) == 1
+    registry.evict()
+    assert len(registry) == 0
+
+
+def test_async_scope():
+    """AsyncDll 在线程池中转换的回调归属发起调用的协程的 scope"""
+    dll = LibC(LIBC, buffers=True, callbacks=True)
+    registry = dll.callbacks
+
+    async def sort(reverse: bool):
+        values = array.array("i", [3, 1, 2])
+        with registry.scope():
+            await dll.async_.qsort(values, len(values), sizeof(c_int),
+                                   lambda a, b: b[0] - a[0] if reverse else a[0] - b[0])
+            assert len(registry) >= 1
+        return list(values)
+
+    async def main():
+        return await asyncio.gather(sort(False), sort(True))
+
+    assert asyncio.run(main()) == [[1, 2, 3], [3, 2, 1]]
+    assert len(registry) == 0
+    dll.async_.close()
+
+
+def test_scope_exit_order():
+    """scope 退出时只移除自己"""
+    registry = CallbackRegistry()
+    outer, inner = registry.scope(), registry.scope()
+    outer.__enter__()
+    inner.__enter__()
+    outer.__exit__(None, None, None)
+    registry.thunk(compare_fn, compare_ints)
+    assert registry.live()[0]["scopes"] == 1 and not registry.live()[0]["pinned"]
+    inner.__exit__(None, None, None)
+    assert len(registry) == 0
+
+    # 在 scope 中复制的上下文，scope 退出后注册的 thunk 不再归它管理
+    with registry.scope():
+        context = contextvars.copy_context()
+    context.run(registry.thunk, compare_fn, compare_ints)
+    assert registry.live()[0]["pinned"] and registry.live()[0]["scopes"] == 0
+
+
+def test_unscoped_limit():
+    """scope() 之外的 thunk 按最近使用保留 maxsize 个"""
+    registry = CallbackRegistry(maxsize=2)
+    callbacks = [lambda a, b: 0 for _ in range(3)]
+    registry.thunk(compare_fn, callbacks[0])
+    registry.thunk(compare_fn, callbacks[1])
+    registry.thunk(compare_fn, callbacks[0])
+    registry.thunk(compare_fn, callbacks[2])
+    assert [live["hits"] for live in registry.live()] == [1, 0]
+    assert len(registry) == 2
+    with registry.scope():
+        registry.thunk(compare_fn, callbacks[1])
+        registry.thunk(compare_fn, callbacks[0])
+        assert len(registry) == 3
+    assert len(registry) == 2
+
+    unlimited = CallbackRegistry(maxsize=None)
+    for callback in callbacks:
+        unlimited.thunk(compare_fn, callback)
+    assert len(unlimited) == 3
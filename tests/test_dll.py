@@ -0,0 +1,40 @@
+import copy
+
+import pytest
+
+from conftest import LIBC, LibC, requires_libc
+
+pytestmark = requires_libc
+
+
+def test_lazy_bind():
+    dll = LibC(LIBC)
+    assert "strlen" not in dll.__dict__
+    assert dll.strlen(b"abc") == 3
+    assert dll.__dict__["strlen"] is dll.strlen
+    assert dll.h2ctypes_missing is None
+    with pytest.raises(AttributeError):
+        dll.not_an_interface
+
+
+def test_eager_bind():
+    dll = LibC(LIBC, lazy=False)
+    assert "strlen" in dll.__dict__ and dll.__dict__["h2ctypes_missing"] is None
+    assert sorted(dll.bind_all()) == ["h2ctypes_missing", "profile"]
+    with pytest.raises(AttributeError):
+        dll.bind_all(strict=True)
+
+
+def test_shadowed_interface():
+    """与 CtypesDll 成员同名的接口只能通过 get_interface 获取"""
+    dll = LibC(LIBC)
+    assert callable(dll.profile) and dll.get_interface("profile") is None
+    assert dll.get_interface("strlen")(b"ab") == 2
+    with pytest.raises(AttributeError):
+        dll.get_interface("not_an_interface")
+
+
+def test_uninitialized():
+    with pytest.raises(AttributeError):
+        LibC.__new__(LibC).strlen
+    assert copy.copy(LibC(LIBC)).strlen(b"ab") == 2
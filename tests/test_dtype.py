@@ -0,0 +1,39 @@
+import ctypes
+
+import pytest
+
+from conftest import translate_basic
+
+
+def test_dtype_layout(workspace_factory, import_package, tmp_path):
+    pytest.importorskip("numpy")
+    output_dir = translate_basic(workspace_factory, tmp_path, "basic_dtype", dtype_layout=True)
+    module = import_package(output_dir)["basic_dtype.Linux64"]
+    dtype = module.get_dtype(module.Shape)
+    assert dtype.itemsize == ctypes.sizeof(module.Shape)
+    assert dtype.fields["name"][0].str == "|S16"
+    assert module.get_dtype(module.Point).fields["y"][1] == 4
+
+    shapes = (module.Shape * 2)()
+    shapes[1].origin.y = 7
+    assert module.as_ndarray(module.Shape, shapes)[1]["origin"]["y"] == 7
+
+
+def test_no_dtype_layout(workspace_factory, import_package, tmp_path):
+    pytest.importorskip("numpy")
+    output_dir = translate_basic(workspace_factory, tmp_path, "basic_no_dtype")
+    module = import_package(output_dir)["basic_no_dtype.Linux64"]
+    with pytest.raises(TypeError):
+        module.get_dtype(module.Point)
+
+
+def test_dtype_size_mismatch():
+    """clang 的记录大小与 ctypes 类不同时不构造 dtype"""
+    pytest.importorskip("numpy")
+    from h2ctypes.com import get_dtype
+
+    class Record(ctypes.Structure):
+        _fields_ = [("a", ctypes.c_int)]
+        _dtype_layout_ = (8, (("a", 0, "<i4"), ))
+    with pytest.raises(TypeError):
+        get_dtype(Record)
@@ -0,0 +1,22 @@
+import ctypes
+
+from conftest import translate_basic, list_files, check_basic_api
+
+
+def test_frozen(workspace_factory, import_package, tmp_path):
+    output_dir = translate_basic(workspace_factory, tmp_path, "basic_frozen", frozen=True)
+    assert [name for name in list_files(output_dir) if name.endswith(".py")] == \
+        ["Linux64/__init__.py", "Linux64/com.py", "__init__.py"]
+    check_basic_api(import_package(output_dir)["basic_frozen.Linux64"])
+
+
+def test_frozen_matches_default(workspace_factory, import_package, tmp_path):
+    """扁平模块与默认输出的布局一致"""
+    default = import_package(translate_basic(workspace_factory, tmp_path, "basic_default"))["basic_default.Linux64"]
+    frozen = import_package(translate_basic(workspace_factory, tmp_path, "basic_frozen",
+                                            frozen=True))["basic_frozen.Linux64"]
+    for name in ("Point", "Value", "Shape"):
+        record, expected = getattr(frozen, name), getattr(default, name)
+        assert ctypes.sizeof(record) == ctypes.sizeof(expected)
+        assert [(field, getattr(record, field).offset) for field, _ in record._fields_] == \
+            [(field, getattr(expected, field).offset) for field, _ in expected._fields_]
@@ -0,0 +1,44 @@
+from h2ctypes.project import Header, IncludeGraph
+
+
+def _graph(edges, implicit=()):
+    graph = IncludeGraph()
+    headers = {}
+    for name in implicit:
+        headers[name] = graph.add(Header("/inc/{}.h".format(name)), implicit=True)
+    for source, include in edges:
+        for name in (source, include):
+            headers.setdefault(name, Header("/inc/{}.h".format(name)))
+        graph.add_edge(headers[source], headers[include])
+    return graph, headers
+
+
+def _names(headers):
+    return [header.name for header in headers]
+
+
+def test_topological_order():
+    graph, h = _graph([("root", "a"), ("root", "b"), ("a", "c"), ("b", "c")], implicit=["builtin"])
+    order = graph.topological_order(h["root"])
+    assert _names(order) == ["builtin", "c", "a", "b", "root"]
+    assert _names(graph.dependencies(h["a"])) == ["builtin", "c"]
+    assert _names(graph.dependencies(h["root"])) == ["builtin", "c", "a", "b"]
+    assert graph.position(h["root"]) == 4 and graph.position(Header("/inc/other.h")) == -1
+    assert _names(graph.dependencies(Header("/inc/other.h"))) == ["builtin"]
+    assert graph.get(Header("/inc/a.h")) is h["a"] and h["a"].include_headers["/inc/c.h"] is h["c"]
+
+
+def test_cycle():
+    graph, h = _graph([("root", "a"), ("a", "b"), ("b", "a")])
+    order = graph.topological_order(h["root"])
+    assert _names(order) == ["b", "a", "root"]
+    assert [_names(cycle) for cycle in graph.cycles] == [["a", "b", "a"]]
+
+
+def test_update():
+    graph, h = _graph([("root", "a")])
+    other, _ = _graph([("a", "b")], implicit=["builtin"])
+    graph.update(other)
+    assert len(graph) == 4
+    assert _names(graph.includes(h["a"])) == ["b"]
+    assert _names(graph.topological_order(h["root"])) == ["builtin", "b", "a", "root"]
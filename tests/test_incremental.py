@@ -0,0 +1,32 @@
+import os
+import shutil
+
+from conftest import HEADERS_DIR, translate_basic, list_files
+
+
+def _get_mtimes(output_dir: str):
+    return {name: os.stat(os.path.join(output_dir, name)).st_mtime_ns for name in list_files(output_dir)}
+
+
+def test_unchanged(workspace_factory, tmp_path):
+    output_dir = translate_basic(workspace_factory, tmp_path, "basic_incremental", incremental=True)
+    mtimes = _get_mtimes(output_dir)
+    translate_basic(workspace_factory, tmp_path, "basic_incremental", incremental=True)
+    assert _get_mtimes(output_dir) == mtimes
+
+
+def test_changed_header(workspace_factory, tmp_path):
+    root = str(tmp_path / "basic")
+    shutil.copytree(os.path.join(HEADERS_DIR, "basic"), root)
+    header_file_path = os.path.join(root, "api.h")
+    workspace = workspace_factory(root)
+    output_dir = str(tmp_path / "basic_incremental")
+    workspace.translate(header_file_path, output_dir=output_dir, incremental=True)
+    mtimes = _get_mtimes(output_dir)
+
+    with open(header_file_path, "a") as f:
+        f.write("\nint shape_count(void);\n")
+    workspace.translate(header_file_path, output_dir=output_dir, incremental=True)
+    changed = {name for name, mtime in _get_mtimes(output_dir).items() if mtimes.get(name) != mtime}
+    # 只重写根模块及其来源头文件的副本，types.py 等不变
+    assert changed == {os.path.join("Linux64", name) for name in (".manifest.json", "__init__.py", "origins/api.h")}
@@ -0,0 +1,30 @@
+import importlib
+import sys
+
+import pytest
+
+from conftest import translate_basic, check_basic_api
+
+
+def test_lazy_import(workspace_factory, import_package, tmp_path):
+    output_dir = translate_basic(workspace_factory, tmp_path, "basic_lazy", lazy_import=True)
+    modules = import_package(output_dir)
+    package = modules["basic_lazy.Linux64"]
+    assert package._symbols_["Shape"] == ".dependencies.api"
+    assert "Shape" in dir(package)
+    check_basic_api(package)
+    assert package.Shape is modules["basic_lazy.Linux64.dependencies.api"].Shape
+    with pytest.raises(AttributeError):
+        package.missing_symbol
+
+
+def test_lazy_import_order(workspace_factory, import_package, tmp_path):
+    """只导入包时不执行任何依赖模块，访问符号时才导入其所在模块"""
+    output_dir = translate_basic(workspace_factory, tmp_path, "basic_lazy_order", lazy_import=True)
+    import_package(output_dir)
+    for name in [name for name in sys.modules if name.startswith("basic_lazy_order.")]:
+        del sys.modules[name]
+    package = importlib.import_module("basic_lazy_order.Linux64")
+    assert "basic_lazy_order.Linux64.dependencies.api" not in sys.modules
+    assert package.Point.__module__ == "basic_lazy_order.Linux64.dependencies.types"
+    assert "basic_lazy_order.Linux64.dependencies.api" not in sys.modules
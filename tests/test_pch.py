@@ -0,0 +1,54 @@
+import filecmp
+import os
+import shutil
+
+from conftest import HEADERS_DIR, BASIC_HEADER, translate_basic, list_files, check_basic_api
+
+TYPES_HEADER = os.path.join(HEADERS_DIR, "basic", "types.h")
+
+
+def test_pch_matches_plain(workspace_factory, import_package, tmp_path):
+    """前缀头文件中的声明仍生成到所在头文件的模块，结果与不使用 PCH 相同"""
+    plain_dir = translate_basic(workspace_factory, tmp_path, "basic_plain")
+    output_dir = translate_basic(workspace_factory, tmp_path, "basic_pch", prefix_headers=[TYPES_HEADER])
+    files = list_files(plain_dir)
+    assert files == list_files(output_dir)
+    _, mismatch, errors = filecmp.cmpfiles(plain_dir, output_dir, files, shallow=False)
+    assert not mismatch and not errors
+    check_basic_api(import_package(output_dir)["basic_pch.Linux64"])
+
+
+def test_pch_reuse_and_rebuild(workspace_factory, tmp_path):
+    from h2ctypes.stats import TranslateStats
+
+    root = str(tmp_path / "basic")
+    shutil.copytree(os.path.join(HEADERS_DIR, "basic"), root)
+    header_file_path = os.path.join(root, "api.h")
+    types_header = os.path.join(root, "types.h")
+    workspace = workspace_factory(root, cache_dir=str(tmp_path / "cache"))
+    args = workspace._build_args()
+
+    pch_args = workspace._add_pch_args(args, [types_header])
+    pch_path = pch_args[-1]
+    mtime = os.stat(pch_path).st_mtime_ns
+    assert workspace._add_pch_args(args, [types_header]) == pch_args
+    assert os.stat(pch_path).st_mtime_ns == mtime
+    assert (None, types_header) in workspace._get_pch_includes(pch_args)
+
+    with open(types_header, "a") as f:
+        f.write("\nstruct Added {\n    int a;\n};\n")
+    rebuilt = workspace._add_pch_args(args, [types_header])[-1]
+    assert rebuilt != pch_path and os.path.exists(rebuilt)
+
+    output_dir = str(tmp_path / "basic_pch")
+    stats = workspace.translate(header_file_path, output_dir=output_dir, prefix_headers=[types_header],
+                                stats=TranslateStats())
+    assert "pch" in stats.phases
+    with open(os.path.join(output_dir, "Linux64", "dependencies", "types.py")) as f:
+        assert "class Added(Structure)" in f.read()
+
+
+def test_pch_roots(workspace_factory, import_package, tmp_path):
+    output_dir = str(tmp_path / "basic_roots")
+    workspace_factory("basic").translate_roots([BASIC_HEADER], output_dir=output_dir, prefix_headers=[TYPES_HEADER])
+    check_basic_api(import_package(output_dir)["basic_roots.api.Linux64"])
@@ -0,0 +1,46 @@
+import array
+from ctypes import *
+
+import pytest
+
+from conftest import LIBC, LibC, compare_ints, requires_libc
+from h2ctypes.com import CallProfiler, CallbackInterface, ProfiledInterface
+
+pytestmark = requires_libc
+
+
+def test_profiler():
+    dll = LibC(LIBC, buffers=True, callbacks=True)
+    strlen = dll.strlen
+    with dll.profiling() as profiler:
+        assert isinstance(dll.strlen, ProfiledInterface)
+        assert isinstance(dll.qsort.__wrapped__, CallbackInterface)
+        for _ in range(3):
+            dll.strlen(b"abc")
+        dll.qsort(array.array("i", [2, 1]), 2, sizeof(c_int), compare_ints)
+        with pytest.raises(ArgumentError):
+            dll.memset(b"\x00" * 4, 0, 4)
+    assert dll.strlen is not strlen and not isinstance(dll.strlen, ProfiledInterface)
+    assert dll.profiler is None
+
+    snapshot = profiler.snapshot()
+    assert set(snapshot) == {"strlen", "qsort", "memset"}
+    assert snapshot["strlen"]["count"] == 3 and snapshot["strlen"]["errors"] == 0
+    assert snapshot["memset"]["errors"] == 1
+    qsort = snapshot["qsort"]
+    assert set(qsort) == {"count", "errors", "total", "mean", "convert", "ctypes_call", "min", "max",
+                          "p50", "p90", "p99"}
+    assert 0 < qsort["convert"] <= qsort["total"]
+    assert qsort["min"] <= qsort["p50"] <= qsort["max"]
+    assert "strlen" in profiler.to_json()
+
+
+def test_profiler_samples():
+    profiler = CallProfiler(samples=2)
+    for latency in (3.0, 1.0, 2.0):
+        profiler.record("f", latency, 0.5)
+    stats = profiler.snapshot()["f"]
+    assert stats["count"] == 3 and stats["total"] == 6.0 and stats["ctypes_call"] == 4.5
+    assert (stats["min"], stats["max"]) == (1.0, 2.0)
+    profiler.reset()
+    assert profiler.snapshot() == {}
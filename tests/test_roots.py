@@ -0,0 +1,28 @@
+import os
+
+from conftest import HEADERS_DIR
+
+
+def test_roots_share_guarded_header(workspace_factory, import_package, tmp_path):
+    """guard.h 再次包含 base.h 时 libclang 不报告包含关系，公共包仍需导入 base"""
+    root = os.path.join(HEADERS_DIR, "roots")
+    output_dir = str(tmp_path / "roots_default")
+    workspace_factory("roots").translate_roots(
+        [os.path.join(root, "root_a.h"), os.path.join(root, "root_b.h")], output_dir=output_dir)
+
+    modules = import_package(output_dir)
+    guard = modules["roots_default.common.Linux64.dependencies.guard"]
+    assert guard.Guarded._fields_[0][1] is modules["roots_default.common.Linux64.dependencies.base"].Base
+    assert modules["roots_default.common.Linux64.dependencies.c"].CBase is guard.Base
+    assert hasattr(modules["roots_default.root_a.Linux64"], "root_a")
+    assert hasattr(modules["roots_default.root_b.Linux64"], "root_b")
+
+
+def test_roots_lazy_import(workspace_factory, import_package, tmp_path):
+    root = os.path.join(HEADERS_DIR, "roots")
+    output_dir = str(tmp_path / "roots_lazy")
+    workspace_factory("roots").translate_roots(
+        [os.path.join(root, "root_a.h"), os.path.join(root, "root_b.h")], output_dir=output_dir, lazy_import=True)
+
+    modules = import_package(output_dir)
+    assert modules["roots_lazy.root_b.Linux64"].Dll._interfaces_.keys() >= {"root_b"}
@@ -0,0 +1,51 @@
+import pytest
+
+from conftest import BASIC_HEADER
+
+
+@pytest.fixture
+def solution(workspace_factory, tmp_path):
+    """翻译完成的 headers/basic/api.h"""
+    workspace = workspace_factory("basic")
+    return workspace._translate_tu(workspace._parse(BASIC_HEADER, workspace._build_args()), BASIC_HEADER, None,
+                                   str(tmp_path / "out"), False)
+
+
+def test_lookup(solution):
+    from h2ctypes.decl import STRUCT_DECL, FUNCTION_DECL
+
+    symbols = solution.symbols
+    shape, = [decl for decl in symbols.find("Shape") if isinstance(decl, STRUCT_DECL)]
+    assert symbols.get(shape.hash) is shape and shape.hash in symbols
+    assert shape in symbols.get_by_usr(shape.usr)
+    assert symbols.get_header(shape) is solution.get_header(BASIC_HEADER)
+    assert [decl.spelling for decl in symbols.exports] == ["shape_area", "sort_items"]
+    assert {decl.spelling for decl in symbols.of_kind(FUNCTION_DECL)} == {"shape_area", "sort_items"}
+    assert {decl.spelling for decl in symbols.of_kind(STRUCT_DECL)} >= {"Point", "Shape"}
+    assert symbols.find("missing") == []
+
+
+def test_query(solution):
+    from h2ctypes.decl import STRUCT_DECL, UNION_DECL, FUNCTION_DECL
+
+    symbols = solution.symbols
+    types_header = solution.get_header(BASIC_HEADER.replace("api.h", "types.h"))
+    assert [decl.spelling for decl in symbols.query(kinds=[STRUCT_DECL, UNION_DECL], header=types_header)] == \
+        ["Point", "Value"]
+    assert [decl.spelling for decl in symbols.query(pattern="s.*_.*", kinds=[FUNCTION_DECL])] == \
+        ["shape_area", "sort_items"]
+    assert symbols.query(spelling="Point", kinds=[FUNCTION_DECL]) == []
+    point = symbols.query(spelling="Point", kinds=[STRUCT_DECL])[0]
+    assert symbols.query(usr=point.usr, kinds=[STRUCT_DECL]) == [point]
+
+
+def test_redefine(solution):
+    """同一 hash 重新登记时替换旧的索引项"""
+    symbols = solution.symbols
+    point = symbols.find("Point")[-1]
+    count = len(symbols)
+    symbols.add(point)
+    assert len(symbols) == count and symbols.find("Point").count(point) == 1
+    assert symbols.get_header(point) is None
+    assert symbols.remove(point.hash) is point
+    assert point not in symbols.find("Point") and point.hash not in symbols
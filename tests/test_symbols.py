@@ -0,0 +1,27 @@
+from conftest import BASIC_HEADER, translate_basic
+
+
+def _collect(workspace_factory, *patterns: str):
+    """:return: 白名单可达的声明名"""
+    from h2ctypes.prune import SymbolPruner
+
+    workspace = workspace_factory("basic")
+    tu = workspace._parse(BASIC_HEADER, workspace._build_args())
+    reachable = SymbolPruner(patterns).collect(tu.cursor)
+    return {cursor.spelling for cursor in tu.cursor.walk_preorder() if cursor.get_usr() in reachable}
+
+
+def test_symbols(workspace_factory, import_package, tmp_path):
+    output_dir = translate_basic(workspace_factory, tmp_path, "basic_symbols", symbols=["shape_area"])
+    module = import_package(output_dir)["basic_symbols.Linux64"]
+    assert set(module.Dll._interfaces_) == {"shape_area"}
+    assert not hasattr(module, "sort_items")
+    assert dict(module.Shape._fields_)["origin"] is module.Point
+
+
+def test_pruner(workspace_factory):
+    assert _collect(workspace_factory, "sort_items") == {"sort_items", "compare_fn"}
+    # 成员、typedef 链上的类型均可达
+    assert _collect(workspace_factory, "shape_.*") >= {"shape_area", "Shape", "Point", "Value", "Color"}
+    assert "sort_items" not in _collect(workspace_factory, "shape_.*")
+    assert _collect(workspace_factory, "no_such_symbol") == set()
@@ -0,0 +1,31 @@
+import ctypes
+
+from conftest import BASIC_HEADER, translate_basic, check_basic_api
+
+
+def test_translate_targets(workspace_factory, import_package, tmp_path):
+    output_dir = str(tmp_path / "basic_targets")
+    counts = workspace_factory("basic").translate_targets(BASIC_HEADER, output_dir=output_dir)
+    assert set(counts) == {"shared", "Linux64", "Linux32"} and counts["shared"] > 0
+
+    modules = import_package(output_dir)
+    shared = modules["basic_targets.shared.dependencies.types"]
+    m64, m32 = modules["basic_targets.Linux64"], modules["basic_targets.Linux32"]
+    check_basic_api(m64)
+    # 布局相同的声明只生成到共享包，两个架构引用同一个类
+    assert m64.Point is m32.Point is shared.Point
+    assert m64.Color is shared.Color
+    # 对齐不同的结构体各自生成
+    assert m64.Shape is not m32.Shape
+    assert (m64.Shape._pack_, m32.Shape._pack_) == (8, 4)
+    assert dict(m32.Shape._fields_)["origin"] is shared.Point
+
+
+def test_translate_targets_matches_translate(workspace_factory, import_package, tmp_path):
+    output_dir = str(tmp_path / "basic_targets")
+    workspace_factory("basic").translate_targets(BASIC_HEADER, output_dir=output_dir)
+    single_dir = translate_basic(workspace_factory, tmp_path, "basic_single")
+    modules = import_package(output_dir)
+    single = import_package(single_dir)["basic_single.Linux64"]
+    for name in ("Point", "Value", "Shape"):
+        assert ctypes.sizeof(getattr(modules["basic_targets.Linux64"], name)) == ctypes.sizeof(getattr(single, name))
@@ -0,0 +1,10 @@
+from conftest import translate_basic, list_files, check_basic_api
+
+
+def test_default(workspace_factory, import_package, tmp_path):
+    output_dir = translate_basic(workspace_factory, tmp_path, "basic_default")
+    modules = import_package(output_dir)
+    check_basic_api(modules["basic_default.Linux64"])
+    types = modules["basic_default.Linux64.dependencies.types"]
+    assert modules["basic_default.Linux64"].Point is types.Point
+    assert set(types.__all__) == {"Color", "Point", "Value", "compare_fn"}
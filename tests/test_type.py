@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from conftest import HEADERS_DIR
+
+
+def _prepare(workspace_factory, name: str):
+    """:return: 尚未翻译的 Solution 与 TypeTranslator，以及 name 中的顶层游标"""
+    from h2ctypes.cursor import CursorTranslator
+    from h2ctypes.type import TypeTranslator
+
+    workspace = workspace_factory("types")
+    header_file_path = os.path.join(HEADERS_DIR, "types", name)
+    solution = workspace._build_solution(workspace._parse(header_file_path, workspace._build_args()),
+                                         header_file_path)
+    solution.type_handler = TypeTranslator(solution)
+    solution.cursor_handler = CursorTranslator(solution)
+    cursors = [cursor for cursor in solution.root_tu.cursor.get_children()
+               if cursor.location.file and cursor.location.file.name == header_file_path]
+    return solution, solution.type_handler, cursors
+
+
+def test_scoped_typedefs(workspace_factory, import_package, tmp_path):
+    """不同结构体中的同名 typedef spelling 相同，缓存不能把它们当作同一类型"""
+    output_dir = str(tmp_path / "types_scoped")
+    workspace_factory("types").translate(os.path.join(HEADERS_DIR, "types", "scoped.h"), output_dir=output_dir)
+    module = import_package(output_dir)["types_scoped.Linux64"]
+    assert dict(module.A._fields_)["x"].__name__ == "c_int"
+    assert dict(module.B._fields_)["y"].__name__ == "c_double"
+
+
+def test_cache_hits(workspace_factory):
+    _, translator, cursors = _prepare(workspace_factory, "cache.h")
+    fields = list(cursors[1].get_children())
+    assert [translator.translate(field.type) for field in fields] == ["POINTER(Later)", "POINTER(Later)"]
+    info = translator.cache_info()
+    assert info.hits >= 1 and info.currsize == info.misses
+    assert [translator.translate(field.type) for field in fields] == ["POINTER(Later)", "POINTER(Later)"]
+    assert translator.cache_info().hits == info.hits + 2 and translator.cache_info().misses == info.misses
+
+
+def test_pre_define_invalidates(workspace_factory):
+    """未定义时缓存的 DEFAULT_LACK_C_TYPE 在声明预定义后失效"""
+    from h2ctypes.decl import STRUCT_DECL
+
+    solution, translator, cursors = _prepare(workspace_factory, "cache.h")
+    cursor_handler = solution.cursor_handler
+
+    class _Unavailable:
+        @staticmethod
+        def translate(cursor, **kwargs):
+            return None
+
+    solution.cursor_handler = _Unavailable()
+    field = next(cursors[1].get_children())
+    assert translator.translate(field.type) == "POINTER(DEFAULT_LACK_C_TYPE)"
+    assert translator.translate(field.type) == "POINTER(DEFAULT_LACK_C_TYPE)"
+
+    solution.cursor_handler = cursor_handler
+    solution.pre_define(STRUCT_DECL(cursors[2]))
+    assert translator.translate(field.type) == "POINTER(Later)"
+
+
+@pytest.mark.parametrize("name", ["scoped.h", "cache.h"])
+def test_cache_matches_uncached(workspace_factory, name):
+    """关闭缓存(每次都未命中)时结果相同"""
+    _, translator, cursors = _prepare(workspace_factory, name)
+    _, uncached, _ = _prepare(workspace_factory, name)
+    uncached._cache = type("NoCache", (dict, ), {"__setitem__": lambda self, key, value: None})()
+    types = [field.type for cursor in cursors for field in cursor.get_children()]
+    assert [translator.translate(T) for T in types] == [uncached.translate(T) for T in types]
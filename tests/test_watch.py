@@ -0,0 +1,95 @@
+import copy
+import json
+import os
+import shutil
+import socket
+import threading
+
+import pytest
+
+from conftest import HEADERS_DIR
+from h2ctypes import watch
+
+
+class _Session:
+    files = {"a.h": 0.0}
+    last_result = None
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(watch, "TOKEN_DIR", str(tmp_path / "tokens"))
+    server = watch.WatchServer(_Session(), ("127.0.0.1", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_token(server):
+    address = server.server_address[:2]
+    assert os.stat(server.token_path).st_mode & 0o777 == 0o600
+    assert watch.request("status", address, 5) == {"ok": True, "files": 1, "result": None}
+    assert watch.request("status", address, 5, token="bad") == {"ok": False, "error": "invalid token"}
+    with socket.create_connection(address, 5) as sock:
+        sock.sendall(b'{"command": "stop"}\n')
+        assert json.loads(sock.makefile("rb").readline()) == {"ok": False, "error": "invalid token"}
+    assert not server.stopped.is_set()
+
+
+def test_token_removed(server):
+    server.server_close()
+    assert not os.path.exists(server.token_path)
+
+
+def _touch(path: str, text: str):
+    """追加内容并推后修改时间，保证 poll 能发现变化"""
+    with open(path, "a") as f:
+        f.write(text)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_session(workspace_factory, tmp_path):
+    from h2ctypes.batch import TranslateJob
+
+    root = str(tmp_path / "basic")
+    shutil.copytree(os.path.join(HEADERS_DIR, "basic"), root)
+    output_dir = str(tmp_path / "out")
+    job = TranslateJob(os.path.join(root, "api.h"), output_dir=output_dir)
+    original = copy.deepcopy(job)
+    session = watch.WatchSession(workspace_factory(root), job)
+    assert job == original
+
+    result = session.rebuild()
+    assert result.ok and not result.reparsed
+    assert set(result.modules) >= {"__init__.py", "dependencies/types.py"}
+    assert os.path.join(root, "types.h") in session.files
+
+    # 没有变化时 reparse，不重新生成任何模块
+    result = session.rebuild()
+    assert result.ok and result.reparsed and result.changed == [] and result.modules == []
+
+    _touch(os.path.join(root, "types.h"), "\nstruct Added {\n    int a;\n};\n")
+    assert session.poll() == [os.path.join(root, "types.h")]
+    result = session.rebuild()
+    assert result.ok and result.reparsed and result.changed == [os.path.join(root, "types.h")]
+    assert result.modules == ["dependencies/types.py"]
+    with open(os.path.join(output_dir, "Linux64", "dependencies", "types.py")) as f:
+        assert "class Added(Structure)" in f.read()
+    assert session.poll() == []
+
+
+def test_session_error(workspace_factory, tmp_path):
+    from h2ctypes.batch import TranslateJob
+
+    root = str(tmp_path / "basic")
+    shutil.copytree(os.path.join(HEADERS_DIR, "basic"), root)
+    session = watch.WatchSession(workspace_factory(root),
+                                 TranslateJob(os.path.join(root, "api.h"), output_dir=str(tmp_path / "out")))
+    assert session.rebuild().ok
+    _touch(os.path.join(root, "types.h"), "\nstruct Broken {\n")
+    result = session.rebuild()
+    assert not result.ok and result.errors
@@ -0,0 +1,17 @@
+import filecmp
+
+import pytest
+
+from conftest import translate_basic, list_files, check_basic_api
+
+
+@pytest.mark.parametrize("lazy_import", [False, True])
+def test_workers(workspace_factory, import_package, tmp_path, lazy_import):
+    """进程池生成的结果与串行生成逐字节相同"""
+    serial_dir = translate_basic(workspace_factory, tmp_path, "basic_serial", lazy_import=lazy_import)
+    output_dir = translate_basic(workspace_factory, tmp_path, "basic_workers", workers=2, lazy_import=lazy_import)
+    files = list_files(serial_dir)
+    assert files == list_files(output_dir)
+    _, mismatch, errors = filecmp.cmpfiles(serial_dir, output_dir, files, shallow=False)
+    assert not mismatch and not errors
+    check_basic_api(import_package(output_dir)["basic_workers.Linux64"])
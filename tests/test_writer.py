@@ -0,0 +1,67 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from h2ctypes.writer import CodeWriter
+
+
+def _emit(writer: CodeWriter):
+    writer.write("class A:\n")
+    with writer.indent():
+        writer.write_template("x = {}\n\n\ny = {}\n", 1, lambda w: w.write("[\n1,\n]"))
+    writer.write("\nz = 2\n")
+
+
+EXPECTED = "class A:\n    x = 1\n    y = [\n    1,\n    ]\nz = 2\n"
+
+
+def test_render():
+    assert CodeWriter.render(_emit) == EXPECTED
+    assert CodeWriter.render(lambda w: w.write("a\nb"), depth=1) == "    a\n    b"
+
+
+def test_stream():
+    stream = io.StringIO()
+    writer = CodeWriter(stream)
+    writer.FLUSH_SIZE = 4
+    _emit(writer)
+    assert writer.size == len(EXPECTED.encode("utf-8"))
+    assert writer.digest == hashlib.sha1(EXPECTED.encode("utf-8")).hexdigest()
+    assert stream.getvalue() == EXPECTED
+    assert writer.getvalue() == ""
+
+
+def test_write_stream(tmp_path):
+    from h2ctypes.gen import write_stream
+
+    path = str(tmp_path / "module.py")
+    writer = write_stream(path, _emit)
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == EXPECTED
+    assert writer.digest == hashlib.sha1(EXPECTED.encode("utf-8")).hexdigest()
+
+    # 内容相同时保留原文件
+    mtime = os.stat(path).st_mtime_ns
+    os.utime(path, ns=(mtime - 10 ** 9, mtime - 10 ** 9))
+    write_stream(path, _emit, incremental=True)
+    assert os.stat(path).st_mtime_ns == mtime - 10 ** 9
+    assert os.listdir(str(tmp_path)) == ["module.py"]
+
+
+def test_write_stream_error(tmp_path):
+    """emit 出错时保留原文件，不留下临时文件"""
+    from h2ctypes.gen import write_stream
+
+    path = str(tmp_path / "module.py")
+    write_stream(path, _emit)
+
+    def emit(writer: CodeWriter):
+        writer.write("partial\n")
+        raise RuntimeError("emit failed")
+    with pytest.raises(RuntimeError):
+        write_stream(path, emit)
+    assert os.listdir(str(tmp_path)) == ["module.py"]
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == EXPECTED